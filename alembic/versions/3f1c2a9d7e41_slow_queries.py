@@ -0,0 +1,42 @@
+"""slow queries
+
+Revision ID: 3f1c2a9d7e41
+Revises: be288a524be3
+Create Date: 2026-10-19 09:12:44.102311
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "3f1c2a9d7e41"
+down_revision: Union[str, None] = "be288a524be3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "slow_queries",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "timestamp", sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()
+        ),
+        sa.Column("endpoint", sa.String(), nullable=True),
+        sa.Column("statement", sa.Text(), nullable=False),
+        sa.Column("parameters", postgresql.JSONB(), nullable=True),
+        sa.Column("duration_ms", sa.Float(), nullable=False),
+        sa.Column("plan", sa.Text(), nullable=True),
+    )
+    op.create_index("ix_slow_queries_timestamp", "slow_queries", ["timestamp"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_slow_queries_timestamp", table_name="slow_queries")
+    op.drop_table("slow_queries")
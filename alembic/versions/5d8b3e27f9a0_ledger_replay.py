@@ -0,0 +1,52 @@
+"""ledger replay
+
+Revision ID: 5d8b3e27f9a0
+Revises: c92d51e0a6f3
+Create Date: 2026-10-19 19:21:36.904417
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d8b3e27f9a0"
+down_revision: Union[str, None] = "c92d51e0a6f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "ledger_checkpoints",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("epoch", sa.Integer(), nullable=False),
+        sa.Column("entry_id", sa.Integer(), nullable=False),
+        sa.Column("balances", postgresql.JSONB(), nullable=False),
+        sa.Column(
+            "created_at", sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()
+        ),
+        sa.UniqueConstraint("epoch", "entry_id"),
+    )
+    op.create_table(
+        "game_ticks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("day", sa.String(), nullable=False),
+        sa.Column("hour", sa.Integer(), nullable=False),
+        sa.Column(
+            "timestamp", sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()
+        ),
+    )
+    # Resolves "as of <timestamp>" to an entry id.
+    op.create_index("ix_ledger_entries_timestamp", "ledger_entries", ["timestamp"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_ledger_entries_timestamp", table_name="ledger_entries")
+    op.drop_table("game_ticks")
+    op.drop_table("ledger_checkpoints")
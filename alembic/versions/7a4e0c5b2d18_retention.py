@@ -0,0 +1,48 @@
+"""retention
+
+Revision ID: 7a4e0c5b2d18
+Revises: 3f1c2a9d7e41
+Create Date: 2026-10-19 14:03:51.662870
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "7a4e0c5b2d18"
+down_revision: Union[str, None] = "3f1c2a9d7e41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ARCHIVED_TABLES = ("checkout_logs", "bottling_logs")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Lets abandoned carts be found; existing carts count as created now.
+    op.add_column(
+        "carts",
+        sa.Column(
+            "created_at", sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()
+        ),
+    )
+    op.create_index("ix_carts_created_at", "carts", ["created_at"])
+    op.create_index("ix_executed_orders_timestamp", "executed_orders", ["timestamp"])
+
+    for table in ARCHIVED_TABLES:
+        op.create_index(f"ix_{table}_timestamp", table, ["timestamp"])
+        op.execute(f"CREATE TABLE {table}_archive (LIKE {table} INCLUDING DEFAULTS)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ARCHIVED_TABLES:
+        op.drop_table(f"{table}_archive")
+        op.drop_index(f"ix_{table}_timestamp", table_name=table)
+
+    op.drop_index("ix_executed_orders_timestamp", table_name="executed_orders")
+    op.drop_index("ix_carts_created_at", table_name="carts")
+    op.drop_column("carts", "created_at")
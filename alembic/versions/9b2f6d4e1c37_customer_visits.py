@@ -0,0 +1,44 @@
+"""customer visits
+
+Revision ID: 9b2f6d4e1c37
+Revises: e4a7c1f08b52
+Create Date: 2026-10-20 15:21:08.904311
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b2f6d4e1c37"
+down_revision: Union[str, None] = "e4a7c1f08b52"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Who came into the shop each tick, whether or not they bought anything.
+    op.create_table(
+        "customer_visits",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("visit_id", sa.Integer(), nullable=False),
+        sa.Column("customer_id", sa.String(), nullable=False),
+        sa.Column("customer_name", sa.String(), nullable=False),
+        sa.Column("character_class", sa.String(), nullable=False),
+        sa.Column("level", sa.Integer(), nullable=False),
+        sa.Column(
+            "timestamp", sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()
+        ),
+        # A retried visit is recorded once.
+        sa.UniqueConstraint("visit_id", "customer_id"),
+    )
+    op.create_index("ix_customer_visits_timestamp", "customer_visits", ["timestamp"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_customer_visits_timestamp", table_name="customer_visits")
+    op.drop_table("customer_visits")
@@ -0,0 +1,63 @@
+"""ledger epochs
+
+Revision ID: c92d51e0a6f3
+Revises: 7a4e0c5b2d18
+Create Date: 2026-10-19 16:47:10.218554
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c92d51e0a6f3"
+down_revision: Union[str, None] = "7a4e0c5b2d18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A reset starts a new epoch; balances only sum the current one.
+    op.create_table(
+        "ledger_epochs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column(
+            "started_at", sa.TIMESTAMP(), nullable=False, server_default=sa.func.now()
+        ),
+    )
+    op.execute("INSERT INTO ledger_epochs DEFAULT VALUES")
+    op.execute("""
+        CREATE FUNCTION current_ledger_epoch() RETURNS integer
+        LANGUAGE sql STABLE
+        AS 'SELECT max(id) FROM ledger_epochs'
+    """)
+
+    # New entries land in whatever epoch is current when they are written.
+    op.add_column(
+        "ledger_entries",
+        sa.Column(
+            "epoch",
+            sa.Integer(),
+            nullable=False,
+            server_default=sa.text("current_ledger_epoch()"),
+        ),
+    )
+    op.create_index(
+        "ix_ledger_entries_epoch_resource", "ledger_entries", ["epoch", "resource"]
+    )
+    op.execute("""
+        CREATE VIEW current_ledger_entries AS
+        SELECT * FROM ledger_entries WHERE epoch = current_ledger_epoch()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP VIEW current_ledger_entries")
+    op.drop_index("ix_ledger_entries_epoch_resource", table_name="ledger_entries")
+    op.drop_column("ledger_entries", "epoch")
+    op.execute("DROP FUNCTION current_ledger_epoch()")
+    op.drop_table("ledger_epochs")
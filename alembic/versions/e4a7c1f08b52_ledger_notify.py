@@ -0,0 +1,67 @@
+"""ledger notify
+
+Revision ID: e4a7c1f08b52
+Revises: 5d8b3e27f9a0
+Create Date: 2026-10-20 10:12:41.530127
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a7c1f08b52"
+down_revision: Union[str, None] = "5d8b3e27f9a0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Tells every worker's listener (src/pubsub.py) which resources changed,
+    # once per statement; Postgres delivers it on commit.
+    op.execute("""
+        CREATE FUNCTION notify_ledger_change() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            PERFORM pg_notify(
+                'ledger_changed',
+                (SELECT string_agg(DISTINCT resource, ',') FROM new_rows)
+            );
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER ledger_entries_notify
+        AFTER INSERT ON ledger_entries
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ledger_change()
+    """)
+
+    # A reset changes every balance.
+    op.execute("""
+        CREATE FUNCTION notify_ledger_reset() RETURNS trigger
+        LANGUAGE plpgsql
+        AS $$
+        BEGIN
+            PERFORM pg_notify('ledger_changed', '*');
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER ledger_epochs_notify
+        AFTER INSERT ON ledger_epochs
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_ledger_reset()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER ledger_epochs_notify ON ledger_epochs")
+    op.execute("DROP FUNCTION notify_ledger_reset()")
+    op.execute("DROP TRIGGER ledger_entries_notify ON ledger_entries")
+    op.execute("DROP FUNCTION notify_ledger_change()")
@@ -0,0 +1,151 @@
+"""
+Per-checkout latency of the single-statement checkout (carts.CHECKOUT_SQL)
+versus the previous implementation, which made 8+N round trips. Runs
+against the database at POSTGRES_URI; every checkout runs in a transaction
+that is rolled back, so the database is left untouched. With
+POSTGRES_URI=sqlite:// it runs anywhere, though SQLite has no round trips to
+save, so only the Postgres numbers say much about production.
+
+    python -m benchmarks.bench_checkout [--runs 200] [--items 3]
+"""
+
+import argparse
+import json
+import statistics
+import time
+import uuid
+
+import sqlalchemy
+
+from src import database as db
+from src.api import carts, catalog
+
+
+def legacy_checkout(connection, cart_id: int, order_id: uuid.UUID):
+    """
+    The round-trip-per-step checkout this replaced (with the gold sign and
+    stock check corrected so both do the same work).
+    """
+    existing = connection.execute(
+        sqlalchemy.text("SELECT response FROM executed_orders WHERE order_id = :oid"),
+        {"oid": str(order_id)},
+    ).scalar_one_or_none()
+    if existing:
+        return existing
+
+    items = (
+        connection.execute(
+            sqlalchemy.text(
+                "SELECT item_sku, quantity FROM cart_items WHERE cart_id = :cid"
+            ),
+            {"cid": cart_id},
+        )
+        .mappings()
+        .all()
+    )
+    total_gold = 0
+    total_potions = 0
+    ledger_entries = []
+    for item in items:
+        definition = catalog.POTION_DEFINITIONS[item["item_sku"]]
+        on_hand = connection.execute(
+            sqlalchemy.text(
+                "SELECT COALESCE(SUM(change), 0) FROM ledger_entries "
+                "WHERE resource = :resource"
+            ),
+            {"resource": definition["resource"]},
+        ).scalar_one()
+        if on_hand < item["quantity"]:
+            raise ValueError("Not enough potions in stock.")
+        total_gold += catalog.CURRENT_PRICES[item["item_sku"]] * item["quantity"]
+        total_potions += item["quantity"]
+        ledger_entries.append((definition["resource"], -item["quantity"]))
+    ledger_entries.append(("gold", total_gold))
+
+    for resource, change in ledger_entries:
+        connection.execute(
+            sqlalchemy.text(
+                "INSERT INTO ledger_entries (resource, change, context) "
+                "VALUES (:resource, :change, :context)"
+            ),
+            {"resource": resource, "change": change, "context": f"checkout {cart_id}"},
+        )
+    connection.execute(
+        sqlalchemy.text(
+            "INSERT INTO checkout_logs (total_potions, total_gold, timestamp) "
+            "VALUES (:total_potions, :total_gold, NOW())"
+        ),
+        {"total_potions": total_potions, "total_gold": total_gold},
+    )
+    response = {"total_potions_bought": total_potions, "total_gold_paid": total_gold}
+    connection.execute(
+        sqlalchemy.text(
+            "INSERT INTO executed_orders (order_id, response) "
+            "VALUES (:oid, CAST(:response AS jsonb))"
+        ),
+        {"oid": str(order_id), "response": json.dumps(response)},
+    )
+    connection.execute(
+        sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cid"), {"cid": cart_id}
+    )
+    connection.execute(
+        sqlalchemy.text("DELETE FROM carts WHERE cart_id = :cid"), {"cid": cart_id}
+    )
+    return response
+
+
+def new_checkout(connection, cart_id: int, order_id: uuid.UUID):
+    return carts.execute_checkout(connection, cart_id, order_id)
+
+
+def prepare_cart(connection, n_items: int) -> int:
+    cart_id = connection.execute(
+        sqlalchemy.text("INSERT INTO carts DEFAULT VALUES RETURNING cart_id")
+    ).scalar_one()
+    for sku in list(catalog.POTION_DEFINITIONS)[:n_items]:
+        connection.execute(
+            sqlalchemy.text(
+                "INSERT INTO cart_items (cart_id, item_sku, quantity, unit_price) "
+                "VALUES (:cid, :sku, 1, :price)"
+            ),
+            {"cid": cart_id, "sku": sku, "price": catalog.CURRENT_PRICES[sku]},
+        )
+        connection.execute(
+            sqlalchemy.text(
+                "INSERT INTO ledger_entries (resource, change, context) "
+                "VALUES (:resource, 1, 'benchmark stock')"
+            ),
+            {"resource": catalog.POTION_DEFINITIONS[sku]["resource"]},
+        )
+    return cart_id
+
+
+def time_checkouts(checkout, runs: int, n_items: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        with db.engine.connect() as connection:
+            transaction = connection.begin()
+            cart_id = prepare_cart(connection, n_items)
+            start = time.perf_counter()
+            checkout(connection, cart_id, uuid.uuid4())
+            timings.append((time.perf_counter() - start) * 1000)
+            transaction.rollback()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--items", type=int, default=3)
+    args = parser.parse_args()
+
+    for name, checkout in (("legacy", legacy_checkout), ("single", new_checkout)):
+        timings = time_checkouts(checkout, args.runs, args.items)
+        print(
+            f"{name:<7} median {statistics.median(timings):7.3f} ms  "
+            f"p95 {statistics.quantiles(timings, n=20)[-1]:7.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
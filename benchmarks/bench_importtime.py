@@ -0,0 +1,74 @@
+"""
+Cold-start benchmark: how long ``import src.api.server`` takes in a fresh
+interpreter, measured with ``python -X importtime``.
+
+    python -m benchmarks.bench_importtime [--runs 10] [--top 15] [--max-ms 1200]
+
+Prints the best of ``--runs`` runs as JSON (total plus the slowest top-level
+imports). With ``--max-ms`` it exits non-zero when the total exceeds the
+budget, so it can run as a CI step.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+MODULE = "src.api.server"
+
+
+def measure(module: str) -> dict[str, int]:
+    """
+    Returns cumulative import time in microseconds per module imported
+    directly (not transitively) by the interpreter or ``module`` itself.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        name = name[1:].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            timings[name.strip()] = int(cumulative_us)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--max-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    best = min((measure(MODULE) for _ in range(args.runs)), key=lambda t: t[MODULE])
+    total_ms = best[MODULE] / 1000
+    slowest = sorted(
+        ((name, us / 1000) for name, us in best.items() if name != MODULE),
+        key=lambda item: item[1],
+        reverse=True,
+    )[: args.top]
+
+    print(
+        json.dumps(
+            {
+                "module": MODULE,
+                "total_ms": round(total_ms, 1),
+                "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest},
+            },
+            indent=2,
+        )
+    )
+    if args.max_ms is not None and total_ms > args.max_ms:
+        print(f"Import time {total_ms:.1f} ms exceeds budget of {args.max_ms} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
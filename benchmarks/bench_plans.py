@@ -0,0 +1,105 @@
+"""
+Scores the same batch of candidate barrel plans with src.plans.score_plans
+(NumPy) and with per-plan, per-color Python loops, and checks both agree.
+
+    python -m benchmarks.bench_plans [--barrels 6] [--candidates 4096]
+"""
+
+import argparse
+import math
+import timeit
+from types import SimpleNamespace
+
+import numpy as np
+
+from src import plans
+
+COLORS = plans.COLORS
+
+
+def score_plans_loop(candidates, barrels, ml, potions, prices, demand, gold):
+    scores = []
+    for quantities in candidates:
+        cost = 0
+        ml_after = dict(zip(COLORS, ml))
+        for barrel, quantity in zip(barrels, quantities):
+            cost += barrel["price"] * quantity
+            for i, color in enumerate(COLORS):
+                ml_per_barrel = int(plans.ML_PER_BARREL * barrel["potion_type"][i])
+                ml_after[color] += ml_per_barrel * quantity
+        if cost > gold:
+            scores.append(-math.inf)
+            continue
+        revenue = 0
+        for i, color in enumerate(COLORS):
+            producible = ml_after[color] // plans.ML_PER_POTION
+            revenue += min(potions[i] + producible, demand[i]) * prices[i]
+        scores.append(revenue - cost)
+    return scores
+
+
+def make_catalog(n: int, rng: np.random.Generator) -> list[dict]:
+    catalog = []
+    for i in range(n):
+        if i < len(COLORS):
+            mix = np.eye(len(COLORS))[i]
+        else:
+            mix = rng.dirichlet(np.ones(len(COLORS)))
+        catalog.append(
+            {
+                "sku": f"BARREL_{i}",
+                "potion_type": mix.tolist(),
+                "price": int(rng.integers(60, 400)),
+                "quantity": 10,
+            }
+        )
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--barrels", type=int, default=6)
+    parser.add_argument("--candidates", type=int, default=plans.MAX_CANDIDATES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    catalog = make_catalog(args.barrels, rng)
+    rows = [SimpleNamespace(**barrel) for barrel in catalog]
+    barrel_ml, barrel_price, available = plans.barrel_arrays(rows)
+    gold = 1000
+    candidates = plans.candidate_plans(barrel_price, available, gold, args.candidates)
+    state = {
+        "ml": [120, 0, 40, 0],
+        "potions": [2, 5, 0, 1],
+        "prices": [50, 60, 70, 90],
+        "demand": [10, 10, 10, 10],
+    }
+
+    def vectorized():
+        return plans.score_plans(
+            candidates,
+            barrel_ml,
+            barrel_price,
+            np.array(state["ml"]),
+            np.array(state["potions"]),
+            np.array(state["prices"]),
+            np.array(state["demand"]),
+            gold,
+        )
+
+    candidate_rows = candidates.tolist()
+
+    def loop():
+        return score_plans_loop(candidate_rows, catalog, gold=gold, **state)
+
+    assert vectorized().tolist() == loop()
+
+    print(f"{len(candidates)} candidate plans over {args.barrels} barrels")
+    for name, fn in (("loop", loop), ("numpy", vectorized)):
+        number = 20
+        seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+        print(f"{name:<6} {seconds * 1000:8.3f} ms/batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Compares the old list-endpoint response path (Pydantic models, re-validated
+against ``response_model`` and encoded with stdlib json) with returning
+FastJSONResponse built straight from row dicts.
+
+    python -m benchmarks.bench_serialization
+"""
+
+import timeit
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.api.catalog import CatalogItem
+from src.api.responses import FastJSONResponse
+
+SIZES = (50, 5000)
+
+
+def make_rows(n: int) -> list[dict]:
+    return [
+        {
+            "sku": f"POTION_{i}",
+            "name": f"Potion {i}",
+            "quantity": i % 100 + 1,
+            "price": i % 400 + 1,
+            "potion_type": [100, 0, 0, 0],
+        }
+        for i in range(n)
+    ]
+
+
+def make_app(rows: list[dict]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/models", response_model=List[CatalogItem])
+    def models():
+        return [CatalogItem(**row) for row in rows]
+
+    @app.get("/fast", response_model=List[CatalogItem])
+    def fast():
+        return FastJSONResponse(rows)
+
+    return app
+
+
+def main():
+    for size in SIZES:
+        client = TestClient(make_app(make_rows(size)))
+        assert client.get("/models").json() == client.get("/fast").json()
+
+        number = max(10, 5000 // size)
+        for path in ("/models", "/fast"):
+            seconds = min(
+                timeit.repeat(lambda: client.get(path), number=number, repeat=5)
+            )
+            print(
+                f"{size:>5} items {path:<8} {seconds / number * 1000:8.3f} ms/request"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Per-statement latency of the hot queries with and without statement reuse:
+"adhoc" builds a new ``sqlalchemy.text`` for every call on an engine that
+never prepares, as the handlers used to; "prepared" executes the
+module-level statements on an engine with psycopg's ``prepare_threshold``,
+so after the first few calls Postgres skips parsing and planning. Needs a
+Postgres at POSTGRES_URI with the app schema; checkouts are rolled back.
+
+    python -m benchmarks.bench_statements [--runs 500] [--threshold 1]
+"""
+
+import argparse
+import statistics
+import time
+import uuid
+
+import sqlalchemy
+
+from benchmarks.bench_checkout import prepare_cart
+from src import config
+from src.api import carts, catalog
+
+
+def make_engine(prepare_threshold: int | None):
+    return sqlalchemy.create_engine(
+        config.get_settings().POSTGRES_URI,
+        connect_args={"prepare_threshold": prepare_threshold},
+    )
+
+
+def catalog_adhoc(connection):
+    connection.execute(sqlalchemy.text(catalog.POTION_BALANCES_SQL.text)).all()
+
+
+def catalog_prepared(connection):
+    connection.execute(catalog.POTION_BALANCES_SQL).all()
+
+
+SEARCH_PARAMS = {"customer_name": "%", "potion_sku": "%"}
+
+
+def search_adhoc(connection):
+    statement = carts.SEARCH_SQL["postgresql"][
+        carts.SearchSortOptions.timestamp, carts.SearchSortOrder.desc
+    ]
+    connection.execute(sqlalchemy.text(statement.element.text), SEARCH_PARAMS).all()
+
+
+def search_prepared(connection):
+    statement = carts.SEARCH_SQL["postgresql"][
+        carts.SearchSortOptions.timestamp, carts.SearchSortOrder.desc
+    ]
+    connection.execute(statement, SEARCH_PARAMS).all()
+
+
+def time_reads(engine, query, runs: int) -> list[float]:
+    timings = []
+    with engine.connect() as connection:
+        for _ in range(runs):
+            start = time.perf_counter()
+            query(connection)
+            timings.append((time.perf_counter() - start) * 1000)
+            connection.rollback()
+    return timings
+
+
+def time_checkouts(engine, adhoc: bool, runs: int) -> list[float]:
+    statement = carts.CHECKOUT_SQL
+    timings = []
+    with engine.connect() as connection:
+        for _ in range(runs):
+            transaction = connection.begin()
+            cart_id = prepare_cart(connection, 3)
+            if adhoc:
+                statement = sqlalchemy.text(carts.CHECKOUT_SQL.text)
+            start = time.perf_counter()
+            connection.execute(
+                statement, carts.checkout_params(cart_id, uuid.uuid4())
+            ).one()
+            timings.append((time.perf_counter() - start) * 1000)
+            transaction.rollback()
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    print(
+        f"{name:<18} median {statistics.median(timings):7.3f} ms  "
+        f"p95 {statistics.quantiles(timings, n=20)[-1]:7.3f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--threshold", type=int, default=1)
+    args = parser.parse_args()
+
+    adhoc = make_engine(None)
+    prepared = make_engine(args.threshold)
+    report("catalog adhoc", time_reads(adhoc, catalog_adhoc, args.runs))
+    report("catalog prepared", time_reads(prepared, catalog_prepared, args.runs))
+    report("search adhoc", time_reads(adhoc, search_adhoc, args.runs))
+    report("search prepared", time_reads(prepared, search_prepared, args.runs))
+    report("checkout adhoc", time_checkouts(adhoc, True, args.runs))
+    report("checkout prepared", time_checkouts(prepared, False, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Prints an API_KEYS_FILE line for a key:
+
+    python -m scripts.hash_api_key <key_id> <key>
+"""
+
+import sys
+
+from src.api.auth import hash_key
+
+
+def main():
+    key_id, key = sys.argv[1], sys.argv[2]
+    print(f"{key_id}:{hash_key(key)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Write-behind buffer for analytics rows (checkout_logs, bottling_logs,
+catalog_snapshots).
+
+Endpoints hand rows to ``record`` after their business transaction commits
+and return; a background thread inserts them in multi-row batches every
+ANALYTICS_FLUSH_MS or once ANALYTICS_MAX_BATCH rows are waiting. Rows are
+stamped when recorded, not when flushed. The queue is bounded: when it is
+full ``record`` waits briefly, then drops the row rather than slow the
+request further. Pending rows, and a batch waiting to be retried, are
+flushed when the app shuts down.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import sqlalchemy
+
+from src import config, database as db
+
+logger = logging.getLogger(__name__)
+
+# How long record() waits for room in a full queue before dropping the row.
+BACKPRESSURE_TIMEOUT_SECONDS = 0.05
+# A batch that fails to insert is retried this many times, then dropped.
+MAX_ATTEMPTS = 3
+
+_STOP = object()
+
+
+def insert_sql(table: str, columns: list[str], rows: int) -> sqlalchemy.TextClause:
+    values = ", ".join(
+        "(" + ", ".join(f":{column}_{i}" for column in columns) + ")"
+        for i in range(rows)
+    )
+    return sqlalchemy.text(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values}"
+    )
+
+
+class WriteBehindBuffer:
+    def __init__(self, flush_interval: float, max_batch: int, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.dropped = 0
+
+    def record(self, table: str, row: dict) -> bool:
+        self._ensure_started()
+        row = {"timestamp": datetime.now(timezone.utc), **row}
+        try:
+            self._queue.put((table, row), timeout=BACKPRESSURE_TIMEOUT_SECONDS)
+        except queue.Full:
+            self.dropped += 1
+            logger.warning("Analytics queue full; dropped a %s row", table)
+            return False
+        return True
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._stopping.clear()
+                    self._thread = threading.Thread(
+                        target=self._run, name="analytics-flusher", daemon=True
+                    )
+                    self._thread.start()
+
+    def _run(self):
+        retry: list[tuple[int, str, dict]] = []
+        while True:
+            # Once stopping, drain what's queued without waiting for more.
+            stopping = self._stopping.is_set()
+            batch, retry = retry, []
+            deadline = time.monotonic() + (0 if stopping else self.flush_interval)
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping, deadline = True, time.monotonic()
+                    continue
+                batch.append((0, *item))
+            if batch:
+                retry = self._flush(batch)
+            # A failed batch gets its remaining attempts before we exit.
+            if stopping and not retry and self._queue.empty():
+                return
+
+    def _flush(self, batch: list[tuple[int, str, dict]]) -> list[tuple[int, str, dict]]:
+        by_table: dict[tuple[str, tuple], list[dict]] = defaultdict(list)
+        for _, table, row in batch:
+            by_table[(table, tuple(row))].append(row)
+        try:
+            with db.engine.begin() as connection:
+                for (table, columns), rows in by_table.items():
+                    params = {
+                        f"{column}_{i}": row[column]
+                        for i, row in enumerate(rows)
+                        for column in columns
+                    }
+                    connection.execute(
+                        insert_sql(table, list(columns), len(rows)), params
+                    )
+        except Exception:
+            logger.exception("Failed to write %d analytics rows", len(batch))
+            retry = [(attempts + 1, table, row) for attempts, table, row in batch]
+            kept = [item for item in retry if item[0] < MAX_ATTEMPTS]
+            self.dropped += len(retry) - len(kept)
+            return kept
+        return []
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Flushes everything recorded so far and stops the flusher thread.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stopping.set()
+            try:
+                # Wakes the flusher if it is waiting for rows.
+                self._queue.put(_STOP, timeout=BACKPRESSURE_TIMEOUT_SECONDS)
+            except queue.Full:
+                pass  # it is busy with a full queue and will see _stopping
+            thread.join(timeout)
+
+
+_buffer: WriteBehindBuffer | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> WriteBehindBuffer:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                settings = config.get_settings()
+                _buffer = WriteBehindBuffer(
+                    settings.ANALYTICS_FLUSH_MS / 1000,
+                    settings.ANALYTICS_MAX_BATCH,
+                    settings.ANALYTICS_MAX_PENDING,
+                )
+                atexit.register(_buffer.stop)
+    return _buffer
+
+
+def record(table: str, **row) -> bool:
+    return get_buffer().record(table, row)
+
+
+def flush():
+    """
+    Writes out pending rows (on shutdown).
+    """
+    if _buffer is not None:
+        _buffer.stop()
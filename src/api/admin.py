@@ -1,7 +1,13 @@
-from fastapi import APIRouter, Depends, status
+import logging
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, status
 import sqlalchemy
-from src.api import auth
-from src import database as db
+from src.api import auth, catalog
+from src import database as db, maintenance, pubsub, replay
+from src.cache import completed_orders
+from src.scheduler import scheduler
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/admin",
@@ -10,43 +16,114 @@ router = APIRouter(
 )
 
 
+RESET_CARTS_SQL = {
+    "postgresql": [sqlalchemy.text("TRUNCATE cart_items, carts")],
+    "sqlite": [
+        sqlalchemy.text("DELETE FROM cart_items"),
+        sqlalchemy.text("DELETE FROM carts"),
+    ],
+}
+
+
+def forget_previous_game():
+    """
+    Drops this worker's in-process state from before a reset: remembered
+    order ids and the prices last offered.
+    """
+    completed_orders.clear()
+    catalog.reset_prices()
+
+
+def on_ledger_change(payload):
+    # "*" is sent when a new epoch starts; None only means the listener
+    # reconnected, which is no reason to forget anything.
+    if payload == "*":
+        forget_previous_game()
+
+
+pubsub.subscribe(pubsub.LEDGER_CHANNEL, on_ledger_change)
+
+
 @router.post("/reset", status_code=status.HTTP_204_NO_CONTENT)
 def reset():
     """
-    Reset the game state. Gold goes to 100, all potion and ml quantities
-    are reset to 0, all carts and cart items are deleted, and potions are reset.
+    Reset the game state. Starts a new ledger epoch seeded with 100 gold, so
+    all potion and ml balances read as 0, and truncates carts and cart items.
+    Old epochs are left for the retention job to clear in the background.
+    Every worker forgets the old game's order ids and prices.
     """
     with db.engine.begin() as connection:
-        # Reset global_inventory
+        epoch = connection.execute(
+            sqlalchemy.text("INSERT INTO ledger_epochs DEFAULT VALUES RETURNING id")
+        ).scalar_one()
         connection.execute(
-            sqlalchemy.text(
-                """
-                UPDATE global_inventory
-                SET
-                    gold = 100,
-                    red_ml = 0,
-                    green_ml = 0,
-                    blue_ml = 0,
-                    red_potions = 0,
-                    green_potions = 0,
-                    blue_potions = 0
-                """
-            )
+            sqlalchemy.text("""
+                INSERT INTO ledger_entries (epoch, resource, change, context)
+                VALUES (:epoch, 'gold', 100, 'reset')
+            """),
+            {"epoch": epoch},
         )
+        for statement in db.variant(connection, RESET_CARTS_SQL):
+            connection.execute(statement)
 
-        # Clear cart-related data
-        connection.execute(sqlalchemy.text("DELETE FROM cart_items"))
-        connection.execute(sqlalchemy.text("DELETE FROM carts"))
-        
-        # Reset potions table (all potions set to 0 quantity)
-        connection.execute(
-            sqlalchemy.text(
-                """
-                UPDATE potions
-                SET
-                    quantity = 0
-                """
-            )
-        )
+    forget_previous_game()
+    logger.info("Game state has been reset; ledger epoch is now %d", epoch)
+
+
+@router.get("/keys/usage")
+def get_key_usage():
+    """
+    Request counts and rates per API key id since the server started.
+    """
+    return auth.request_counter.snapshot()
 
-    print("Game state has been reset!")
+
+@router.post("/maintenance/retention")
+def run_retention():
+    """
+    Deletes (or archives) rows older than the configured retention windows
+    and reports the rows removed and time spent per table.
+    """
+    return maintenance.run_retention()
+
+
+@router.get("/scheduler")
+def get_scheduler_stats():
+    """
+    Interval, run count, failures and timings of each background job in
+    this worker. Leader-only jobs count as skipped on the other workers.
+    """
+    return scheduler.snapshot()
+
+
+@router.get("/ledger/balances")
+def get_balances_at(
+    entry_id: int | None = None,
+    at: datetime | None = None,
+    day: str | None = None,
+    hour: int | None = None,
+):
+    """
+    All ledger balances as of a ledger entry id, timestamp or game day and hour.
+    """
+    with db.engine.begin() as connection:
+        try:
+            target = replay.resolve_entry_id(connection, entry_id, at, day, hour)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        snapshot = replay.balances_at(connection, target)
+    return {
+        "epoch": snapshot.epoch,
+        "entry_id": snapshot.entry_id,
+        "balances": snapshot.balances,
+    }
+
+
+@router.post("/ledger/checkpoints")
+def create_ledger_checkpoint():
+    """
+    Checkpoints current balances to keep point-in-time queries fast.
+    """
+    with db.engine.begin() as connection:
+        snapshot = replay.create_checkpoint(connection)
+    return {"epoch": snapshot.epoch, "entry_id": snapshot.entry_id}
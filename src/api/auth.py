@@ -1,16 +1,179 @@
+import hashlib
+import hmac
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Sequence
+
 from src import config
 from fastapi import Security, HTTPException, status, Request
 from fastapi.security.api_key import APIKeyHeader
 
-api_key = config.get_settings().API_KEY
+logger = logging.getLogger(__name__)
+
 api_key_header = APIKeyHeader(name="access_token", auto_error=False)
 
+# How often the key file is checked for rotation.
+RELOAD_INTERVAL_SECONDS = 1.0
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+@dataclass(frozen=True)
+class StoredKey:
+    key_id: str
+    digest: bytes
+
+
+def parse_key_line(line: str) -> StoredKey:
+    key_id, _, hex_digest = line.rpartition(":")
+    digest = bytes.fromhex(hex_digest)
+    if len(digest) != hashlib.sha256().digest_size:
+        raise ValueError(f"expected a sha256 digest, got {len(digest)} bytes")
+    return StoredKey(key_id or hex_digest[:8], digest)
+
+
+def parse_key_lines(lines, previous: Sequence[StoredKey] = ()) -> list[StoredKey]:
+    """
+    Parses ``<key_id>:<sha256 hex>`` lines (a bare hash uses its first 8
+    characters as the id). Blank lines and ``#`` comments are ignored.
+
+    Malformed lines (say, a key file caught half written) are logged and
+    skipped; if one names a key in ``previous``, that key is kept instead.
+    """
+    previous_by_id = {key.key_id: key for key in previous}
+    keys = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            keys.append(parse_key_line(line))
+        except ValueError as e:
+            logger.warning("Skipping malformed API key on line %d: %s", number, e)
+            key_id = line.rpartition(":")[0]
+            if key_id in previous_by_id:
+                keys.append(previous_by_id[key_id])
+    return keys
+
+
+class KeyStore:
+    """
+    Hashed API keys, compared in constant time. Keys come from the
+    ``API_KEY``/``API_KEYS`` settings plus an optional key file which is
+    re-read whenever it changes, so keys can be rotated without a restart.
+    """
+
+    def __init__(self, static_keys: list[StoredKey], key_file: str | None = None):
+        self.static_keys = static_keys
+        self.key_file = key_file
+        self.keys = list(static_keys)
+        self.file_keys: list[StoredKey] = []
+        self._file_mtime: float | None = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        if not self.key_file:
+            return
+        try:
+            mtime = os.stat(self.key_file).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._file_mtime:
+            return
+
+        file_keys = []
+        if mtime is not None:
+            try:
+                with open(self.key_file) as f:
+                    file_keys = parse_key_lines(f, self.file_keys)
+            except (OSError, UnicodeDecodeError):
+                logger.warning("Keeping the current API keys", exc_info=True)
+                return
+        self.file_keys = file_keys
+        self.keys = self.static_keys + file_keys
+        self._file_mtime = mtime
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + RELOAD_INTERVAL_SECONDS
+            self.reload()
+
+    def verify(self, candidate: str) -> str | None:
+        """
+        Returns the id of the matching key, or None. Every stored key is
+        compared so timing doesn't reveal which one matched.
+        """
+        self.maybe_reload()
+        digest = hashlib.sha256(candidate.encode()).digest()
+        matched = None
+        for key in self.keys:
+            if hmac.compare_digest(digest, key.digest):
+                matched = key.key_id
+        return matched
+
+
+class RequestCounter:
+    """
+    Per-key request counts. ``next()`` on an ``itertools.count`` is atomic,
+    so the hot path takes no lock.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._counters: dict[str, itertools.count] = {}
+        self._counts: dict[str, int] = {}
+
+    def record(self, key_id: str):
+        counter = self._counters.get(key_id)
+        if counter is None:
+            counter = self._counters.setdefault(key_id, itertools.count(1))
+        self._counts[key_id] = next(counter)
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        return {
+            key_id: {"requests": count, "requests_per_second": count / elapsed}
+            for key_id, count in self._counts.items()
+        }
+
+
+_key_store: KeyStore | None = None
+request_counter = RequestCounter()
+
+
+def get_key_store() -> KeyStore:
+    global _key_store
+    if _key_store is None:
+        settings = config.get_settings()
+        static_keys = []
+        if settings.API_KEY:
+            digest = hashlib.sha256(settings.API_KEY.encode()).digest()
+            static_keys.append(StoredKey("default", digest))
+        if settings.API_KEYS:
+            static_keys.extend(parse_key_lines(settings.API_KEYS.split(",")))
+        _key_store = KeyStore(static_keys, settings.API_KEYS_FILE)
+    return _key_store
+
 
 async def get_api_key(request: Request, api_key_header: str = Security(api_key_header)):
-    print(f"api_key_header: {api_key_header}, api_key: {api_key}")
-    if api_key_header == api_key:
-        return api_key_header
-    else:
+    key_id = get_key_store().verify(api_key_header) if api_key_header else None
+    if key_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Forbidden"
         )
+    request.state.api_key_id = key_id
+    request_counter.record(key_id)
+    return api_key_header
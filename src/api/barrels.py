@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, status, HTTPException
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional
 from uuid import UUID
-import random
 import sqlalchemy
-from src.api import auth
-from src import database as db
+from src.api import auth, catalog as catalog_api, inventory as inventory_api
+from src import database as db, ledger
+from src.cache import completed_orders, MISSING
+from src.api.responses import FastJSONResponse
 
 router = APIRouter(
     prefix="/barrels",
@@ -35,65 +36,132 @@ class BarrelOrder(BaseModel):
 
 # ---- Utilities ----
 
+INVENTORY_SQL = sqlalchemy.text("""
+    SELECT 
+        COALESCE(SUM(CASE WHEN resource = 'gold' THEN change ELSE 0 END), 0) AS gold,
+        COALESCE(SUM(CASE WHEN resource = 'red_ml' THEN change ELSE 0 END), 0) AS red_ml,
+        COALESCE(SUM(CASE WHEN resource = 'green_ml' THEN change ELSE 0 END), 0) AS green_ml,
+        COALESCE(SUM(CASE WHEN resource = 'blue_ml' THEN change ELSE 0 END), 0) AS blue_ml,
+        COALESCE(SUM(CASE WHEN resource = 'dark_ml' THEN change ELSE 0 END), 0) AS dark_ml,
+        COALESCE(SUM(CASE WHEN resource = 'red_potions' THEN change ELSE 0 END), 0) AS red_potions,
+        COALESCE(SUM(CASE WHEN resource = 'green_potions' THEN change ELSE 0 END), 0) AS green_potions,
+        COALESCE(SUM(CASE WHEN resource = 'blue_potions' THEN change ELSE 0 END), 0) AS blue_potions,
+        COALESCE(SUM(CASE WHEN resource = 'dark_potions' THEN change ELSE 0 END), 0) AS dark_potions
+    FROM current_ledger_entries
+""")
+
 def get_current_inventory(connection):
-    query = """
-        SELECT 
-            COALESCE(SUM(CASE WHEN resource = 'gold' THEN change ELSE 0 END), 0) AS gold,
-            COALESCE(SUM(CASE WHEN resource = 'red_ml' THEN change ELSE 0 END), 0) AS red_ml,
-            COALESCE(SUM(CASE WHEN resource = 'green_ml' THEN change ELSE 0 END), 0) AS green_ml,
-            COALESCE(SUM(CASE WHEN resource = 'blue_ml' THEN change ELSE 0 END), 0) AS blue_ml,
-            COALESCE(SUM(CASE WHEN resource = 'dark_ml' THEN change ELSE 0 END), 0) AS dark_ml
-        FROM ledger_entries
-    """
-    return connection.execute(sqlalchemy.text(query)).mappings().one()
+    return connection.execute(INVENTORY_SQL).mappings().one()
 
 # ---- Endpoint: /barrels/deliver/{order_id} ----
 
+def apply_barrel_delivery(
+    connection, barrels: List[Barrel], order_id: UUID, balances=None
+):
+    """
+    Writes the delivery to the ledger and returns the balance changes, or
+    None if the order was already processed. ``balances`` (ml and capacity)
+    are read from the ledger unless the caller already has them.
+    """
+    # Check for duplicate order
+    existing = connection.execute(
+        ledger.ORDER_EXECUTED_SQL, {"oid": str(order_id)}
+    ).first()
+    if existing:
+        return None
+
+    total_gold = sum(barrel.price * barrel.quantity for barrel in barrels)
+
+    # Compute total ml per color
+    color_map = ["red_ml", "green_ml", "blue_ml", "dark_ml"]
+    ml_totals = {color: 0 for color in color_map}
+
+    for barrel in barrels:
+        ml_per_barrel = 1000  # Fixed amount
+        total_ml = barrel.quantity * ml_per_barrel
+        for i, color in enumerate(color_map):
+            ml_totals[color] += int(total_ml * barrel.potion_type[i])
+
+    if balances is None:
+        balances = ledger.balances(
+            connection, ledger.ML_RESOURCES + inventory_api.CAPACITY_RESOURCES
+        )
+    ml_capacity = inventory_api.capacity_from_balances(balances).ml
+    if ledger.total(balances, ledger.ML_RESOURCES) + sum(ml_totals.values()) > ml_capacity:
+        raise HTTPException(
+            status_code=400, detail=f"Delivery exceeds ml capacity of {ml_capacity}"
+        )
+
+    # Insert ledger entries for ml and gold
+    changes = {color: amount for color, amount in ml_totals.items() if amount > 0}
+    changes["gold"] = -total_gold
+    connection.execute(
+        ledger.INSERT_ENTRY_SQL,
+        [
+            {"resource": resource, "change": change, "context": "barrel delivery"}
+            for resource, change in changes.items()
+        ],
+    )
+
+    # Record order ID for idempotency
+    connection.execute(ledger.RECORD_ORDER_SQL, {"oid": str(order_id)})
+    return changes
+
 @router.post("/deliver/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
 def deliver_barrels(barrels: List[Barrel], order_id: UUID):
-    with db.engine.begin() as connection:
-        # Check for duplicate order
-        existing = connection.execute(
-            sqlalchemy.text("SELECT 1 FROM executed_orders WHERE order_id = :oid"),
-            {"oid": str(order_id)}
-        ).first()
-        if existing:
-            return  # Idempotent: do nothing if already processed
-
-        total_gold = sum(barrel.price * barrel.quantity for barrel in barrels)
-
-        # Compute total ml per color
-        color_map = ["red_ml", "green_ml", "blue_ml", "dark_ml"]
-        ml_totals = {color: 0 for color in color_map}
-
-        for barrel in barrels:
-            ml_per_barrel = 1000  # Fixed amount
-            total_ml = barrel.quantity * ml_per_barrel
-            for i, color in enumerate(color_map):
-                ml_totals[color] += int(total_ml * barrel.potion_type[i])
-
-        # Insert ledger entries for ml and gold
-        for color, amount in ml_totals.items():
-            if amount > 0:
-                connection.execute(
-                    sqlalchemy.text(
-                        "INSERT INTO ledger_entries (resource, change, context) VALUES (:resource, :change, 'barrel delivery')"
-                    ),
-                    {"resource": color, "change": amount}
-                )
-
-        connection.execute(
-            sqlalchemy.text(
-                "INSERT INTO ledger_entries (resource, change, context) VALUES ('gold', :change, 'barrel delivery')"
-            ),
-            {"change": -total_gold}
-        )
+    if completed_orders.get(order_id) is not MISSING:
+        return  # Idempotent: already processed
 
-        # Record order ID for idempotency
-        connection.execute(
-            sqlalchemy.text("INSERT INTO executed_orders (order_id) VALUES (:oid)"),
-            {"oid": str(order_id)}
-        )
+    with db.engine.begin() as connection:
+        apply_barrel_delivery(connection, barrels, order_id)
+
+    completed_orders.put(order_id, None)
+
+# ---- Planner ----
+
+# Potions of each color we expect to sell before the next delivery.
+EXPECTED_DEMAND = (10, 10, 10, 10)
+
+BASE_PRICES = [
+    info["base_price"]
+    for info in sorted(
+        catalog_api.POTION_DEFINITIONS.values(), key=lambda info: info["type"].index(100)
+    )
+]
+
+
+def create_barrel_plan(
+    gold: int,
+    red_ml: int,
+    green_ml: int,
+    blue_ml: int,
+    dark_ml: int,
+    red_potions: int,
+    green_potions: int,
+    blue_potions: int,
+    dark_potions: int,
+    wholesale_catalog: List[Barrel],
+    max_barrel_capacity: Optional[int] = None,
+) -> List[BarrelOrder]:
+    """
+    Scores every affordable combination of barrels (see src.plans) that fits
+    in ``max_barrel_capacity`` ml by the revenue of the potions it lets us
+    bottle, up to expected demand, less its cost, and returns the best one.
+    Pure function of its inputs, so it can also be driven offline by
+    src.backtest.
+    """
+    from src import plans  # NumPy is loaded on first plan, not at startup
+
+    plan = plans.best_plan(
+        wholesale_catalog,
+        gold,
+        ml=[red_ml, green_ml, blue_ml, dark_ml],
+        potions=[red_potions, green_potions, blue_potions, dark_potions],
+        prices=BASE_PRICES,
+        demand=EXPECTED_DEMAND,
+        max_ml=max_barrel_capacity,
+    )
+    return [BarrelOrder(sku=sku, quantity=quantity) for sku, quantity in plan.items()]
 
 # ---- Endpoint: /barrels/plan ----
 
@@ -101,39 +169,15 @@ def deliver_barrels(barrels: List[Barrel], order_id: UUID):
 def plan_barrels(catalog: List[Barrel]):
     with db.engine.begin() as connection:
         inventory = get_current_inventory(connection)
-
-        # Get potion counts
-        potions = connection.execute(
-            sqlalchemy.text("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN resource = 'red_potions' THEN change ELSE 0 END), 0) AS red_potions,
-                    COALESCE(SUM(CASE WHEN resource = 'green_potions' THEN change ELSE 0 END), 0) AS green_potions,
-                    COALESCE(SUM(CASE WHEN resource = 'blue_potions' THEN change ELSE 0 END), 0) AS blue_potions
-                FROM ledger_entries
-            """)
-        ).mappings().one()
-
-        # Choose a color with < 5 potions
-        potion_counts = {
-            "red": potions.red_potions,
-            "green": potions.green_potions,
-            "blue": potions.blue_potions,
-        }
-        candidates = [color for color, count in potion_counts.items() if count < 5]
-        if not candidates:
-            return []
-
-        chosen_color = random.choice(candidates)
-        color_index = {"red": 0, "green": 1, "blue": 2}[chosen_color]
-
-        # Find matching barrels
-        eligible = [
-            b for b in catalog
-            if b.potion_type[color_index] == 1.0 and b.price <= inventory.gold
+    capacity = inventory_api.get_capacity()
+
+    return FastJSONResponse(
+        [
+            order.model_dump()
+            for order in create_barrel_plan(
+                **inventory,
+                wholesale_catalog=catalog,
+                max_barrel_capacity=capacity.ml,
+            )
         ]
-
-        if not eligible:
-            return []
-
-        best_barrel = min(eligible, key=lambda b: b.price)
-        return [BarrelOrder(sku=best_barrel.sku, quantity=1)]
+    )
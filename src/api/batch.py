@@ -0,0 +1,159 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Callable, List, Literal, Union
+from uuid import UUID
+
+from src import database as db, ledger, ratelimit
+from src.api import auth, barrels, bottler, inventory
+from src.api.responses import FastJSONResponse
+from src.cache import completed_orders, MISSING
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["batch"],
+    dependencies=[Depends(auth.get_api_key)],
+)
+
+
+class BarrelsPlan(BaseModel):
+    op: Literal["barrels/plan"]
+    catalog: List[barrels.Barrel]
+
+
+class BarrelsDeliver(BaseModel):
+    op: Literal["barrels/deliver"]
+    order_id: UUID
+    barrels: List[barrels.Barrel]
+
+
+class BottlerPlan(BaseModel):
+    op: Literal["bottler/plan"]
+
+
+class BottlerDeliver(BaseModel):
+    op: Literal["bottler/deliver"]
+    potions: List[bottler.PotionMix]
+
+
+class InventoryPlan(BaseModel):
+    op: Literal["inventory/plan"]
+
+
+Operation = Annotated[
+    Union[BarrelsPlan, BarrelsDeliver, BottlerPlan, BottlerDeliver, InventoryPlan],
+    Field(discriminator="op"),
+]
+
+BARREL_PLAN_RESOURCES = (
+    "gold",
+    "red_ml",
+    "green_ml",
+    "blue_ml",
+    "dark_ml",
+    "red_potions",
+    "green_potions",
+    "blue_potions",
+    "dark_potions",
+)
+
+
+def run_operation(
+    connection,
+    balances: dict[str, int],
+    operation: Operation,
+    after_commit: List[Callable[[], None]],
+) -> Any:
+    capacity = inventory.capacity_from_balances(balances)
+
+    if isinstance(operation, BarrelsPlan):
+        orders = barrels.create_barrel_plan(
+            **{
+                resource: balances.get(resource, 0)
+                for resource in BARREL_PLAN_RESOURCES
+            },
+            wholesale_catalog=operation.catalog,
+            max_barrel_capacity=capacity.ml,
+        )
+        return [order.model_dump() for order in orders]
+
+    if isinstance(operation, BarrelsDeliver):
+        order_id = operation.order_id
+        if completed_orders.get(order_id) is MISSING:
+            changes = barrels.apply_barrel_delivery(
+                connection, operation.barrels, order_id, balances
+            )
+            ledger.apply(balances, changes or {})
+            after_commit.append(lambda: completed_orders.put(order_id, None))
+        return None
+
+    if isinstance(operation, BottlerPlan):
+        mixes = bottler.create_bottle_plan(
+            red_ml=balances.get("red_ml", 0),
+            green_ml=balances.get("green_ml", 0),
+            blue_ml=balances.get("blue_ml", 0),
+            dark_ml=balances.get("dark_ml", 0),
+            current_potions=ledger.total(balances, ledger.POTION_RESOURCES),
+            maximum_potion_capacity=capacity.potions,
+        )
+        return [mix.model_dump(mode="json") for mix in mixes]
+
+    if isinstance(operation, BottlerDeliver):
+        changes, completed, bottled = bottler.apply_bottling(
+            connection, operation.potions, balances
+        )
+        ledger.apply(balances, changes)
+        after_commit.append(lambda: bottler.after_bottling(completed, bottled))
+        return None
+
+    return inventory.plan_capacity(connection, balances).model_dump()
+
+
+def charge_rate_limits(request: Request, operations: List[Operation]):
+    """
+    Charges every operation to the rate limits of the route it stands for,
+    so batching doesn't get around the tighter limits on deliveries.
+    """
+    limiter = getattr(request.state, "rate_limiter", None)
+    if limiter is None:
+        return
+    retry_after = limiter.charge(
+        request.state.api_key_id,
+        [ratelimit.route_group("/" + operation.op) for operation in operations],
+    )
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded.",
+            headers={"Retry-After": ratelimit.retry_after_header(retry_after)},
+        )
+
+
+@router.post("/")
+def run_batch(request: Request, operations: List[Operation]):
+    """
+    Runs a tick's operations in order in one transaction and returns each
+    one's result (plans as their endpoints return them, null for
+    deliveries). Balances are read once and updated in memory as deliveries
+    are applied, so later plans see earlier deliveries. If any operation
+    fails, none of them take effect. Each operation counts against its own
+    route's rate limit, and a batch over any of them is rejected whole.
+    """
+    charge_rate_limits(request, operations)
+    results = []
+    after_commit: List[Callable[[], None]] = []
+    with db.engine.begin() as connection:
+        balances = ledger.balances(connection)
+        for i, operation in enumerate(operations):
+            try:
+                results.append(
+                    run_operation(connection, balances, operation, after_commit)
+                )
+            except HTTPException as e:
+                raise HTTPException(
+                    status_code=e.status_code,
+                    detail=f"Operation {i} ({operation.op}): {e.detail}",
+                )
+
+    for callback in after_commit:
+        callback()
+    return FastJSONResponse(results)
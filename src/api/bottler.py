@@ -4,8 +4,10 @@ from typing import List, Optional
 from uuid import UUID
 import sqlalchemy
 
-from src.api import auth
-from src import database as db
+from src.api import auth, inventory as inventory_api
+from src import analytics, database as db, ledger
+from src.cache import completed_orders, MISSING
+from src.api.responses import FastJSONResponse
 
 router = APIRouter(
     prefix="/bottler",
@@ -28,93 +30,149 @@ class PotionMix(BaseModel):
             raise ValueError("potion_type values must sum to 100")
         return values
 
-@router.post("/deliver", status_code=status.HTTP_204_NO_CONTENT)
-def deliver_bottled_potions(potions: List[PotionMix]):
-    with db.engine.begin() as connection:
-        for potion in potions:
-            # Idempotency check
-            if potion.order_id:
-                existing = connection.execute(
-                    sqlalchemy.text("""
-                        SELECT 1 FROM executed_orders WHERE order_id = :oid
-                    """),
-                    {"oid": str(potion.order_id)}
-                ).first()
-                if existing:
-                    continue
-
-            potion_types = ["red", "green", "blue", "dark"]
-            ml_resources = [f"{color}_ml" for color in potion_types]
-            potion_resources = [f"{color}_potion" for color in potion_types]
-
-            ml_needed = {
-                ml: 50 * potion.quantity * (potion.potion_type[i] / 100)
-                for i, ml in enumerate(ml_resources)
-            }
-
-            ledger_entries = []
-            for i, ml_resource in enumerate(ml_resources):
-                used = int(ml_needed[ml_resource])
-                if used > 0:
-                    ledger_entries.append((ml_resource, -used, "Used for bottling"))
-
-            for i, potion_resource in enumerate(potion_resources):
-                if potion.potion_type[i] == 100:
-                    ledger_entries.append((potion_resource, potion.quantity, "Potion bottled"))
-                    break
-
-            for resource, change, context in ledger_entries:
-                connection.execute(
-                    sqlalchemy.text("""
-                        INSERT INTO ledger_entries (resource, change, context)
-                        VALUES (:resource, :change, :context)
-                    """),
-                    {"resource": resource, "change": change, "context": context}
-                )
-
-            # Log to bottling_logs
+def apply_bottling(connection, potions: List[PotionMix], balances=None):
+    """
+    Writes the bottling to the ledger. Returns the balance changes, the
+    order ids now done and the potions actually bottled (for after_bottling).
+    ``balances`` (potions and capacity) are read from the ledger unless the
+    caller already has them.
+    """
+    if balances is None:
+        balances = ledger.balances(
+            connection, ledger.POTION_RESOURCES + inventory_api.CAPACITY_RESOURCES
+        )
+    potion_capacity = inventory_api.capacity_from_balances(balances).potions
+    stocked = ledger.total(balances, ledger.POTION_RESOURCES)
+
+    changes: dict[str, int] = {}
+    completed = []
+    bottled = []
+    for potion in potions:
+        # Idempotency check
+        if potion.order_id:
+            if completed_orders.get(potion.order_id) is not MISSING:
+                continue
+            existing = connection.execute(
+                ledger.ORDER_EXECUTED_SQL, {"oid": str(potion.order_id)}
+            ).first()
+            if existing:
+                completed.append(potion.order_id)
+                continue
+
+        stocked += potion.quantity
+        if stocked > potion_capacity:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Bottling exceeds potion capacity of {potion_capacity}",
+            )
+
+        potion_types = ["red", "green", "blue", "dark"]
+        ml_resources = [f"{color}_ml" for color in potion_types]
+        potion_resources = [f"{color}_potions" for color in potion_types]
+
+        ml_needed = {
+            ml: 50 * potion.quantity * (potion.potion_type[i] / 100)
+            for i, ml in enumerate(ml_resources)
+        }
+
+        ledger_entries = []
+        for i, ml_resource in enumerate(ml_resources):
+            used = int(ml_needed[ml_resource])
+            if used > 0:
+                ledger_entries.append((ml_resource, -used, "Used for bottling"))
+
+        for i, potion_resource in enumerate(potion_resources):
+            if potion.potion_type[i] == 100:
+                ledger_entries.append((potion_resource, potion.quantity, "Potion bottled"))
+                break
+
+        for resource, change, context in ledger_entries:
             connection.execute(
-                sqlalchemy.text("""
-                    INSERT INTO bottling_logs (potion_type, quantity, timestamp)
-                    VALUES (:potion_type, :quantity, NOW())
-                """),
-                {
-                    "potion_type": potion.potion_type,
-                    "quantity": potion.quantity,
-                }
+                ledger.INSERT_ENTRY_SQL,
+                {"resource": resource, "change": change, "context": context}
             )
+            changes[resource] = changes.get(resource, 0) + change
 
+        bottled.append(potion)
 
-            if potion.order_id:
-                connection.execute(
-                    sqlalchemy.text("""
-                        INSERT INTO executed_orders (order_id)
-                        VALUES (:oid)
-                    """),
-                    {"oid": str(potion.order_id)}
-                )
+        if potion.order_id:
+            connection.execute(ledger.RECORD_ORDER_SQL, {"oid": str(potion.order_id)})
+            completed.append(potion.order_id)
 
-@router.post("/plan", response_model=List[PotionMix])
-def get_bottle_plan():
-    with db.engine.begin() as connection:
-        inventory = connection.execute(
-            sqlalchemy.text("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN resource = 'red_ml' THEN change ELSE 0 END), 0) AS red_ml,
-                    COALESCE(SUM(CASE WHEN resource = 'green_ml' THEN change ELSE 0 END), 0) AS green_ml,
-                    COALESCE(SUM(CASE WHEN resource = 'blue_ml' THEN change ELSE 0 END), 0) AS blue_ml,
-                    COALESCE(SUM(CASE WHEN resource = 'dark_ml' THEN change ELSE 0 END), 0) AS dark_ml
-                FROM ledger_entries
-            """)
-        ).mappings().one()
+    return changes, completed, bottled
 
+def after_bottling(completed: List[UUID], bottled: List[PotionMix]):
+    """
+    Bookkeeping once the bottling transaction has committed.
+    """
+    for order_id in completed:
+        completed_orders.put(order_id, None)
+    for potion in bottled:
+        analytics.record(
+            "bottling_logs",
+            potion_type=potion.potion_type,
+            quantity=potion.quantity,
+        )
+
+@router.post("/deliver", status_code=status.HTTP_204_NO_CONTENT)
+def deliver_bottled_potions(potions: List[PotionMix]):
+    with db.engine.begin() as connection:
+        _, completed, bottled = apply_bottling(connection, potions)
+    after_bottling(completed, bottled)
+
+def create_bottle_plan(
+    red_ml: int,
+    green_ml: int,
+    blue_ml: int,
+    dark_ml: int,
+    current_potions: int = 0,
+    maximum_potion_capacity: Optional[int] = None,
+) -> List[PotionMix]:
+    """
+    Bottles as many single-color potions as the ml on hand allows, up to the
+    room left under ``maximum_potion_capacity``.
+    """
+    room = None
+    if maximum_potion_capacity is not None:
+        room = max(maximum_potion_capacity - current_potions, 0)
     mixes = []
-    for i, color in enumerate(["red", "green", "blue", "dark"]):
-        ml_key = f"{color}_ml"
-        quantity = inventory[ml_key] // 50
+    for i, ml in enumerate([red_ml, green_ml, blue_ml, dark_ml]):
+        quantity = ml // 50
+        if room is not None:
+            quantity = min(quantity, room)
+            room -= quantity
         if quantity > 0:
             mix = [0, 0, 0, 0]
             mix[i] = 100
             mixes.append(PotionMix(potion_type=mix, quantity=int(quantity)))
-
     return mixes
+
+BOTTLE_INVENTORY_SQL = sqlalchemy.text("""
+    SELECT
+        COALESCE(SUM(CASE WHEN resource = 'red_ml' THEN change ELSE 0 END), 0) AS red_ml,
+        COALESCE(SUM(CASE WHEN resource = 'green_ml' THEN change ELSE 0 END), 0) AS green_ml,
+        COALESCE(SUM(CASE WHEN resource = 'blue_ml' THEN change ELSE 0 END), 0) AS blue_ml,
+        COALESCE(SUM(CASE WHEN resource = 'dark_ml' THEN change ELSE 0 END), 0) AS dark_ml,
+        COALESCE(SUM(CASE WHEN resource IN ('red_potions', 'green_potions', 'blue_potions', 'dark_potions') THEN change ELSE 0 END), 0) AS potions
+    FROM current_ledger_entries
+""")
+
+@router.post("/plan", response_model=List[PotionMix])
+def get_bottle_plan():
+    with db.engine.begin() as connection:
+        inventory = connection.execute(BOTTLE_INVENTORY_SQL).mappings().one()
+    capacity = inventory_api.get_capacity()
+
+    return FastJSONResponse(
+        [
+            mix.model_dump(mode="json")
+            for mix in create_bottle_plan(
+                red_ml=inventory.red_ml,
+                green_ml=inventory.green_ml,
+                blue_ml=inventory.blue_ml,
+                dark_ml=inventory.dark_ml,
+                current_potions=inventory.potions,
+                maximum_potion_capacity=capacity.potions,
+            )
+        ]
+    )
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 from uuid import UUID
+import json
 import sqlalchemy
-from typing import List
-from datetime import datetime
-from src import database as db
-from src.api import auth
+from typing import List, NamedTuple
+from src import analytics, database as db, demand, ledger
+from src.cache import completed_orders, MISSING
+from src.api import auth, catalog
+from src.api.responses import FastJSONResponse
 from enum import Enum
 from typing import Optional
 
@@ -15,6 +17,12 @@ router = APIRouter(
     dependencies=[Depends(auth.get_api_key)],
 )
 
+class Customer(BaseModel):
+    customer_id: str
+    customer_name: str
+    character_class: str
+    level: int = Field(ge=1, le=20)
+
 class CartItem(BaseModel):
     sku: str
     quantity: int = Field(ge=1)
@@ -27,146 +35,373 @@ class CheckoutResponse(BaseModel):
     total_potions_bought: int
     total_gold_paid: int
 
+CREATE_CART_SQL = sqlalchemy.text("""
+    INSERT INTO carts DEFAULT VALUES
+    RETURNING cart_id
+""")
+
+CREATE_CUSTOMER_CART_SQL = sqlalchemy.text("""
+    INSERT INTO carts (customer_name, character_class, level)
+    VALUES (:customer_name, :character_class, :level)
+    RETURNING cart_id
+""")
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
-def create_cart():
+def create_cart(customer: Optional[Customer] = None):
+    """
+    Opens a cart, for the given customer if any (searchable by their name).
+    """
     with db.engine.begin() as connection:
-        result = connection.execute(
-            sqlalchemy.text("""
-                INSERT INTO carts DEFAULT VALUES
-                RETURNING cart_id
-            """)
-        ).mappings().first()
+        if customer is None:
+            result = connection.execute(CREATE_CART_SQL).mappings().first()
+        else:
+            result = connection.execute(
+                CREATE_CUSTOMER_CART_SQL,
+                {
+                    "customer_name": customer.customer_name,
+                    "character_class": customer.character_class,
+                    "level": customer.level,
+                },
+            ).mappings().first()
     return {"cart_id": result["cart_id"]}
 
-@router.post("/{cart_id}/items", status_code=status.HTTP_204_NO_CONTENT)
-def add_cart_items(cart_id: int, items: List[CartItem]):
-    with db.engine.begin() as connection:
-        for item in items:
-            connection.execute(
-                sqlalchemy.text("""
-                    INSERT INTO cart_items (cart_id, item_sku, quantity, timestamp)
-                    VALUES (:cart_id, :sku, :qty, :now)
-                    ON CONFLICT (cart_id, item_sku) DO UPDATE
-                    SET quantity = cart_items.quantity + EXCLUDED.quantity,
-                        timestamp = EXCLUDED.timestamp
-                """),
-                {"cart_id": cart_id, "sku": item.sku, "qty": item.quantity, "now": datetime.utcnow()}
-            )
+# Customers already recorded for the visit (a retry) are skipped, and only
+# the new ones are returned for the demand stats.
+RECORD_VISIT_SQL = sqlalchemy.text("""
+    INSERT INTO customer_visits (visit_id, customer_id, customer_name, character_class, level)
+    SELECT :visit_id, customer_id, customer_name, character_class, level
+    FROM unnest(
+        CAST(:customer_ids AS text[]),
+        CAST(:customer_names AS text[]),
+        CAST(:character_classes AS text[]),
+        CAST(:levels AS int[])
+    ) AS customers (customer_id, customer_name, character_class, level)
+    ON CONFLICT (visit_id, customer_id) DO NOTHING
+    RETURNING character_class, level
+""")
+
+# SQLite can't return rows from an executemany, so a retried visit is
+# recognised by its id instead.
+VISIT_RECORDED_SQLITE_SQL = sqlalchemy.text("""
+    SELECT 1 FROM customer_visits WHERE visit_id = :visit_id LIMIT 1
+""")
+RECORD_VISITOR_SQLITE_SQL = sqlalchemy.text("""
+    INSERT INTO customer_visits (visit_id, customer_id, customer_name, character_class, level)
+    VALUES (:visit_id, :customer_id, :customer_name, :character_class, :level)
+    ON CONFLICT (visit_id, customer_id) DO NOTHING
+""")
+
+
+def record_visit(connection, visit_id: int, customers: List[Customer]) -> list[tuple[str, int]]:
+    """
+    Inserts the visit's customers in one statement and returns the
+    ``(character_class, level)`` of those not already recorded.
+    """
+    if connection.dialect.name == "sqlite":
+        if connection.execute(VISIT_RECORDED_SQLITE_SQL, {"visit_id": visit_id}).first():
+            return []
+        # Same as ON CONFLICT on Postgres: a customer listed twice counts once.
+        unique: dict[str, Customer] = {}
+        for customer in customers:
+            unique.setdefault(customer.customer_id, customer)
+        connection.execute(
+            RECORD_VISITOR_SQLITE_SQL,
+            [{"visit_id": visit_id, **customer.model_dump()} for customer in unique.values()],
+        )
+        return [(customer.character_class, customer.level) for customer in unique.values()]
+    rows = connection.execute(
+        RECORD_VISIT_SQL,
+        {
+            "visit_id": visit_id,
+            "customer_ids": [customer.customer_id for customer in customers],
+            "customer_names": [customer.customer_name for customer in customers],
+            "character_classes": [customer.character_class for customer in customers],
+            "levels": [customer.level for customer in customers],
+        },
+    )
+    return [(row.character_class, row.level) for row in rows]
 
-@router.post("/{cart_id}/checkout", response_model=CheckoutResponse)
-def checkout(cart_id: int, cart_checkout: CartCheckout):
+
+@router.post("/visits/{visit_id}", status_code=status.HTTP_204_NO_CONTENT)
+def post_visits(visit_id: int, customers: List[Customer]):
+    """
+    Records the customers that visited the shop this tick and adds them to
+    the demand stats.
+    """
+    if not customers:
+        return
     with db.engine.begin() as connection:
-        # Check if this order_id was already processed
-        existing = connection.execute(
-            sqlalchemy.text("""
-                SELECT response FROM executed_orders WHERE order_id = :oid
-            """),
-            {"oid": str(cart_checkout.order_id)}
-        ).scalar_one_or_none()
-
-        if existing:
-            return CheckoutResponse(**existing)
-
-        items = connection.execute(
-            sqlalchemy.text("""
-                SELECT item_sku, quantity
-                FROM cart_items
-                WHERE cart_id = :cid
-            """),
-            {"cid": cart_id}
-        ).mappings().all()
+        recorded = record_visit(connection, visit_id, customers)
+    demand.stats.record(visit_id, recorded)
+
+
+@router.get("/visits/stats")
+def get_visit_stats():
+    """
+    Customers over the recent visits by character class and level band.
+    """
+    return demand.stats.snapshot()
+
+ADD_ITEMS_SQL = sqlalchemy.text("""
+    INSERT INTO cart_items (cart_id, item_sku, quantity, unit_price, timestamp)
+    SELECT :cart_id, sku, qty, price, NOW()
+    FROM unnest(
+        CAST(:skus AS text[]), CAST(:quantities AS int[]), CAST(:prices AS int[])
+    ) AS items (sku, qty, price)
+    ON CONFLICT (cart_id, item_sku) DO UPDATE
+    SET quantity = cart_items.quantity + EXCLUDED.quantity,
+        unit_price = EXCLUDED.unit_price,
+        timestamp = EXCLUDED.timestamp
+""")
+
+# SQLite has no arrays to unnest, so it upserts one row per SKU (executemany).
+ADD_ITEM_SQLITE_SQL = sqlalchemy.text("""
+    INSERT INTO cart_items (cart_id, item_sku, quantity, unit_price, timestamp)
+    VALUES (:cart_id, :sku, :quantity, :price, now())
+    ON CONFLICT (cart_id, item_sku) DO UPDATE
+    SET quantity = cart_items.quantity + excluded.quantity,
+        unit_price = excluded.unit_price,
+        timestamp = excluded.timestamp
+""")
 
-        if not items:
-            raise HTTPException(status_code=400, detail="Cart is empty or does not exist.")
 
-        sku_to_price = {
-            "RED_POTION_0": 50,
-            "GREEN_POTION_0": 60,
-            "BLUE_POTION_0": 70,
-            "DARK_POTION_0": 80,
-        }
+@router.post("/{cart_id}/items", status_code=status.HTTP_204_NO_CONTENT)
+def add_cart_items(cart_id: int, items: List[CartItem]):
+    """
+    Adds all items in one statement, stamped with the price the catalog
+    currently offers for each SKU.
+    """
+    quantities: dict[str, int] = {}
+    for item in items:
+        if item.sku not in catalog.CURRENT_PRICES:
+            raise HTTPException(status_code=400, detail=f"Invalid SKU {item.sku}")
+        # A SKU may only appear once per INSERT ... ON CONFLICT.
+        quantities[item.sku] = quantities.get(item.sku, 0) + item.quantity
+
+    if not quantities:
+        return
 
-        ledger_entries = []
-        total_gold = 0
-        total_potions = 0
-
-        for item in items:
-            price = sku_to_price.get(item["item_sku"])
-            if price is None:
-                raise HTTPException(status_code=400, detail=f"Invalid SKU {item['item_sku']}")
-
-            total_gold += price * item["quantity"]
-            total_potions += item["quantity"]
-
-            ledger_entries.append({
-                "resource": item["item_sku"].replace("_POTION_0", "_potion").lower(),
-                "change": -item["quantity"],
-                "context": f"checkout {cart_id}"
-            })
-
-        # Get current gold
-        gold = connection.execute(
-            sqlalchemy.text("""
-                SELECT COALESCE(SUM(change), 0)
-                FROM ledger_entries
-                WHERE resource = 'gold'
-            """)
-        ).scalar_one()
-
-        if gold < total_gold:
-            raise HTTPException(status_code=400, detail="Not enough gold.")
-
-        ledger_entries.append({
-            "resource": "gold",
-            "change": -total_gold,
-            "context": f"checkout {cart_id}"
-        })
-
-        for entry in ledger_entries:
+    with db.engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
             connection.execute(
-                sqlalchemy.text("""
-                    INSERT INTO ledger_entries (resource, change, context)
-                    VALUES (:resource, :change, :context)
-                """),
-                entry
+                ADD_ITEM_SQLITE_SQL,
+                [
+                    {
+                        "cart_id": cart_id,
+                        "sku": sku,
+                        "quantity": quantity,
+                        "price": catalog.CURRENT_PRICES[sku],
+                    }
+                    for sku, quantity in quantities.items()
+                ],
             )
-
-    # Log to checkout_logs
+            return
         connection.execute(
-            sqlalchemy.text("""
-                INSERT INTO checkout_logs (total_potions, total_gold, timestamp)
-                VALUES (:total_potions, :total_gold, NOW())
-            """),
+            ADD_ITEMS_SQL,
             {
-                "total_potions": total_potions,
-                "total_gold": total_gold,
-            }
+                "cart_id": cart_id,
+                "skus": list(quantities),
+                "quantities": list(quantities.values()),
+                "prices": [catalog.CURRENT_PRICES[sku] for sku in quantities],
+            },
         )
 
+# Checkout in a single round trip. Every data-modifying CTE runs exactly once,
+# so each write is gated on the "verdict" CTE instead of on control flow.
+CHECKOUT_SQL = sqlalchemy.text("""
+    WITH existing AS (
+        SELECT response FROM executed_orders WHERE order_id = CAST(:order_id AS uuid)
+    ),
+    cart AS (
+        SELECT ci.item_sku, ci.quantity, ci.unit_price AS price, p.resource
+        FROM cart_items ci
+        LEFT JOIN unnest(CAST(:skus AS text[]), CAST(:resources AS text[]))
+            AS p (sku, resource) ON p.sku = ci.item_sku
+        WHERE ci.cart_id = :cart_id
+    ),
+    stock AS (
+        SELECT resource, SUM(change) AS on_hand
+        FROM current_ledger_entries
+        WHERE resource IN (SELECT resource FROM cart)
+        GROUP BY resource
+    ),
+    verdict AS (
+        SELECT
+            CASE
+                WHEN EXISTS (SELECT 1 FROM existing) THEN 'duplicate'
+                WHEN COUNT(*) = 0 THEN 'empty'
+                WHEN bool_or(c.resource IS NULL) THEN 'invalid_sku'
+                WHEN bool_or(COALESCE(s.on_hand, 0) < c.quantity) THEN 'insufficient_stock'
+                ELSE 'ok'
+            END AS status,
+            COALESCE(SUM(c.quantity), 0) AS total_potions,
+            COALESCE(SUM(c.quantity * c.price), 0) AS total_gold
+        FROM cart c
+        LEFT JOIN stock s ON s.resource = c.resource
+    ),
+    ledger AS (
+        INSERT INTO ledger_entries (resource, change, context)
+        SELECT c.resource, -c.quantity, 'checkout ' || :cart_id
+        FROM cart c, verdict v
+        WHERE v.status = 'ok'
+        UNION ALL
+        SELECT 'gold', v.total_gold, 'checkout ' || :cart_id
+        FROM verdict v
+        WHERE v.status = 'ok'
+    ),
+    executed AS (
+        INSERT INTO executed_orders (order_id, response)
+        SELECT CAST(:order_id AS uuid), jsonb_build_object(
+            'total_potions_bought', total_potions,
+            'total_gold_paid', total_gold
+        )
+        FROM verdict
+        WHERE status = 'ok'
+    ),
+    cleared_items AS (
+        DELETE FROM cart_items
+        WHERE cart_id = :cart_id AND (SELECT status FROM verdict) = 'ok'
+    ),
+    cleared_cart AS (
+        DELETE FROM carts
+        WHERE cart_id = :cart_id AND (SELECT status FROM verdict) = 'ok'
+    )
+    SELECT
+        v.status,
+        v.total_potions,
+        v.total_gold,
+        (SELECT response FROM existing) AS response
+    FROM verdict v
+""")
+
+CHECKOUT_ERRORS = {
+    "empty": "Cart is empty or does not exist.",
+    "invalid_sku": "Cart contains an unknown SKU.",
+    "insufficient_stock": "Not enough potions in stock.",
+}
+
+
+def checkout_params(cart_id: int, order_id: UUID) -> dict:
+    skus = list(catalog.POTION_DEFINITIONS)
+    return {
+        "cart_id": cart_id,
+        "order_id": str(order_id),
+        "skus": skus,
+        "resources": [catalog.POTION_DEFINITIONS[sku]["resource"] for sku in skus],
+    }
+
+
+class CheckoutResult(NamedTuple):
+    status: str
+    total_potions: int
+    total_gold: int
+    response: Optional[dict]
+
+
+def execute_checkout_sqlite(connection, cart_id: int, order_id: UUID) -> CheckoutResult:
+    """
+    CHECKOUT_SQL step by step, for SQLite (no data-modifying CTEs). The
+    transaction holds SQLite's write lock throughout, so it is just as atomic.
+    """
+    existing = connection.execute(
+        sqlalchemy.text("SELECT response FROM executed_orders WHERE order_id = :order_id"),
+        {"order_id": str(order_id)},
+    ).scalar_one_or_none()
+    if existing is not None:
+        return CheckoutResult("duplicate", 0, 0, json.loads(existing))
+
+    items = connection.execute(
+        sqlalchemy.text("""
+            SELECT item_sku, quantity, unit_price FROM cart_items WHERE cart_id = :cart_id
+        """),
+        {"cart_id": cart_id},
+    ).all()
+    total_potions = sum(item.quantity for item in items)
+    total_gold = sum(item.quantity * item.unit_price for item in items)
+    if not items:
+        return CheckoutResult("empty", 0, 0, None)
+    if any(item.item_sku not in catalog.POTION_DEFINITIONS for item in items):
+        return CheckoutResult("invalid_sku", total_potions, total_gold, None)
+
+    lines = [
+        (catalog.POTION_DEFINITIONS[item.item_sku]["resource"], item.quantity)
+        for item in items
+    ]
+    debits: dict[str, int] = {}
+    for resource, quantity in lines:
+        debits[resource] = debits.get(resource, 0) + quantity
+    on_hand = ledger.balances(connection, tuple(debits))
+    if any(on_hand.get(resource, 0) < quantity for resource, quantity in debits.items()):
+        return CheckoutResult("insufficient_stock", total_potions, total_gold, None)
+
+    context = f"checkout {cart_id}"
+    connection.execute(
+        ledger.INSERT_ENTRY_SQL,
+        [
+            {"resource": resource, "change": -quantity, "context": context}
+            for resource, quantity in lines
+        ]
+        + [{"resource": "gold", "change": total_gold, "context": context}],
+    )
+    response = {"total_potions_bought": total_potions, "total_gold_paid": total_gold}
+    connection.execute(
+        sqlalchemy.text("""
+            INSERT INTO executed_orders (order_id, response) VALUES (:order_id, :response)
+        """),
+        {"order_id": str(order_id), "response": json.dumps(response)},
+    )
+    connection.execute(
+        sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cart_id"),
+        {"cart_id": cart_id},
+    )
+    connection.execute(
+        sqlalchemy.text("DELETE FROM carts WHERE cart_id = :cart_id"),
+        {"cart_id": cart_id},
+    )
+    return CheckoutResult("ok", total_potions, total_gold, None)
 
-        response = {
-            "total_potions_bought": total_potions,
-            "total_gold_paid": total_gold
-        }
 
-        connection.execute(
-            sqlalchemy.text("""
-                INSERT INTO executed_orders (order_id, response)
-                VALUES (:oid, :response::jsonb)
-            """),
-            {"oid": str(cart_checkout.order_id), "response": json.dumps(response)}
-        )
+def execute_checkout(connection, cart_id: int, order_id: UUID):
+    if connection.dialect.name == "sqlite":
+        return execute_checkout_sqlite(connection, cart_id, order_id)
+    return connection.execute(CHECKOUT_SQL, checkout_params(cart_id, order_id)).one()
 
-        connection.execute(
-            sqlalchemy.text("DELETE FROM cart_items WHERE cart_id = :cid"),
-            {"cid": cart_id}
-        )
 
-        connection.execute(
-            sqlalchemy.text("DELETE FROM carts WHERE cart_id = :cid"),
-            {"cid": cart_id}
+@router.post("/{cart_id}/checkout", response_model=CheckoutResponse)
+def checkout(cart_id: int, cart_checkout: CartCheckout):
+    """
+    Sells the cart: validates stock, debits potions and credits gold in the
+    ledger, records the order for idempotency and clears the cart, all in
+    one statement. The checkout is logged for analytics after it commits.
+    """
+    cached = completed_orders.get(cart_checkout.order_id)
+    if cached is not MISSING:
+        return CheckoutResponse(**cached)
+
+    try:
+        with db.engine.begin() as connection:
+            row = execute_checkout(connection, cart_id, cart_checkout.order_id)
+    except sqlalchemy.exc.IntegrityError:
+        # A concurrent retry of the same order won the executed_orders insert.
+        with db.engine.begin() as connection:
+            row = execute_checkout(connection, cart_id, cart_checkout.order_id)
+
+    if row.status == "duplicate":
+        response = row.response
+    elif row.status == "ok":
+        response = {
+            "total_potions_bought": row.total_potions,
+            "total_gold_paid": row.total_gold,
+        }
+        analytics.record(
+            "checkout_logs",
+            total_potions=row.total_potions,
+            total_gold=row.total_gold,
         )
+    else:
+        raise HTTPException(status_code=400, detail=CHECKOUT_ERRORS[row.status])
 
+    completed_orders.put(cart_checkout.order_id, response)
     return CheckoutResponse(**response)
 
 class SearchSortOptions(str, Enum):
@@ -191,6 +426,30 @@ class SearchResponse(BaseModel):
     next: Optional[str] = None
     results: List[LineItem]
 
+# One statement per dialect and sort, built once: the ORDER BY can't be a
+# bind parameter, and a fixed set of statement texts lets psycopg prepare
+# each of them. SQLite's LIKE is already case-insensitive (for ASCII).
+SEARCH_SQL = {
+    dialect: {
+        (sort_col, sort_order): sqlalchemy.text(f"""
+            SELECT ci.id AS line_item_id,
+                   ci.item_sku,
+                   c.customer_name,
+                   (ci.quantity * ci.unit_price) AS line_item_total,
+                   ci.timestamp
+            FROM cart_items ci
+            JOIN carts c ON ci.cart_id = c.cart_id
+            WHERE c.customer_name {like} :customer_name
+              AND ci.item_sku {like} :potion_sku
+            ORDER BY {sort_col.value} {sort_order.value}
+            LIMIT 50
+        """).columns(timestamp=sqlalchemy.DateTime)
+        for sort_col in SearchSortOptions
+        for sort_order in SearchSortOrder
+    }
+    for dialect, like in (("postgresql", "ILIKE"), ("sqlite", "LIKE"))
+}
+
 @router.get("/search/", response_model=SearchResponse)
 def search_orders(
     customer_name: str = "",
@@ -199,38 +458,26 @@ def search_orders(
     sort_col: SearchSortOptions = SearchSortOptions.timestamp,
     sort_order: SearchSortOrder = SearchSortOrder.desc,
 ):
-    with db.engine.begin() as connection:
+    with db.read_engine().begin() as connection:
         results = connection.execute(
-            sqlalchemy.text(f"""
-                SELECT ci.id AS line_item_id,
-                       ci.item_sku,
-                       c.customer_name,
-                       (ci.quantity * ci.unit_price) AS line_item_total,
-                       ci.timestamp
-                FROM cart_items ci
-                JOIN carts c ON ci.cart_id = c.cart_id
-                WHERE c.customer_name ILIKE :customer_name
-                  AND ci.item_sku ILIKE :potion_sku
-                ORDER BY {sort_col.value} {sort_order.value}
-                LIMIT 50
-            """),
+            db.variant(connection, SEARCH_SQL)[sort_col, sort_order],
             {
                 "customer_name": f"%{customer_name}%",
                 "potion_sku": f"%{potion_sku}%",
             }
         ).mappings().all()
 
-    return SearchResponse(
-        previous=None,
-        next=None,
-        results=[
-            LineItem(
-                line_item_id=row["line_item_id"],
-                item_sku=row["item_sku"],
-                customer_name=row["customer_name"],
-                line_item_total=row["line_item_total"],
-                timestamp=row["timestamp"].isoformat()
-            )
+    return FastJSONResponse({
+        "previous": None,
+        "next": None,
+        "results": [
+            {
+                "line_item_id": row["line_item_id"],
+                "item_sku": row["item_sku"],
+                "customer_name": row["customer_name"],
+                "line_item_total": row["line_item_total"],
+                "timestamp": row["timestamp"].isoformat(),
+            }
             for row in results
-        ]
-    )
+        ],
+    })
@@ -1,8 +1,10 @@
 from fastapi import APIRouter
 from pydantic import BaseModel, Field
-from typing import List, Annotated
+from typing import List, Annotated, TypedDict
+import json
 import sqlalchemy
-from src import database as db
+from src import analytics, cache, database as db, pubsub
+from src.api.responses import FastJSONResponse
 
 router = APIRouter(
     prefix="/catalog",
@@ -21,7 +23,13 @@ class CatalogItem(BaseModel):
         description="Must contain exactly 4 elements: [r, g, b, d]",
     )
 
-POTION_DEFINITIONS = {
+class PotionDefinition(TypedDict):
+    name: str
+    base_price: int
+    type: List[int]  # [r, g, b, d]
+    resource: str  # its ledger resource
+
+POTION_DEFINITIONS: dict[str, PotionDefinition] = {
     "RED_POTION_0": {
         "name": "Red Potion",
         "base_price": 50,
@@ -48,36 +56,101 @@ POTION_DEFINITIONS = {
     },
 }
 
+# Last price offered per SKU, so carts are charged what the catalog showed.
+CURRENT_PRICES = {sku: info["base_price"] for sku, info in POTION_DEFINITIONS.items()}
+
+POTION_RESOURCES = {info["resource"] for info in POTION_DEFINITIONS.values()}
+
+
+def reset_prices():
+    CURRENT_PRICES.update(
+        {sku: info["base_price"] for sku, info in POTION_DEFINITIONS.items()}
+    )
+
+
+def on_ledger_change(payload):
+    resources = pubsub.changed_resources(payload)
+    if resources is None or resources & POTION_RESOURCES:
+        cache.potion_balances.clear()
+
+
+def on_prices_change(payload):
+    if payload:
+        CURRENT_PRICES.update(json.loads(payload))
+
+
+pubsub.subscribe(pubsub.LEDGER_CHANNEL, on_ledger_change)
+pubsub.subscribe(pubsub.PRICES_CHANNEL, on_prices_change)
+
+
+POTION_BALANCES_SQL = sqlalchemy.text("""
+    SELECT
+        resource,
+        SUM(change) AS total
+    FROM current_ledger_entries
+    WHERE resource IN ('red_potions', 'green_potions', 'blue_potions', 'dark_potions')
+    GROUP BY resource
+""")
+
+
 def fetch_potion_balances():
-    with db.engine.begin() as connection:
-        result = connection.execute(sqlalchemy.text("""
-            SELECT
-                resource,
-                SUM(change) AS total
-            FROM ledger_entries
-            WHERE resource IN ('red_potions', 'green_potions', 'blue_potions', 'dark_potions')
-            GROUP BY resource
-        """)).mappings().all()
-
-    return {row["resource"]: row["total"] or 0 for row in result}
+    listening = pubsub.is_listening()
+    if listening:
+        cached = cache.potion_balances.get("potions")
+        if cached is not cache.MISSING:
+            return cached
+    generation = cache.potion_balances.generation
+
+    # A cached read must not come from a lagging replica: the invalidation
+    # may already have fired, leaving the stale balances cached.
+    engine = db.engine if listening else db.read_engine()
+    with engine.begin() as connection:
+        result = connection.execute(POTION_BALANCES_SQL).mappings().all()
+
+    balances = {row["resource"]: row["total"] or 0 for row in result}
+    if listening:
+        cache.potion_balances.put("potions", balances, generation)
+    return balances
 
 def determine_price(base: int, quantity: int) -> int:
     return min(base + 10, 500) if quantity < 4 else base
 
+def build_catalog(potion_balances: dict[str, int]) -> list[dict]:
+    catalog = []
+    for sku, info in POTION_DEFINITIONS.items():
+        qty = potion_balances.get(info["resource"], 0)
+        if qty > 0:
+            catalog.append({
+                "sku": sku,
+                "name": info["name"],
+                "quantity": qty,
+                "price": determine_price(info["base_price"], qty),
+                "potion_type": info["type"],
+            })
+    return catalog[:6]
+
 @router.get("/", response_model=List[CatalogItem])
 def get_catalog():
     potion_balances = fetch_potion_balances()
-    catalog: List[CatalogItem] = []
+    catalog = build_catalog(potion_balances)
 
-    for sku, info in POTION_DEFINITIONS.items():
-        qty = potion_balances.get(info["resource"], 0)
-        if qty > 0:
-            catalog.append(CatalogItem(
-                sku=sku,
-                name=info["name"],
-                quantity=qty,
-                price=determine_price(info["base_price"], qty),
-                potion_type=info["type"]
-            ))
+    changed = {}
+    for item in catalog:
+        if CURRENT_PRICES[item["sku"]] != item["price"]:
+            CURRENT_PRICES[item["sku"]] = changed[item["sku"]] = item["price"]
 
-    return catalog[:6]
+    # Logged off the request path by the write-behind buffer.
+    analytics.record(
+        "catalog_snapshots",
+        red_available=potion_balances.get("red_potions", 0) > 0,
+        green_available=potion_balances.get("green_potions", 0) > 0,
+        blue_available=potion_balances.get("blue_potions", 0) > 0,
+        dark_available=potion_balances.get("dark_potions", 0) > 0,
+    )
+
+    if changed and pubsub.is_listening():
+        # Carts may be served by another worker; keep its prices in step.
+        with db.engine.begin() as connection:
+            pubsub.publish(connection, pubsub.PRICES_CHANNEL, json.dumps(changed))
+
+    return FastJSONResponse(catalog)
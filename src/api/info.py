@@ -1,6 +1,8 @@
 from fastapi import APIRouter, Depends, status
 from pydantic import BaseModel
+import sqlalchemy
 from src.api import auth
+from src import database as db
 
 router = APIRouter(
     prefix="/info",
@@ -19,5 +21,10 @@ def post_time(timestamp: Timestamp):
     """
     Shares what the latest time (in game time) is.
     """
-    # TODO: Record day and time of the current tick to associate with later calls
-    pass
+    with db.engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO game_ticks (day, hour) VALUES (:day, :hour)
+            """),
+            {"day": timestamp.day, "hour": timestamp.hour},
+        )
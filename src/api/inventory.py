@@ -1,8 +1,11 @@
+from dataclasses import dataclass
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 import sqlalchemy
 from src.api import auth
-from src import database as db
+from src import cache, database as db, ledger, pubsub
+from src.cache import completed_orders, MISSING
+from src.api.responses import FastJSONResponse
 from typing import Optional
 from uuid import UUID
 
@@ -16,56 +19,180 @@ class InventoryAudit(BaseModel):
     number_of_potions: int
     ml_in_barrels: int
     gold: int
+    resources: dict[str, int] = Field(
+        default_factory=dict, description="Current balance of every ledger resource"
+    )
 
 class CapacityPlan(BaseModel):
-    potion_capacity: int = Field(ge=0, le=10, description="Potion capacity units, max 10")
-    ml_capacity: int = Field(ge=0, le=10, description="ML capacity units, max 10")
+    potion_capacity: int = Field(ge=0, le=10, description="Potion capacity units to buy, max 10, 1000 gold each")
+    ml_capacity: int = Field(ge=0, le=10, description="ML capacity units to buy, max 10, 1000 gold each")
 
-@router.get("/audit", response_model=InventoryAudit)
-def get_inventory():
+# ---- Capacity ----
+
+POTIONS_PER_CAPACITY_UNIT = 50
+ML_PER_CAPACITY_UNIT = 10000
+CAPACITY_UNIT_PRICE = 1000
+# Every shop starts with one unit of each; purchases are ledger resources.
+STARTING_CAPACITY_UNITS = 1
+CAPACITY_RESOURCES = ("potion_capacity", "ml_capacity")
+
+# Buy potion capacity once forecast daily sales exceed this share of it,
+# ml capacity once ml on hand does, keeping this much gold in reserve.
+CAPACITY_BUY_THRESHOLD = 0.8
+CAPACITY_GOLD_RESERVE = 500
+
+
+@dataclass(frozen=True)
+class Capacity:
+    potions: int
+    ml: int
+
+
+def capacity_from_balances(balances: dict[str, int]) -> Capacity:
+    return Capacity(
+        potions=(STARTING_CAPACITY_UNITS + balances.get("potion_capacity", 0))
+        * POTIONS_PER_CAPACITY_UNIT,
+        ml=(STARTING_CAPACITY_UNITS + balances.get("ml_capacity", 0))
+        * ML_PER_CAPACITY_UNIT,
+    )
+
+
+def on_ledger_change(payload):
+    resources = pubsub.changed_resources(payload)
+    if resources is None or resources & set(CAPACITY_RESOURCES):
+        cache.capacity.clear()
+
+
+pubsub.subscribe(pubsub.LEDGER_CHANNEL, on_ledger_change)
+
+
+def get_capacity() -> Capacity:
     """
-    Returns an audit of the current inventory using the ledger.
+    Current storage limits, cached while the LISTEN/NOTIFY listener keeps
+    the cache fresh.
     """
+    listening = pubsub.is_listening()
+    if listening:
+        cached = cache.capacity.get("capacity")
+        if cached is not MISSING:
+            return cached
+    generation = cache.capacity.generation
+
     with db.engine.begin() as connection:
-        gold = connection.execute(
-            sqlalchemy.text("""
-                SELECT COALESCE(SUM(change), 0) FROM ledger_entries
-                WHERE resource = 'gold'
-            """)
-        ).scalar_one()
+        capacity = capacity_from_balances(
+            ledger.balances(connection, CAPACITY_RESOURCES)
+        )
+    if listening:
+        cache.capacity.put("capacity", capacity, generation)
+    return capacity
+
+
+DAILY_SALES_SQL = {
+    "postgresql": sqlalchemy.text("""
+        SELECT COALESCE(-SUM(change), 0) FROM current_ledger_entries
+        WHERE resource = ANY(:resources)
+          AND context LIKE 'checkout %'
+          AND timestamp > NOW() - INTERVAL '1 day'
+    """),
+    "sqlite": sqlalchemy.text("""
+        SELECT COALESCE(-SUM(change), 0) FROM current_ledger_entries
+        WHERE resource IN :resources
+          AND context LIKE 'checkout %'
+          AND timestamp > datetime('now', '-1 day')
+    """).bindparams(sqlalchemy.bindparam("resources", expanding=True)),
+}
+
+
+def forecast_daily_sales(connection) -> int:
+    """
+    Potions sold over the last day, as the forecast for the next one.
+    """
+    return connection.execute(
+        db.variant(connection, DAILY_SALES_SQL),
+        {"resources": list(ledger.POTION_RESOURCES)},
+    ).scalar_one()
 
-        ml_in_barrels = connection.execute(
-            sqlalchemy.text("""
-                SELECT COALESCE(SUM(change), 0) FROM ledger_entries
-                WHERE resource IN ('red_ml', 'green_ml', 'blue_ml', 'dark_ml')
-            """)
-        ).scalar_one()
 
-        potions = connection.execute(
-            sqlalchemy.text("""
-                SELECT COALESCE(SUM(change), 0) FROM ledger_entries
-                WHERE resource IN ('red_potion', 'green_potion', 'blue_potion', 'dark_potion')
-            """)
-        ).scalar_one()
+def create_capacity_plan(
+    gold: int, ml: int, capacity: Capacity, forecast_sales: int
+) -> CapacityPlan:
+    """
+    Buys a unit of potion capacity when forecast sales would nearly fill it,
+    and a unit of ml capacity when barrels are nearly filling it, as long as
+    the reserve is left.
+    """
+    potion_units = 0
+    ml_units = 0
+    if (
+        forecast_sales > CAPACITY_BUY_THRESHOLD * capacity.potions
+        and gold - CAPACITY_UNIT_PRICE >= CAPACITY_GOLD_RESERVE
+    ):
+        potion_units = 1
+        gold -= CAPACITY_UNIT_PRICE
+    if (
+        ml > CAPACITY_BUY_THRESHOLD * capacity.ml
+        and gold - CAPACITY_UNIT_PRICE >= CAPACITY_GOLD_RESERVE
+    ):
+        ml_units = 1
+    return CapacityPlan(potion_capacity=potion_units, ml_capacity=ml_units)
+
+# ---- Endpoints ----
+
+def audit_from_balances(balances: dict[str, int]) -> dict:
+    return {
+        "number_of_potions": ledger.total(balances, ledger.POTION_RESOURCES),
+        "ml_in_barrels": ledger.total(balances, ledger.ML_RESOURCES),
+        "gold": balances.get("gold", 0),
+        "resources": balances,
+    }
 
-        return InventoryAudit(
-            number_of_potions=potions,
-            ml_in_barrels=ml_in_barrels,
-            gold=gold
-        )
+@router.get("/audit", response_model=InventoryAudit)
+def get_inventory():
+    """
+    Returns an audit of the current inventory using the ledger: the totals
+    and the balance of each resource, all from one grouped scan read under
+    a single REPEATABLE READ snapshot.
+    """
+    engine = db.read_engine()
+    with engine.connect().execution_options(
+        isolation_level=db.variant(engine, db.SNAPSHOT_ISOLATION)
+    ) as connection, connection.begin():
+        balances = ledger.balances(connection)
+
+    return FastJSONResponse(audit_from_balances(balances))
+
+def plan_capacity(connection, balances: dict[str, int]) -> CapacityPlan:
+    return create_capacity_plan(
+        gold=balances.get("gold", 0),
+        ml=ledger.total(balances, ledger.ML_RESOURCES),
+        capacity=capacity_from_balances(balances),
+        forecast_sales=forecast_daily_sales(connection),
+    )
 
 @router.post("/plan", response_model=CapacityPlan)
 def get_capacity_plan():
     """
-    Hardcoded plan: start with 1 unit of each. More costs gold.
+    Capacity units to buy this tick; see create_capacity_plan.
     """
-    return CapacityPlan(potion_capacity=1, ml_capacity=1)
+    with db.engine.begin() as connection:
+        balances = ledger.balances(
+            connection, ("gold",) + ledger.ML_RESOURCES + CAPACITY_RESOURCES
+        )
+        return plan_capacity(connection, balances)
 
 @router.post("/deliver/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
 def deliver_capacity_plan(capacity_purchase: CapacityPlan, order_id: UUID):
     """
     Processes the delivery of a capacity purchase using a ledger-based and idempotent design.
+
+    Both fields are units bought on top of what the shop already has, and every
+    unit costs CAPACITY_UNIT_PRICE gold. Before the capacity ledger, the first
+    unit of each field was free because the fields counted total units
+    including the starting one; callers relying on that are now charged for it.
     """
+    if completed_orders.get(order_id) is not MISSING:
+        return  # Already processed
+
     with db.engine.begin() as connection:
         # Check for duplicate execution
         existing = connection.execute(
@@ -76,17 +203,16 @@ def deliver_capacity_plan(capacity_purchase: CapacityPlan, order_id: UUID):
         ).first()
 
         if existing:
+            completed_orders.put(order_id, None)
             return  # Already processed
 
-        # Determine how many extra capacity units were purchased
-        extra_potion_capacity = max(capacity_purchase.potion_capacity - 1, 0)
-        extra_ml_capacity = max(capacity_purchase.ml_capacity - 1, 0)
-
-        total_cost = (extra_potion_capacity + extra_ml_capacity) * 1000
+        total_cost = (
+            capacity_purchase.potion_capacity + capacity_purchase.ml_capacity
+        ) * CAPACITY_UNIT_PRICE
 
         current_gold = connection.execute(
             sqlalchemy.text("""
-                SELECT COALESCE(SUM(change), 0) FROM ledger_entries
+                SELECT COALESCE(SUM(change), 0) FROM current_ledger_entries
                 WHERE resource = 'gold'
             """)
         ).scalar_one()
@@ -98,9 +224,19 @@ def deliver_capacity_plan(capacity_purchase: CapacityPlan, order_id: UUID):
             connection.execute(
                 sqlalchemy.text("""
                     INSERT INTO ledger_entries (resource, change, context)
-                    VALUES ('gold', :change, 'Capacity upgrade')
+                    SELECT resource, change, 'Capacity upgrade'
+                    FROM (
+                        SELECT 'gold' AS resource, :gold AS change
+                        UNION ALL SELECT 'potion_capacity', :potion_units
+                        UNION ALL SELECT 'ml_capacity', :ml_units
+                    ) AS purchase
+                    WHERE change <> 0
                 """),
-                {"change": -total_cost}
+                {
+                    "gold": -total_cost,
+                    "potion_units": capacity_purchase.potion_capacity,
+                    "ml_units": capacity_purchase.ml_capacity,
+                }
             )
 
         connection.execute(
@@ -111,4 +247,5 @@ def deliver_capacity_plan(capacity_purchase: CapacityPlan, order_id: UUID):
             {"oid": str(order_id)}
         )
 
+    completed_orders.put(order_id, None)
     return
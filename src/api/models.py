@@ -1,17 +1,42 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Float, Text
 from src.database import Base
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 
 # ---- LEDGER ENTRIES ----
 class LedgerEntry(Base):
     __tablename__ = "ledger_entries"
     id = Column(Integer, primary_key=True, autoincrement=True)
-    resource = Column(String, nullable=False)  # e.g., 'gold', 'red_ml', 'blue_potion'
+    resource = Column(String, nullable=False)  # e.g., 'gold', 'red_ml', 'blue_potions'
     change = Column(Integer, nullable=False)
     context = Column(String, nullable=True)  # e.g., 'Purchased barrel', 'Checkout'
     timestamp = Column(DateTime, default=datetime.utcnow)
+    epoch = Column(Integer, nullable=False)  # server default: current_ledger_epoch()
+
+
+class LedgerEpoch(Base):
+    __tablename__ = "ledger_epochs"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+
+
+class LedgerCheckpoint(Base):
+    __tablename__ = "ledger_checkpoints"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    epoch = Column(Integer, nullable=False)
+    entry_id = Column(Integer, nullable=False)  # balances include this entry
+    balances = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+# ---- GAME TICKS ----
+class GameTick(Base):
+    __tablename__ = "game_ticks"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(String, nullable=False)
+    hour = Column(Integer, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow)
 
 
 # ---- EXECUTED ORDERS ----
@@ -29,6 +54,18 @@ class Cart(Base):
     payment = Column(String, nullable=True)
     character_class = Column(String, nullable=False)
     level = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class CustomerVisit(Base):
+    __tablename__ = "customer_visits"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    visit_id = Column(Integer, nullable=False)  # unique with customer_id
+    customer_id = Column(String, nullable=False)
+    customer_name = Column(String, nullable=False)
+    character_class = Column(String, nullable=False)
+    level = Column(Integer, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow)
 
 
 class CartItem(Base):
@@ -41,6 +78,18 @@ class CartItem(Base):
     timestamp = Column(DateTime, default=datetime.utcnow)
 
 
+# ---- SLOW QUERY LOG ----
+class SlowQuery(Base):
+    __tablename__ = "slow_queries"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    endpoint = Column(String, nullable=True)  # e.g., 'POST /carts/1/checkout'
+    statement = Column(Text, nullable=False)
+    parameters = Column(JSONB, nullable=True)
+    duration_ms = Column(Float, nullable=False)
+    plan = Column(Text, nullable=True)
+
+
 # ---- OPTIONAL (if you still use catalog-backed types) ----
 class PotionType(Base):
     __tablename__ = "potion_types"
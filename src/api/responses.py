@@ -0,0 +1,22 @@
+from typing import Any
+
+import orjson
+from starlette.responses import Response
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content)
+
+
+class FastJSONResponse(Response):
+    """
+    JSON response serialized with orjson. Returning it from an endpoint also
+    skips FastAPI's re-validation against ``response_model``, so handlers
+    build plain dicts straight from rows; ``response_model`` is then only used
+    for the OpenAPI docs.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
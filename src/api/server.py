@@ -1,5 +1,18 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from src.api import carts, catalog, bottler, barrels, admin, info, inventory
+from src.api import (
+    carts,
+    catalog,
+    bottler,
+    barrels,
+    admin,
+    info,
+    inventory,
+    stream,
+    batch,
+)
+from src import analytics, config, database as db, jobs, pubsub, querylog, ratelimit
+from src.scheduler import scheduler
 from starlette.middleware.cors import CORSMiddleware
 
 description = """
@@ -19,8 +32,26 @@ tags_metadata = [
         "name": "inventory",
         "description": "Get the current inventory of shop and buying capacity.",
     },
+    {"name": "stream", "description": "Live catalog and balance changes."},
+    {"name": "batch", "description": "Run a tick's operations in one request."},
 ]
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keeps this worker's caches in step with writes made by other workers.
+    settings = config.get_settings()
+    if settings.CACHE_INVALIDATION and db.engine.dialect.name == "postgresql":
+        pubsub.start()
+    if settings.SCHEDULER:
+        jobs.register(scheduler)
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    pubsub.stop()
+    analytics.flush()
+
+
 app = FastAPI(
     title="Central Coast Cauldrons",
     description=description,
@@ -31,6 +62,7 @@ app = FastAPI(
         "email": "lupierce@calpoly.edu",
     },
     openapi_tags=tags_metadata,
+    lifespan=lifespan,
 )
 
 origins = ["https://potion-exchange.vercel.app"]
@@ -42,6 +74,9 @@ app.add_middleware(
     allow_methods=["GET", "OPTIONS"],
     allow_headers=["*"],
 )
+app.add_middleware(querylog.EndpointMiddleware)
+
+app.add_middleware(ratelimit.from_settings, pool_wait_ms=db.pool_wait_ms)
 
 app.include_router(inventory.router)
 app.include_router(carts.router)
@@ -50,6 +85,8 @@ app.include_router(bottler.router)
 app.include_router(barrels.router)
 app.include_router(admin.router)
 app.include_router(info.router)
+app.include_router(stream.router)
+app.include_router(batch.router)
 
 
 @app.get("/")
@@ -0,0 +1,51 @@
+import asyncio
+
+from fastapi import APIRouter, Depends
+from starlette.responses import StreamingResponse
+
+from src.api import auth
+from src.api.responses import dumps
+from src.broadcast import broadcaster
+
+router = APIRouter(
+    prefix="/stream",
+    tags=["stream"],
+    dependencies=[Depends(auth.get_api_key)],
+)
+
+# Sent when nothing else has been, so proxies keep the connection open.
+KEEPALIVE_SECONDS = 15.0
+
+
+def format_event(name: str, data: dict) -> bytes:
+    return b"event: " + name.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def event_stream(queue: asyncio.Queue):
+    try:
+        while True:
+            try:
+                name, data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield format_event(name, data)
+    finally:
+        broadcaster.unsubscribe(queue)
+
+
+@router.get("/")
+async def stream_changes():
+    """
+    Server-Sent Events stream replacing polling of /catalog/ and
+    /inventory/audit. Starts with a snapshot (a full ``balances`` event and
+    a ``catalog`` event with ``reset: true``), then sends only what changed:
+    ``balances`` maps each changed resource to its new balance, ``catalog``
+    lists ``upserted`` items and ``removed`` SKUs.
+    """
+    queue = await broadcaster.subscribe()
+    return StreamingResponse(
+        event_stream(queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
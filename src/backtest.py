@@ -0,0 +1,354 @@
+"""
+Offline backtester for the shop's planners.
+
+Replays recorded ticks (the wholesale catalog offered and the potions
+customers asked for) against pluggable strategies, in-process and without
+HTTP or Postgres. Shop state is held in NumPy arrays with one row per
+simulated run, so every tick advances all runs at once; demand is drawn per
+run from a Poisson distribution around the recorded demand.
+
+A strategy provides three methods over that state:
+
+    prices(potions)               (runs, 4) potions -> (runs, 4) prices
+    plan_barrels(state, barrels)  -> (runs, len(barrels)) barrels to buy
+    plan_bottles(state)           -> (runs, 4) single-color potions to bottle
+
+``live`` runs the production planners (barrels.create_barrel_plan,
+bottler.create_bottle_plan, catalog.determine_price) once per run; other
+strategies are vectorized. Any class can be plugged in as ``module:Class``.
+
+Tick files are JSON lines:
+
+    {"barrels": [{"sku": ..., "potion_type": [...], "price": ..., "quantity": ...}],
+     "carts": [{"RED_POTION_0": 2}, ...]}
+
+    python -m src.backtest (--ticks FILE | --synthetic-days N) [--days N]
+        [--runs 1000] [--strategy live restock mypkg.mod:MyStrategy]
+"""
+
+import argparse
+import importlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Protocol
+
+import numpy as np
+
+from src.api import barrels as barrels_api, bottler, catalog, inventory
+from src.api.barrels import Barrel
+from src.plans import COLORS, ML_PER_BARREL, ML_PER_POTION, barrel_arrays
+
+TICKS_PER_DAY = 12
+STARTING_GOLD = 100
+STARTING_CAPACITY = inventory.capacity_from_balances({})
+
+# Catalog SKU and base price of each color's potion.
+POTION_SKUS = [
+    next(
+        sku
+        for sku, info in catalog.POTION_DEFINITIONS.items()
+        if info["type"][i] == 100
+    )
+    for i in range(len(COLORS))
+]
+BASE_PRICES = np.array(
+    [catalog.POTION_DEFINITIONS[sku]["base_price"] for sku in POTION_SKUS]
+)
+
+
+@dataclass
+class Tick:
+    barrels: List[Barrel]
+    demand: np.ndarray  # (4,) potions requested per color
+
+
+@dataclass
+class State:
+    gold: np.ndarray  # (runs,)
+    ml: np.ndarray  # (runs, 4)
+    potions: np.ndarray  # (runs, 4)
+    potion_capacity: np.ndarray  # (runs,) potions the shop can hold
+    ml_capacity: np.ndarray  # (runs,) ml the shop can hold
+
+    @classmethod
+    def initial(cls, runs: int, gold: int = STARTING_GOLD) -> "State":
+        return cls(
+            np.full(runs, gold, dtype=np.int64),
+            np.zeros((runs, len(COLORS)), dtype=np.int64),
+            np.zeros((runs, len(COLORS)), dtype=np.int64),
+            np.full(runs, STARTING_CAPACITY.potions, dtype=np.int64),
+            np.full(runs, STARTING_CAPACITY.ml, dtype=np.int64),
+        )
+
+    @property
+    def runs(self) -> int:
+        return len(self.gold)
+
+
+@dataclass
+class Report:
+    strategy: str
+    runs: int
+    days: float
+    profit: float  # mean gold gained per run
+    profit_p10: float
+    profit_p90: float
+    stockouts: float  # mean potions requested but not in stock, per run
+    ml_waste: float  # mean ml left at the end that can't fill a potion
+    seconds: float
+
+
+class Strategy(Protocol):
+    name: str
+
+    def prices(self, potions: np.ndarray) -> np.ndarray: ...
+
+    def plan_barrels(self, state: State, barrels: List[Barrel]) -> np.ndarray: ...
+
+    def plan_bottles(self, state: State) -> np.ndarray: ...
+
+
+class LivePlanners:
+    """
+    The planners the API serves, called once per run. Slower than a
+    vectorized strategy but always in step with production: on one core,
+    100 runs of 365 synthetic days take about 100 s (~22k run-days/min),
+    against under 2 s for ``restock``.
+    """
+
+    name = "live"
+
+    def __init__(self, seed: int = 0):
+        self._price = np.vectorize(catalog.determine_price, otypes=[np.int64])
+
+    def prices(self, potions: np.ndarray) -> np.ndarray:
+        return self._price(BASE_PRICES, potions)
+
+    def plan_barrels(self, state: State, barrels: List[Barrel]) -> np.ndarray:
+        quantities = np.zeros((state.runs, len(barrels)), dtype=np.int64)
+        index = {barrel.sku: i for i, barrel in enumerate(barrels)}
+        for run, (gold, ml, potions, ml_capacity) in enumerate(
+            zip(
+                state.gold.tolist(),
+                state.ml.tolist(),
+                state.potions.tolist(),
+                state.ml_capacity.tolist(),
+            )
+        ):
+            orders = barrels_api.create_barrel_plan(
+                gold=gold,
+                **{f"{color}_ml": amount for color, amount in zip(COLORS, ml)},
+                **{f"{color}_potions": count for color, count in zip(COLORS, potions)},
+                wholesale_catalog=barrels,
+                max_barrel_capacity=ml_capacity,
+            )
+            for order in orders:
+                quantities[run, index[order.sku]] += order.quantity
+        return quantities
+
+    def plan_bottles(self, state: State) -> np.ndarray:
+        bottles = np.zeros_like(state.ml)
+        for run, (ml, potions, potion_capacity) in enumerate(
+            zip(
+                state.ml.tolist(),
+                state.potions.sum(axis=1).tolist(),
+                state.potion_capacity.tolist(),
+            )
+        ):
+            plan = bottler.create_bottle_plan(
+                **{f"{color}_ml": amount for color, amount in zip(COLORS, ml)},
+                current_potions=potions,
+                maximum_potion_capacity=potion_capacity,
+            )
+            for mix in plan:
+                bottles[run, mix.potion_type.index(100)] += mix.quantity
+        return bottles
+
+
+class Restock:
+    """
+    Keeps every color stocked to ``target`` potions (counting ml on hand) by
+    buying its cheapest single-color barrel while gold lasts, bottles
+    everything, and always charges base price.
+    """
+
+    name = "restock"
+
+    def __init__(self, seed: int = 0, target: int = 10):
+        self.target = target
+
+    def prices(self, potions: np.ndarray) -> np.ndarray:
+        return np.broadcast_to(BASE_PRICES, potions.shape)
+
+    def plan_barrels(self, state: State, barrels: List[Barrel]) -> np.ndarray:
+        ml, price, _ = barrel_arrays(barrels)
+        quantities = np.zeros((state.runs, len(barrels)), dtype=np.int64)
+        low = state.potions * ML_PER_POTION + state.ml < self.target * ML_PER_POTION
+        spent = np.zeros(state.runs, dtype=np.int64)
+        for color in range(len(COLORS)):
+            pure = np.flatnonzero(ml[:, color] == ML_PER_BARREL)
+            if len(pure):
+                cheapest = pure[np.argmin(price[pure])]
+                # Colors are bought in order while the gold lasts.
+                buy = low[:, color] & (spent + price[cheapest] <= state.gold)
+                quantities[:, cheapest] += buy
+                spent += buy * price[cheapest]
+        return quantities
+
+    def plan_bottles(self, state: State) -> np.ndarray:
+        return state.ml // ML_PER_POTION
+
+
+STRATEGIES = {"live": LivePlanners, "restock": Restock}
+
+
+def load_strategy(name: str, seed: int = 0) -> Strategy:
+    if name in STRATEGIES:
+        return STRATEGIES[name](seed)
+    module, _, attr = name.partition(":")
+    return getattr(importlib.import_module(module), attr)(seed)
+
+
+def simulate(
+    strategy: Strategy,
+    ticks: Iterable[Tick],
+    runs: int = 1000,
+    seed: int = 0,
+    elasticity: float = 1.0,
+) -> Report:
+    """
+    Each tick customers buy first (demand scales with base/price to the power
+    ``elasticity``), then barrels are bought and potions bottled. Barrel plans
+    a run can't afford are dropped for that tick, and bottling stops once a
+    run's potion capacity is full.
+    """
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    state = State.initial(runs)
+    stockouts = np.zeros(runs, dtype=np.int64)
+    n_ticks = 0
+
+    for tick in ticks:
+        n_ticks += 1
+
+        prices = strategy.prices(state.potions)
+        wanted = rng.poisson(tick.demand * (BASE_PRICES / prices) ** elasticity)
+        sold = np.minimum(wanted, state.potions)
+        state.potions -= sold
+        state.gold += (sold * prices).sum(axis=1)
+        stockouts += (wanted - sold).sum(axis=1)
+
+        if tick.barrels:
+            ml, price, available = barrel_arrays(tick.barrels)
+            quantities = np.minimum(
+                strategy.plan_barrels(state, tick.barrels), available
+            )
+            cost = quantities @ price
+            affordable = cost <= state.gold
+            quantities[~affordable] = 0
+            state.gold -= np.where(affordable, cost, 0)
+            state.ml += quantities @ ml
+
+        bottles = np.clip(strategy.plan_bottles(state), 0, state.ml // ML_PER_POTION)
+        # Colors are bottled in order until the potion capacity is full.
+        room = np.maximum(state.potion_capacity - state.potions.sum(axis=1), 0)
+        before = bottles.cumsum(axis=1) - bottles
+        bottles = np.clip(room[:, None] - before, 0, bottles)
+        state.ml -= bottles * ML_PER_POTION
+        state.potions += bottles
+
+    profit = state.gold - STARTING_GOLD
+    return Report(
+        strategy=strategy.name,
+        runs=runs,
+        days=n_ticks / TICKS_PER_DAY,
+        profit=float(profit.mean()),
+        profit_p10=float(np.percentile(profit, 10)),
+        profit_p90=float(np.percentile(profit, 90)),
+        stockouts=float(stockouts.mean()),
+        ml_waste=float((state.ml % ML_PER_POTION).sum(axis=1).mean()),
+        seconds=time.perf_counter() - start,
+    )
+
+
+def parse_tick(record: dict) -> Tick:
+    demand = np.zeros(len(COLORS), dtype=np.int64)
+    carts = record.get("carts", [])
+    for cart in carts:
+        for sku, quantity in cart.items():
+            if sku in POTION_SKUS:
+                demand[POTION_SKUS.index(sku)] += quantity
+    return Tick(
+        [Barrel.model_validate(barrel) for barrel in record.get("barrels", [])],
+        demand,
+    )
+
+
+def load_ticks(path: str) -> List[Tick]:
+    with open(path) as f:
+        return [parse_tick(json.loads(line)) for line in f if line.strip()]
+
+
+def synthetic_ticks(days: int, seed: int = 0) -> List[Tick]:
+    """
+    Small pure barrels every tick and steady demand that favours red.
+    """
+    rng = np.random.default_rng(seed)
+    barrels = [
+        Barrel(
+            sku=f"SMALL_{color.upper()}_BARREL",
+            potion_type=[1.0 if i == j else 0.0 for j in range(len(COLORS))],
+            price=100 + 20 * i,
+            quantity=10,
+        )
+        for i, color in enumerate(COLORS)
+    ]
+    mean_demand = np.array([2.0, 1.0, 1.0, 0.5])
+    return [
+        Tick(barrels, rng.poisson(mean_demand)) for _ in range(days * TICKS_PER_DAY)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--ticks", help="JSON lines file of recorded ticks")
+    source.add_argument("--synthetic-days", type=int)
+    parser.add_argument(
+        "--days", type=int, help="simulate this many days, cycling the ticks"
+    )
+    parser.add_argument("--runs", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--elasticity", type=float, default=1.0)
+    parser.add_argument("--strategy", nargs="+", default=["live", "restock"])
+    args = parser.parse_args()
+
+    if args.ticks:
+        ticks = load_ticks(args.ticks)
+    else:
+        ticks = synthetic_ticks(args.synthetic_days, args.seed)
+    if not ticks:
+        parser.error("no ticks to replay")
+    if args.days:
+        n = args.days * TICKS_PER_DAY
+        ticks = [ticks[i % len(ticks)] for i in range(n)]
+
+    print(
+        f"{'strategy':<12} {'profit':>10} {'p10':>10} {'p90':>10} "
+        f"{'stockouts':>10} {'ml waste':>9} {'run-days/min':>13}"
+    )
+    for name in args.strategy:
+        report = simulate(
+            load_strategy(name, args.seed), ticks, args.runs, args.seed, args.elasticity
+        )
+        print(
+            f"{report.strategy:<12} {report.profit:>10.0f} {report.profit_p10:>10.0f} "
+            f"{report.profit_p90:>10.0f} {report.stockouts:>10.1f} "
+            f"{report.ml_waste:>9.1f} "
+            f"{report.runs * report.days / report.seconds * 60:>13,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+In-process fan-out of balance and catalog changes to streaming clients.
+
+One Broadcaster per worker re-reads balances when the ledger changes (via
+the LISTEN/NOTIFY listener in src/pubsub.py, or every POLL_SECONDS when it
+isn't connected), diffs them against the last read and puts the resulting
+events on each subscriber's queue. However many clients are connected, a
+change costs one query.
+
+A subscriber that falls QUEUE_SIZE events behind has its queue replaced by a
+fresh snapshot rather than slowing everyone else down.
+"""
+
+import asyncio
+import logging
+from typing import Callable
+
+from starlette.concurrency import run_in_threadpool
+
+from src import database as db, ledger, pubsub
+from src.api import catalog
+
+logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 5.0
+QUEUE_SIZE = 64
+# A failed refresh is retried after this long, doubling up to the maximum.
+RETRY_DELAY_SECONDS = 1.0
+MAX_RETRY_DELAY_SECONDS = 30.0
+
+Event = tuple[str, dict]
+SNAPSHOT_EVENTS = 2
+
+
+def fetch_balances() -> dict[str, int]:
+    with db.engine.begin() as connection:
+        return ledger.balances(connection)
+
+
+def diff_balances(old: dict[str, int], new: dict[str, int]) -> dict[str, int]:
+    changed = {
+        resource: balance
+        for resource, balance in new.items()
+        if old.get(resource) != balance
+    }
+    # Resources gone since the last read (i.e. after a reset) are now zero.
+    changed.update({resource: 0 for resource in old.keys() - new.keys()})
+    return changed
+
+
+def diff_catalog(old: list[dict], new: list[dict]) -> dict:
+    old_items = {item["sku"]: item for item in old}
+    new_items = {item["sku"]: item for item in new}
+    return {
+        "upserted": [
+            item for sku, item in new_items.items() if old_items.get(sku) != item
+        ],
+        "removed": [sku for sku in old_items if sku not in new_items],
+    }
+
+
+class Broadcaster:
+    def __init__(
+        self,
+        fetch: Callable[[], dict[str, int]] = fetch_balances,
+        poll_seconds: float = POLL_SECONDS,
+        queue_size: int = QUEUE_SIZE,
+    ):
+        self.fetch = fetch
+        self.poll_seconds = poll_seconds
+        self.queue_size = queue_size
+        self.subscribers: set[asyncio.Queue] = set()
+        self.balances: dict[str, int] = {}
+        self.catalog: list[dict] = []
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def notify(self, payload: str | None = None):
+        """
+        Schedules a refresh; safe to call from any thread.
+        """
+        # Read both once: the listener thread may call this while the event
+        # loop is subscribing or unsubscribing.
+        loop, wake = self._loop, self._wake
+        if loop is not None and wake is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wake.set)
+
+    def snapshot(self) -> list[Event]:
+        return [
+            ("balances", dict(self.balances)),
+            ("catalog", {"upserted": list(self.catalog), "removed": [], "reset": True}),
+        ]
+
+    async def subscribe(self) -> asyncio.Queue:
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run(self._wake))
+            self._task.add_done_callback(self._task_done)
+            try:
+                await self.refresh()
+            except Exception:
+                # Don't leave the loop running for a stream that never started.
+                if not self.subscribers:
+                    self._stop()
+                raise
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for event in self.snapshot():
+            queue.put_nowait(event)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers:
+            self._stop()
+
+    def _stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            self._loop = None
+
+    def _task_done(self, task: asyncio.Task):
+        # Lets the next subscriber start a new loop however this one ended.
+        if self._task is task:
+            self._task = None
+            self._loop = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Broadcast loop stopped", exc_info=task.exception())
+
+    async def _run(self, wake: asyncio.Event):
+        delay = RETRY_DELAY_SECONDS
+        while True:
+            try:
+                await asyncio.wait_for(wake.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                if pubsub.is_listening():
+                    continue
+            wake.clear()
+            try:
+                await self.refresh()
+            except Exception:
+                logger.exception("Refreshing balances for streams failed")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_DELAY_SECONDS)
+                wake.set()
+            else:
+                delay = RETRY_DELAY_SECONDS
+
+    async def refresh(self):
+        balances = await run_in_threadpool(self.fetch)
+        new_catalog = catalog.build_catalog(balances)
+        events: list[Event] = []
+        changed = diff_balances(self.balances, balances)
+        if changed:
+            events.append(("balances", changed))
+        catalog_diff = diff_catalog(self.catalog, new_catalog)
+        if catalog_diff["upserted"] or catalog_diff["removed"]:
+            events.append(("catalog", catalog_diff))
+        self.balances, self.catalog = balances, new_catalog
+        for queue in list(self.subscribers):
+            self._send(queue, events)
+
+    def _send(self, queue: asyncio.Queue, events: list[Event]):
+        if queue.qsize() + len(events) > self.queue_size - SNAPSHOT_EVENTS:
+            # Too far behind for diffs to be useful; start it over.
+            while not queue.empty():
+                queue.get_nowait()
+            events = self.snapshot()
+        for event in events:
+            queue.put_nowait(event)
+
+
+broadcaster = Broadcaster()
+pubsub.subscribe(pubsub.LEDGER_CHANNEL, broadcaster.notify)
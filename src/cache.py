@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after ``ttl`` seconds.
+    Safe to share between the threads serving sync endpoints.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by clear(), so a value computed before an invalidation
+        # isn't stored after it.
+        self.generation = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Hashable, value: Any, generation: int | None = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+# Responses of orders already committed to executed_orders, keyed by order id.
+# Retries (e.g. after a timeout) are answered from here without touching
+# Postgres; misses fall back to the table. Deliveries store None.
+completed_orders = TTLCache(maxsize=10_000, ttl=60 * 60)
+
+# Current potion balances, read by the catalog. Only used while the
+# LISTEN/NOTIFY listener (src/pubsub.py) is connected; it clears this whenever
+# a potion balance changes in any worker.
+potion_balances = TTLCache(maxsize=1, ttl=5 * 60)
+
+# Storage capacity (src/api/inventory.py), under the same rule: only used
+# while the listener is connected, cleared when capacity is bought or reset.
+capacity = TTLCache(maxsize=1, ttl=5 * 60)
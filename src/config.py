@@ -2,19 +2,68 @@ from dotenv import load_dotenv, find_dotenv
 import os
 from functools import lru_cache
 
-# Load default first
-load_dotenv(dotenv_path="default.env", override=False)
-
-# Then override with .env if available
-load_dotenv(dotenv_path=find_dotenv(".env"), override=True)
-
 
 class Settings:
-    API_KEY: str | None = os.getenv("API_KEY")
-    POSTGRES_URI: str | None = os.getenv("POSTGRES_URI") or os.getenv("DATABASE_URL")
-
     def __init__(self):
-        if not self.API_KEY:
+        self.API_KEY: str | None = os.getenv("API_KEY")
+        # Comma-separated "<key_id>:<sha256 hex>" entries.
+        self.API_KEYS: str | None = os.getenv("API_KEYS")
+        # Same format, one per line; re-read on change for key rotation.
+        self.API_KEYS_FILE: str | None = os.getenv("API_KEYS_FILE")
+        self.POSTGRES_URI: str | None = os.getenv("POSTGRES_URI") or os.getenv(
+            "DATABASE_URL"
+        )
+        # Optional streaming replica for read-only endpoints (db.read_engine).
+        self.POSTGRES_REPLICA_URI: str | None = os.getenv("POSTGRES_REPLICA_URI")
+        # Reads go back to the primary while the replica is further behind.
+        self.REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2"))
+        # psycopg prepares a statement server-side once a connection has run it
+        # this many times; "off" disables it (e.g. behind PgBouncer in
+        # transaction mode, which can't keep prepared statements).
+        prepare_threshold = os.getenv("PREPARE_THRESHOLD", "2")
+        self.PREPARE_THRESHOLD: int | None = (
+            None if prepare_threshold == "off" else int(prepare_threshold)
+        )
+        # Statements slower than this are logged and EXPLAINed; unset disables it.
+        self.SLOW_QUERY_MS: float | None = (
+            float(os.environ["SLOW_QUERY_MS"]) if os.getenv("SLOW_QUERY_MS") else None
+        )
+        # Per API key and route, unless overridden in src/ratelimit.py.
+        self.RATE_LIMIT_PER_SECOND = float(os.getenv("RATE_LIMIT_PER_SECOND", "10"))
+        self.RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "20"))
+        self.MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+        # Non-priority requests get a 503 while the pool wait is above this.
+        self.POOL_WAIT_SHED_MS = float(os.getenv("POOL_WAIT_SHED_MS", "250"))
+        # LISTEN/NOTIFY listener that invalidates in-process caches (src/pubsub.py).
+        self.CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "1") != "0"
+        # Write-behind buffer for analytics rows (src/analytics.py).
+        self.ANALYTICS_FLUSH_MS = float(os.getenv("ANALYTICS_FLUSH_MS", "500"))
+        self.ANALYTICS_MAX_BATCH = int(os.getenv("ANALYTICS_MAX_BATCH", "500"))
+        self.ANALYTICS_MAX_PENDING = int(os.getenv("ANALYTICS_MAX_PENDING", "10000"))
+        # Background jobs (src/jobs.py); SCHEDULER=0 leaves them to cron.
+        self.SCHEDULER = os.getenv("SCHEDULER", "1") != "0"
+        self.RETENTION_INTERVAL_SECONDS = float(
+            os.getenv("RETENTION_INTERVAL_SECONDS", "3600")
+        )
+        self.CHECKPOINT_INTERVAL_SECONDS = float(
+            os.getenv("CHECKPOINT_INTERVAL_SECONDS", "300")
+        )
+        self.CACHE_WARM_INTERVAL_SECONDS = float(
+            os.getenv("CACHE_WARM_INTERVAL_SECONDS", "60")
+        )
+        self.DEMAND_STATS_INTERVAL_SECONDS = float(
+            os.getenv("DEMAND_STATS_INTERVAL_SECONDS", "60")
+        )
+        # Retention windows used by src/maintenance.py.
+        self.RETENTION_EXECUTED_ORDERS_DAYS = float(
+            os.getenv("RETENTION_EXECUTED_ORDERS_DAYS", "7")
+        )
+        self.RETENTION_CARTS_HOURS = float(os.getenv("RETENTION_CARTS_HOURS", "24"))
+        self.RETENTION_LOGS_DAYS = float(os.getenv("RETENTION_LOGS_DAYS", "30"))
+        # Ledger epochs kept including the current one (each reset starts one).
+        self.RETENTION_LEDGER_EPOCHS = int(os.getenv("RETENTION_LEDGER_EPOCHS", "2"))
+
+        if not (self.API_KEY or self.API_KEYS or self.API_KEYS_FILE):
             raise ValueError("API_KEY is missing in the environment variables.")
         if not self.POSTGRES_URI:
             raise ValueError("POSTGRES_URI is missing in the environment variables.")
@@ -22,4 +71,10 @@ class Settings:
 
 @lru_cache()
 def get_settings():
+    # Load default first
+    load_dotenv(dotenv_path="default.env", override=False)
+
+    # Then override with .env if available
+    load_dotenv(dotenv_path=find_dotenv(".env"), override=True)
+
     return Settings()
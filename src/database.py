@@ -1,9 +1,201 @@
-from src import config
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.orm import declarative_base
+import logging
+import sys
+import threading
+import time
+from src import config, querylog
+from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that keeps a moving average of how long callers wait for a
+    connection, used to shed load before requests pile up on Postgres.
+    """
+
+    SMOOTHING = 0.2
+    # The average is ignored once nobody has checked out a connection for this long.
+    STALE_AFTER_SECONDS = 2.0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_ms = 0.0
+        self.last_checkout = 0.0
+
+    def connect(self):
+        start = time.monotonic()
+        try:
+            return super().connect()
+        finally:
+            now = time.monotonic()
+            waited = (now - start) * 1000
+            self.wait_ms += self.SMOOTHING * (waited - self.wait_ms)
+            self.last_checkout = now
+
+    def recent_wait_ms(self) -> float:
+        if time.monotonic() - self.last_checkout > self.STALE_AFTER_SECONDS:
+            return 0.0
+        return self.wait_ms
+
+
+# The engine (and with it the psycopg driver) is created on first use of
+# ``db.engine`` rather than at import, which keeps serverless cold starts short.
+_engine_lock = threading.RLock()
+
+
+logger = logging.getLogger(__name__)
+
+
+def create_app_engine(uri: str | None = None, log_slow_queries: bool = True):
+    settings = config.get_settings()
+    uri = uri or settings.POSTGRES_URI
+    if make_url(uri).get_backend_name() == "sqlite":
+        # Tests and benchmarks without a Postgres; see src/sqlite_backend.py.
+        from src import sqlite_backend
+
+        return sqlite_backend.create_sqlite_engine(uri)
+    engine = create_engine(
+        uri,
+        pool_pre_ping=True,
+        poolclass=TimedQueuePool,
+        connect_args={"prepare_threshold": settings.PREPARE_THRESHOLD},
+    )
+    # The slow-query log stores what it captures through the engine it
+    # watches, so it is left off the read-only replica.
+    if settings.SLOW_QUERY_MS and log_slow_queries:
+        querylog.install(engine, settings.SLOW_QUERY_MS)
+    return engine
+
+
+def variant(bind, variants: dict):
+    """
+    The entry of ``variants`` for the dialect of ``bind`` (an engine or a
+    connection), for queries written differently on Postgres and SQLite.
+    """
+    return variants[bind.dialect.name]
+
+
+# Isolation level giving one consistent snapshot for the whole transaction.
+SNAPSHOT_ISOLATION = {"postgresql": "REPEATABLE READ", "sqlite": "SERIALIZABLE"}
+
+
+# The primary's WAL position, which the replica must have replayed to be
+# caught up.
+PRIMARY_WAL_LSN_SQL = text("SELECT CAST(pg_current_wal_lsn() AS text)")
+
+# Zero once the replica has replayed up to :primary_lsn, so an idle primary
+# doesn't make it look stale; otherwise the age of its last replayed
+# transaction. NULL when it isn't a standby or hasn't replayed anything.
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN NULL
+        WHEN pg_last_wal_replay_lsn() >= CAST(:primary_lsn AS pg_lsn) THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaMonitor:
+    """
+    Decides whether reads may go to the replica. Its lag behind ``primary``
+    is checked at most every CHECK_INTERVAL_SECONDS; a replica that is too
+    far behind, can't be reached or isn't a standby is skipped until the
+    next check.
+    """
+
+    CHECK_INTERVAL_SECONDS = 1.0
+
+    def __init__(self, primary, replica, max_lag_seconds: float):
+        self.primary = primary
+        self.replica = replica
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_seconds: float | None = None
+        self.checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def measure_lag(self) -> float | None:
+        with self.primary.connect() as connection:
+            primary_lsn = connection.execute(PRIMARY_WAL_LSN_SQL).scalar_one()
+        with self.replica.connect() as connection:
+            lag = connection.execute(
+                REPLICA_LAG_SQL, {"primary_lsn": primary_lsn}
+            ).scalar_one()
+        return None if lag is None else float(lag)
+
+    def usable(self) -> bool:
+        now = time.monotonic()
+        if now - self.checked_at >= self.CHECK_INTERVAL_SECONDS and self._lock.acquire(
+            blocking=False
+        ):
+            try:
+                self.lag_seconds = self.measure_lag()
+                if self.lag_seconds is None:
+                    logger.warning(
+                        "Replica is not a streaming standby; reading from the primary"
+                    )
+            except Exception:
+                logger.warning("Replica unreachable; reading from the primary")
+                self.lag_seconds = None
+            finally:
+                self.checked_at = now
+                self._lock.release()
+        lag = self.lag_seconds
+        return lag is not None and lag <= self.max_lag_seconds
+
+
+def read_engine():
+    """
+    Engine for read-only endpoints: the replica when POSTGRES_REPLICA_URI is
+    set and it is within REPLICA_MAX_LAG_SECONDS of the primary, otherwise
+    the primary. Reads through it may be that far behind, so anything that
+    must see the caller's own writes, or another call's just before it (the
+    plan endpoints run right after deliveries), or feeds a cache stays on
+    ``engine``.
+    """
+    module = sys.modules[__name__]  # so the lazy attributes are resolved
+    monitor = module.replica_monitor
+    if monitor is not None and monitor.usable():
+        return monitor.replica
+    return module.engine
+
+
+def pool_wait_ms() -> float:
+    engine = globals().get("engine")
+    if engine is None or not isinstance(engine.pool, TimedQueuePool):
+        return 0.0
+    return engine.pool.recent_wait_ms()
 
-connection_url = config.get_settings().POSTGRES_URI
-engine = create_engine(connection_url, pool_pre_ping=True)
 
 metadata = MetaData()
-Base = declarative_base(metadata=metadata)
+
+
+def __getattr__(name):
+    if name == "engine":
+        with _engine_lock:
+            if "engine" not in globals():
+                globals()["engine"] = create_app_engine()
+        return globals()["engine"]
+    if name == "replica_monitor":
+        with _engine_lock:
+            if "replica_monitor" not in globals():
+                settings = config.get_settings()
+                globals()["replica_monitor"] = (
+                    ReplicaMonitor(
+                        sys.modules[__name__].engine,
+                        create_app_engine(
+                            settings.POSTGRES_REPLICA_URI, log_slow_queries=False
+                        ),
+                        settings.REPLICA_MAX_LAG_SECONDS,
+                    )
+                    if settings.POSTGRES_REPLICA_URI
+                    else None
+                )
+        return globals()["replica_monitor"]
+    if name == "Base":
+        # sqlalchemy.orm is only needed by the models (i.e. alembic).
+        from sqlalchemy.orm import declarative_base
+
+        globals()["Base"] = declarative_base(metadata=metadata)
+        return globals()["Base"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
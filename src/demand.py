@@ -0,0 +1,94 @@
+"""
+Who has been visiting the shop, by character class and level, over the last
+VISIT_WINDOW visits (ticks).
+
+``/carts/visits/{visit_id}`` adds each visit to this worker's stats as it is
+recorded; a scheduled job (src/jobs.py) rebuilds them from customer_visits
+so every worker sees visits recorded by the others.
+"""
+
+import threading
+from collections import Counter, OrderedDict
+from typing import Iterable
+
+import sqlalchemy
+
+VISIT_WINDOW = 24
+LEVEL_BAND = 5
+
+RECENT_VISITS_SQL = sqlalchemy.text("""
+    SELECT visit_id, character_class, level, COUNT(*) AS customers
+    FROM customer_visits
+    WHERE visit_id IN (
+        SELECT visit_id FROM customer_visits
+        GROUP BY visit_id
+        ORDER BY visit_id DESC
+        LIMIT :window
+    )
+    GROUP BY visit_id, character_class, level
+    ORDER BY visit_id
+""")
+
+
+def level_band(level: int) -> str:
+    low = (level - 1) // LEVEL_BAND * LEVEL_BAND + 1
+    return f"{low}-{low + LEVEL_BAND - 1}"
+
+
+class DemandStats:
+    def __init__(self, window: int = VISIT_WINDOW):
+        self.window = window
+        self._visits: OrderedDict[int, Counter] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, visit_id: int, customers: Iterable[tuple[str, int]]):
+        """
+        Adds ``(character_class, level)`` of each customer in a visit.
+        """
+        with self._lock:
+            counts = self._visits.setdefault(visit_id, Counter())
+            counts.update(
+                (character_class, level) for character_class, level in customers
+            )
+            while len(self._visits) > self.window:
+                self._visits.popitem(last=False)
+
+    def load(self, connection):
+        visits: OrderedDict[int, Counter] = OrderedDict()
+        for row in connection.execute(RECENT_VISITS_SQL, {"window": self.window}):
+            visits.setdefault(row.visit_id, Counter())[
+                row.character_class, row.level
+            ] += row.customers
+        with self._lock:
+            self._visits = visits
+
+    def snapshot(self) -> dict:
+        by_class: Counter = Counter()
+        by_level: Counter = Counter()
+        by_class_and_level: dict[str, Counter] = {}
+        with self._lock:
+            visits = len(self._visits)
+            for counts in self._visits.values():
+                for (character_class, level), customers in counts.items():
+                    band = level_band(level)
+                    by_class[character_class] += customers
+                    by_level[band] += customers
+                    by_class_and_level.setdefault(character_class, Counter())[band] += (
+                        customers
+                    )
+        return {
+            "visits": visits,
+            "customers": sum(by_class.values()),
+            "by_class": dict(by_class.most_common()),
+            "by_level": {
+                band: by_level[band]
+                for band in sorted(by_level, key=lambda band: int(band.split("-")[0]))
+            },
+            "by_class_and_level": {
+                character_class: dict(counts)
+                for character_class, counts in sorted(by_class_and_level.items())
+            },
+        }
+
+
+stats = DemandStats()
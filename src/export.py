@@ -0,0 +1,221 @@
+"""
+Streams ledger and log tables out of Postgres into day-partitioned files for
+offline analysis (e.g. the experiments in docs/strategy.md), so they don't
+have to run against the production database.
+
+Rows are read through a server-side cursor in chunks and written as they
+arrive, so memory stays bounded by the chunk size regardless of table size.
+
+    python -m src.export --out exports [--format csv|parquet]
+        [--tables ledger_entries checkout_logs] [--since 2026-01-01]
+        [--until 2026-02-01] [--include-archive]
+
+Output: <out>/<table>/<YYYY-MM-DD>.csv.gz (or .parquet). Parquet needs the
+optional ``pyarrow`` package.
+"""
+
+import argparse
+import csv
+import gzip
+import os
+from datetime import date
+from typing import TYPE_CHECKING, Callable, Iterable, Protocol, Sequence
+
+import sqlalchemy
+
+from src import database as db
+
+if TYPE_CHECKING:
+    import pyarrow.parquet as pq
+
+TABLES = ("ledger_entries", "checkout_logs", "bottling_logs")
+# Tables whose old rows the retention job moves to <table>_archive.
+ARCHIVED_TABLES = ("checkout_logs", "bottling_logs")
+CHUNK_SIZE = 10_000
+
+
+class Partition(Protocol):
+    def write(self, rows: list[Sequence]) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class CsvPartition:
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.file = gzip.open(path + ".csv.gz", "wt", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows: list[Sequence]):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+def parquet_schema(columns: Sequence[str]):
+    """
+    The Parquet schema of the exported ``columns``, declared up front so a
+    column that is all null in the first chunk doesn't get the null type.
+    """
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(),
+        "resource": pa.string(),
+        "change": pa.int64(),
+        "context": pa.string(),
+        "timestamp": pa.timestamp("us"),
+        "epoch": pa.int64(),
+        "total_potions": pa.int64(),
+        "total_gold": pa.int64(),
+        "potion_type": pa.list_(pa.int64()),
+        "quantity": pa.int64(),
+    }
+    return pa.schema([(column, types[column]) for column in columns])
+
+
+class ParquetPartition:
+    def __init__(self, path: str, columns: Sequence[str]):
+        self.path = path + ".parquet"
+        self.columns = list(columns)
+        self.writer: pq.ParquetWriter | None = None
+
+    def write(self, rows: list[Sequence]):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(
+                self.path, parquet_schema(self.columns), compression="zstd"
+            )
+        # Each chunk becomes one row group.
+        self.writer.write_table(
+            pa.Table.from_pylist(
+                [dict(zip(self.columns, row)) for row in rows],
+                schema=self.writer.schema,
+            )
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+PARTITION_FORMATS: dict[str, Callable[[str, Sequence[str]], Partition]] = {
+    "csv": CsvPartition,
+    "parquet": ParquetPartition,
+}
+
+
+def write_partitions(
+    rows: Iterable[Sequence],
+    columns: Sequence[str],
+    out_dir: str,
+    fmt: str = "csv",
+    chunk_size: int = CHUNK_SIZE,
+) -> dict[date, int]:
+    """
+    Writes rows, which must be ordered by their ``timestamp`` column, to one
+    file per day. Returns the row count per day.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    timestamp_index = list(columns).index("timestamp")
+    partition_cls = PARTITION_FORMATS[fmt]
+
+    counts: dict[date, int] = {}
+    day = None
+    partition: Partition | None = None
+    buffer: list[Sequence] = []
+
+    def flush():
+        if buffer:
+            assert partition is not None
+            partition.write(buffer)
+            buffer.clear()
+
+    try:
+        for row in rows:
+            row_day = row[timestamp_index].date()
+            if row_day != day:
+                flush()
+                if partition is not None:
+                    partition.close()
+                day = row_day
+                partition = partition_cls(
+                    os.path.join(out_dir, day.isoformat()), columns
+                )
+            buffer.append(row)
+            counts[day] = counts.get(day, 0) + 1
+            if len(buffer) >= chunk_size:
+                flush()
+        flush()
+    finally:
+        if partition is not None:
+            partition.close()
+    return counts
+
+
+def export_table(
+    connection,
+    table: str,
+    out_dir: str,
+    fmt: str = "csv",
+    since: date | None = None,
+    until: date | None = None,
+    include_archive: bool = False,
+    chunk_size: int = CHUNK_SIZE,
+) -> dict[date, int]:
+    source = table
+    if include_archive and table in ARCHIVED_TABLES:
+        source = f"(SELECT * FROM {table} UNION ALL SELECT * FROM {table}_archive) t"
+
+    result = connection.execute(
+        sqlalchemy.text(f"""
+            SELECT * FROM {source}
+            WHERE (CAST(:since AS date) IS NULL OR timestamp >= :since)
+              AND (CAST(:until AS date) IS NULL OR timestamp < :until)
+            ORDER BY timestamp
+        """),
+        {"since": since, "until": until},
+        execution_options={"stream_results": True, "yield_per": chunk_size},
+    )
+    return write_partitions(
+        result, list(result.keys()), os.path.join(out_dir, table), fmt, chunk_size
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--format", choices=PARTITION_FORMATS, default="csv")
+    parser.add_argument("--tables", nargs="+", choices=TABLES, default=TABLES)
+    parser.add_argument("--since", type=date.fromisoformat)
+    parser.add_argument("--until", type=date.fromisoformat)
+    parser.add_argument("--include-archive", action="store_true")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error("--format parquet requires pyarrow (pip install pyarrow)")
+
+    with db.engine.begin() as connection:
+        for table in args.tables:
+            counts = export_table(
+                connection,
+                table,
+                args.out,
+                args.format,
+                args.since,
+                args.until,
+                args.include_archive,
+                args.chunk_size,
+            )
+            print(f"{table}: {sum(counts.values())} rows in {len(counts)} files")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+The periodic jobs the app schedules (see src/scheduler.py).
+"""
+
+from src import config, database as db, demand, maintenance, pubsub, replay
+from src.api import catalog, inventory
+from src.scheduler import Job, Scheduler
+
+
+def checkpoint_ledger():
+    with db.engine.begin() as connection:
+        replay.backfill_checkpoints(connection)
+
+
+def warm_caches():
+    # The caches are only used while the listener keeps them fresh.
+    if pubsub.is_listening():
+        catalog.fetch_potion_balances()
+        inventory.get_capacity()
+
+
+def reload_demand_stats():
+    # Picks up visits recorded by the other workers.
+    with db.engine.begin() as connection:
+        demand.stats.load(connection)
+
+
+def register(scheduler: Scheduler):
+    settings = config.get_settings()
+    scheduler.add(
+        Job(
+            "warm_caches",
+            warm_caches,
+            settings.CACHE_WARM_INTERVAL_SECONDS,
+            leader_only=False,
+        )
+    )
+    scheduler.add(
+        Job(
+            "demand_stats",
+            reload_demand_stats,
+            settings.DEMAND_STATS_INTERVAL_SECONDS,
+            leader_only=False,
+        )
+    )
+    if db.engine.dialect.name == "postgresql":
+        scheduler.add(
+            Job(
+                "retention",
+                maintenance.run_retention,
+                settings.RETENTION_INTERVAL_SECONDS,
+            )
+        )
+        scheduler.add(
+            Job(
+                "ledger_checkpoints",
+                checkpoint_ledger,
+                settings.CHECKPOINT_INTERVAL_SECONDS,
+            )
+        )
@@ -0,0 +1,68 @@
+"""
+Ledger helpers shared by endpoints that work on balances in memory.
+"""
+
+import sqlalchemy
+
+from src import database as db
+
+BALANCES_SQL = sqlalchemy.text("""
+    SELECT resource, SUM(change) AS balance
+    FROM current_ledger_entries
+    GROUP BY resource
+""")
+
+RESOURCE_BALANCES_SQL = {
+    "postgresql": sqlalchemy.text("""
+        SELECT resource, SUM(change) AS balance
+        FROM current_ledger_entries
+        WHERE resource = ANY(:resources)
+        GROUP BY resource
+    """),
+    "sqlite": sqlalchemy.text("""
+        SELECT resource, SUM(change) AS balance
+        FROM current_ledger_entries
+        WHERE resource IN :resources
+        GROUP BY resource
+    """).bindparams(sqlalchemy.bindparam("resources", expanding=True)),
+}
+
+INSERT_ENTRY_SQL = sqlalchemy.text("""
+    INSERT INTO ledger_entries (resource, change, context)
+    VALUES (:resource, :change, :context)
+""")
+
+# Orders already applied, recorded in the same transaction as their entries.
+ORDER_EXECUTED_SQL = sqlalchemy.text("""
+    SELECT 1 FROM executed_orders WHERE order_id = :oid
+""")
+RECORD_ORDER_SQL = sqlalchemy.text("""
+    INSERT INTO executed_orders (order_id) VALUES (:oid)
+""")
+
+POTION_RESOURCES = ("red_potions", "green_potions", "blue_potions", "dark_potions")
+ML_RESOURCES = ("red_ml", "green_ml", "blue_ml", "dark_ml")
+
+
+def balances(connection, resources: tuple[str, ...] | None = None) -> dict[str, int]:
+    """
+    Balances in the current epoch, of every resource or just ``resources``,
+    in one scan.
+    """
+    if resources is None:
+        rows = connection.execute(BALANCES_SQL)
+    else:
+        rows = connection.execute(
+            db.variant(connection, RESOURCE_BALANCES_SQL),
+            {"resources": list(resources)},
+        )
+    return {resource: balance for resource, balance in rows}
+
+
+def total(balances: dict[str, int], resources: tuple[str, ...]) -> int:
+    return sum(balances.get(resource, 0) for resource in resources)
+
+
+def apply(balances: dict[str, int], changes: dict[str, int]):
+    for resource, change in changes.items():
+        balances[resource] = balances.get(resource, 0) + change
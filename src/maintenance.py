@@ -0,0 +1,202 @@
+"""
+Retention for tables that otherwise grow without bound.
+
+Old rows are removed in small batches, each in its own transaction, so no
+statement holds locks for long. Analytics logs are moved to ``*_archive``
+tables rather than deleted.
+
+    python -m src.maintenance
+"""
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+import sqlalchemy
+
+from src import config, database as db
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class RetentionPolicy:
+    table: str
+    timestamp_column: str
+    max_age: timedelta
+    archive: bool = False
+
+
+@dataclass
+class PruneResult:
+    table: str
+    rows: int
+    seconds: float
+    archived: bool
+
+
+def retention_policies() -> list[RetentionPolicy]:
+    settings = config.get_settings()
+    return [
+        RetentionPolicy(
+            "executed_orders",
+            "timestamp",
+            timedelta(days=settings.RETENTION_EXECUTED_ORDERS_DAYS),
+        ),
+        RetentionPolicy(
+            "customer_visits",
+            "timestamp",
+            timedelta(days=settings.RETENTION_LOGS_DAYS),
+        ),
+        RetentionPolicy(
+            "game_ticks",
+            "timestamp",
+            timedelta(days=settings.RETENTION_LOGS_DAYS),
+        ),
+        RetentionPolicy(
+            "checkout_logs",
+            "timestamp",
+            timedelta(days=settings.RETENTION_LOGS_DAYS),
+            archive=True,
+        ),
+        RetentionPolicy(
+            "bottling_logs",
+            "timestamp",
+            timedelta(days=settings.RETENTION_LOGS_DAYS),
+            archive=True,
+        ),
+    ]
+
+
+def delete_batch_sql(policy: RetentionPolicy) -> sqlalchemy.TextClause:
+    batch = f"""
+        DELETE FROM {policy.table}
+        WHERE ctid = ANY(ARRAY(
+            SELECT ctid FROM {policy.table}
+            WHERE {policy.timestamp_column} < NOW() - CAST(:max_age AS interval)
+            LIMIT :batch_size
+        ))
+    """
+    if policy.archive:
+        return sqlalchemy.text(f"""
+            WITH moved AS ({batch} RETURNING *)
+            INSERT INTO {policy.table}_archive SELECT * FROM moved
+        """)
+    return sqlalchemy.text(batch)
+
+
+# Carts (and their items) that were never checked out.
+DELETE_ABANDONED_CARTS_SQL = sqlalchemy.text("""
+    WITH doomed AS (
+        SELECT cart_id FROM carts
+        WHERE created_at < NOW() - CAST(:max_age AS interval)
+        ORDER BY cart_id
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ),
+    items AS (
+        DELETE FROM cart_items WHERE cart_id IN (SELECT cart_id FROM doomed)
+    )
+    DELETE FROM carts WHERE cart_id IN (SELECT cart_id FROM doomed)
+""")
+
+
+# Epochs before the last :keep_epochs. Picked by position rather than by
+# subtracting from the current id: the serial skips ids after a rollback.
+OLD_EPOCHS = """
+    SELECT id FROM ledger_epochs ORDER BY id DESC OFFSET :keep_epochs
+"""
+
+# Ledger entries of epochs before the last few resets.
+DELETE_OLD_EPOCHS_SQL = sqlalchemy.text(f"""
+    DELETE FROM ledger_entries
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM ledger_entries
+        WHERE epoch IN ({OLD_EPOCHS})
+        LIMIT :batch_size
+    ))
+""")
+
+
+# Checkpoints of those epochs, useless once their entries are gone.
+DELETE_OLD_CHECKPOINTS_SQL = sqlalchemy.text(f"""
+    DELETE FROM ledger_checkpoints
+    WHERE id = ANY(ARRAY(
+        SELECT id FROM ledger_checkpoints
+        WHERE epoch IN ({OLD_EPOCHS})
+        LIMIT :batch_size
+    ))
+""")
+
+
+def delete_in_batches(
+    statement: sqlalchemy.TextClause, params: dict, batch_size: int
+) -> int:
+    total = 0
+    while True:
+        with db.engine.begin() as connection:
+            deleted = connection.execute(
+                statement, {**params, "batch_size": batch_size}
+            ).rowcount
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+
+def prune(policy: RetentionPolicy, batch_size: int = BATCH_SIZE) -> PruneResult:
+    start = time.perf_counter()
+    rows = delete_in_batches(
+        delete_batch_sql(policy), {"max_age": policy.max_age}, batch_size
+    )
+    return PruneResult(policy.table, rows, time.perf_counter() - start, policy.archive)
+
+
+def prune_abandoned_carts(batch_size: int = BATCH_SIZE) -> PruneResult:
+    start = time.perf_counter()
+    max_age = timedelta(hours=config.get_settings().RETENTION_CARTS_HOURS)
+    rows = delete_in_batches(
+        DELETE_ABANDONED_CARTS_SQL, {"max_age": max_age}, batch_size
+    )
+    return PruneResult("carts", rows, time.perf_counter() - start, False)
+
+
+def prune_old_epochs(batch_size: int = BATCH_SIZE) -> PruneResult:
+    start = time.perf_counter()
+    keep_epochs = config.get_settings().RETENTION_LEDGER_EPOCHS
+    rows = delete_in_batches(
+        DELETE_OLD_EPOCHS_SQL, {"keep_epochs": keep_epochs}, batch_size
+    )
+    return PruneResult("ledger_entries", rows, time.perf_counter() - start, False)
+
+
+def prune_old_checkpoints(batch_size: int = BATCH_SIZE) -> PruneResult:
+    start = time.perf_counter()
+    keep_epochs = config.get_settings().RETENTION_LEDGER_EPOCHS
+    rows = delete_in_batches(
+        DELETE_OLD_CHECKPOINTS_SQL, {"keep_epochs": keep_epochs}, batch_size
+    )
+    return PruneResult("ledger_checkpoints", rows, time.perf_counter() - start, False)
+
+
+def run_retention(batch_size: int = BATCH_SIZE) -> list[PruneResult]:
+    results = [prune(policy, batch_size) for policy in retention_policies()]
+    results.append(prune_abandoned_carts(batch_size))
+    results.append(prune_old_epochs(batch_size))
+    results.append(prune_old_checkpoints(batch_size))
+    for result in results:
+        logger.info(
+            "Retention: %s %s %d rows in %.2fs",
+            "archived" if result.archived else "deleted",
+            result.table,
+            result.rows,
+            result.seconds,
+        )
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_retention()
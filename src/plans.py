@@ -0,0 +1,125 @@
+"""
+Vectorized scoring of candidate barrel plans.
+
+The wholesale catalog is turned into arrays (ml credited per barrel by
+color, price, quantity offered) and every candidate plan is a row of barrel
+quantities, so a whole batch of plans is scored with a few matrix products:
+ml after purchase, potions producible from it, and projected revenue from
+selling up to the expected demand, less the plan's cost.
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+COLORS = ("red", "green", "blue", "dark")
+ML_PER_BARREL = 1000  # as credited by /barrels/deliver
+ML_PER_POTION = 50
+
+MAX_CANDIDATES = 4096
+# Most barrels of one SKU considered in a single plan.
+MAX_PER_BARREL = 4
+
+
+def barrel_arrays(barrels: Sequence) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ml credited per barrel by color (n, 4), price (n,) and quantity offered (n,).
+    """
+    if not barrels:
+        empty = np.zeros(0, dtype=np.int64)
+        return np.zeros((0, len(COLORS)), dtype=np.int64), empty, empty
+    ml = np.floor(
+        ML_PER_BARREL * np.array([b.potion_type for b in barrels], dtype=np.float64)
+    ).astype(np.int64)
+    price = np.array([b.price for b in barrels], dtype=np.int64)
+    available = np.array([b.quantity for b in barrels], dtype=np.int64)
+    return ml, price, available
+
+
+def candidate_plans(
+    price: np.ndarray,
+    available: np.ndarray,
+    gold: int,
+    max_candidates: int = MAX_CANDIDATES,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Barrel quantities (k, n) to consider: every combination up to what is
+    offered and affordable per SKU, or a random sample of them (plus the empty
+    plan and each single SKU alone) when there are more than
+    ``max_candidates``.
+    """
+    affordable = np.where(price > 0, gold // np.maximum(price, 1), MAX_PER_BARREL)
+    caps = np.clip(np.minimum(available, affordable), 0, MAX_PER_BARREL)
+    n = len(caps)
+    if np.prod(caps + 1, dtype=np.float64) <= max_candidates:
+        return np.indices(tuple(caps + 1)).reshape(n, -1).T
+
+    rng = np.random.default_rng(seed)
+    sampled = rng.integers(0, caps + 1, size=(max_candidates - n - 1, n))
+    singles = np.diag(np.minimum(caps, 1))
+    return np.vstack([np.zeros((1, n), dtype=np.int64), singles, sampled])
+
+
+def score_plans(
+    candidates: np.ndarray,
+    barrel_ml: np.ndarray,
+    barrel_price: np.ndarray,
+    ml: np.ndarray,
+    potions: np.ndarray,
+    prices: np.ndarray,
+    demand: np.ndarray,
+    gold: int,
+    max_ml: int | None = None,
+) -> np.ndarray:
+    """
+    Projected gold of each candidate: revenue from selling stock plus what the
+    ml after purchase can bottle (single-color recipes), capped at demand,
+    minus cost. Plans that cost more than ``gold``, or that buy anything while
+    leaving more than ``max_ml`` ml in storage, score -inf.
+    """
+    cost = candidates @ barrel_price
+    ml_after = ml + candidates @ barrel_ml
+    producible = ml_after // ML_PER_POTION
+    sellable = np.minimum(potions + producible, demand)
+    score = (sellable @ prices - cost).astype(np.float64)
+    score[cost > gold] = -np.inf
+    if max_ml is not None:
+        score[(ml_after.sum(axis=1) > max_ml) & (cost > 0)] = -np.inf
+    return score
+
+
+def best_plan(
+    barrels: Sequence,
+    gold: int,
+    ml: Sequence[int],
+    potions: Sequence[int],
+    prices: Sequence[int],
+    demand: Sequence[int],
+    max_ml: int | None = None,
+) -> dict[str, int]:
+    """
+    The highest scoring plan as {sku: quantity}; ties go to the cheaper plan.
+    """
+    if not barrels:
+        return {}
+    barrel_ml, barrel_price, available = barrel_arrays(barrels)
+    candidates = candidate_plans(barrel_price, available, gold)
+    score = score_plans(
+        candidates,
+        barrel_ml,
+        barrel_price,
+        np.asarray(ml),
+        np.asarray(potions),
+        np.asarray(prices),
+        np.asarray(demand),
+        gold,
+        max_ml,
+    )
+    cost = candidates @ barrel_price
+    best = np.lexsort((cost, -score))[0]
+    plan: dict[str, int] = {}
+    for barrel, quantity in zip(barrels, candidates[best].tolist()):
+        if quantity > 0:
+            plan[barrel.sku] = plan.get(barrel.sku, 0) + quantity
+    return plan
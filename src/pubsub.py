@@ -0,0 +1,125 @@
+"""
+Cross-worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+Each worker runs one Listener thread on its own connection (outside the
+pool). Ledger writes notify ``ledger_changed`` from a trigger with the
+resources touched, or ``*`` on reset; code can also ``publish`` on any
+channel. Notifications are dispatched to the handlers registered with
+``subscribe``, which clear or update the worker's in-process caches.
+
+Caches that can't tolerate staleness should only be used while
+``is_listening()``: after a dropped connection the listener reconnects and
+calls every handler with ``None``, since notifications may have been missed.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from typing import Callable
+
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+LEDGER_CHANNEL = "ledger_changed"
+PRICES_CHANNEL = "catalog_prices"
+
+RECONNECT_DELAY_SECONDS = 1.0
+MAX_RECONNECT_DELAY_SECONDS = 30.0
+
+Handler = Callable[[str | None], None]
+_handlers: dict[str, list[Handler]] = defaultdict(list)
+
+
+def subscribe(channel: str, handler: Handler):
+    _handlers[channel].append(handler)
+
+
+def publish(connection, channel: str, payload: str = ""):
+    """
+    Sent when ``connection``'s transaction commits.
+    """
+    connection.execute(
+        sqlalchemy.text("SELECT pg_notify(:channel, :payload)"),
+        {"channel": channel, "payload": payload},
+    )
+
+
+def dispatch(channel: str, payload: str | None):
+    for handler in list(_handlers.get(channel, ())):
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("Handler for %s failed", channel)
+
+
+def changed_resources(payload: str | None) -> set[str] | None:
+    """
+    Resources named by a ledger notification; None means all of them.
+    """
+    if payload is None or payload == "*":
+        return None
+    return set(payload.split(","))
+
+
+class Listener(threading.Thread):
+    def __init__(self, conninfo: str, channels: list[str]):
+        super().__init__(name="pubsub-listener", daemon=True)
+        self.conninfo = conninfo
+        self.channels = channels
+        self.connected = threading.Event()
+        self._stopping = threading.Event()
+
+    def run(self):
+        import psycopg
+
+        delay = RECONNECT_DELAY_SECONDS
+        while not self._stopping.is_set():
+            try:
+                with psycopg.connect(self.conninfo, autocommit=True) as connection:
+                    for channel in self.channels:
+                        connection.execute(f'LISTEN "{channel}"')
+                    self.connected.set()
+                    delay = RECONNECT_DELAY_SECONDS
+                    for channel in self.channels:
+                        dispatch(channel, None)
+                    while not self._stopping.is_set():
+                        for notify in connection.notifies(timeout=1.0):
+                            dispatch(notify.channel, notify.payload)
+            except psycopg.Error:
+                logger.warning("Listener disconnected; retrying in %.0fs", delay)
+            finally:
+                self.connected.clear()
+            self._stopping.wait(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY_SECONDS)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopping.set()
+        self.join(timeout)
+
+
+_listener: Listener | None = None
+
+
+def start() -> Listener:
+    global _listener
+    if _listener is None:
+        from src import database as db
+
+        url = db.engine.url.set(drivername="postgresql")
+        _listener = Listener(
+            url.render_as_string(hide_password=False), [LEDGER_CHANNEL, PRICES_CHANNEL]
+        )
+        _listener.start()
+    return _listener
+
+
+def stop():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def is_listening() -> bool:
+    return _listener is not None and _listener.connected.is_set()
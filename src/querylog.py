@@ -0,0 +1,176 @@
+"""
+Slow-query log.
+
+Any statement issued through ``db.engine`` that takes longer than the
+configured threshold is logged together with its parameters and the endpoint
+that issued it. The query plan is captured out-of-band on a background thread
+(so the request that ran the slow query is not slowed down further) and stored
+in the ``slow_queries`` table.
+"""
+
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+import sqlalchemy
+from sqlalchemy import event
+
+from src.cache import MISSING, TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Set per request by the server middleware so slow queries can be attributed.
+current_endpoint: ContextVar[str | None] = ContextVar("current_endpoint", default=None)
+
+# Execution option marking connections used by the capture thread itself.
+CAPTURE_OPTION = "slow_query_capture"
+
+# Don't re-EXPLAIN the same statement more often than this.
+CAPTURE_COOLDOWN_SECONDS = 60.0
+# Distinct statements remembered for the cooldown; the least recently
+# captured are forgotten first.
+MAX_COOLDOWN_STATEMENTS = 1000
+MAX_PENDING_CAPTURES = 16
+
+READ_ONLY_PREFIXES = ("select", "with")
+WRITE_KEYWORDS = ("insert", "update", "delete", "merge")
+
+
+class EndpointMiddleware:
+    """
+    ASGI middleware recording the current request's method and path in
+    ``current_endpoint``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_endpoint.set(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
+
+
+def is_read_only(statement: str) -> bool:
+    """
+    True if running the statement under EXPLAIN ANALYZE has no side effects.
+    """
+    lowered = statement.lstrip().lower()
+    if not lowered.startswith(READ_ONLY_PREFIXES):
+        return False
+    return not any(keyword in lowered for keyword in WRITE_KEYWORDS)
+
+
+def explain_prefix(statement: str) -> str:
+    if is_read_only(statement):
+        return "EXPLAIN (ANALYZE, BUFFERS) "
+    # Data-modifying statements are only planned, never executed again.
+    return "EXPLAIN "
+
+
+class SlowQueryLog:
+    def __init__(self, engine: sqlalchemy.Engine, threshold_ms: float):
+        self.engine = engine
+        self.threshold_ms = threshold_ms
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="slow-query-capture"
+        )
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._recently_captured = TTLCache(
+            maxsize=MAX_COOLDOWN_STATEMENTS, ttl=CAPTURE_COOLDOWN_SECONDS
+        )
+
+    def install(self):
+        event.listen(self.engine, "before_cursor_execute", self._before_execute)
+        event.listen(self.engine, "after_cursor_execute", self._after_execute)
+
+    def remove(self):
+        event.remove(self.engine, "before_cursor_execute", self._before_execute)
+        event.remove(self.engine, "after_cursor_execute", self._after_execute)
+        self._executor.shutdown(wait=True)
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        context._query_start = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - context._query_start) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        if conn.get_execution_options().get(CAPTURE_OPTION):
+            return
+
+        endpoint = current_endpoint.get()
+        logger.warning(
+            "Slow query (%.1f ms) from %s: %s params=%r",
+            elapsed_ms,
+            endpoint or "<no endpoint>",
+            statement,
+            parameters,
+        )
+        # executemany batches can't be replayed as a single EXPLAIN.
+        if not executemany:
+            self._submit(statement, parameters, endpoint, elapsed_ms)
+
+    def _submit(self, statement, parameters, endpoint, elapsed_ms):
+        with self._lock:
+            if self._recently_captured.get(statement) is not MISSING:
+                return
+            if self._pending >= MAX_PENDING_CAPTURES:
+                return
+            self._recently_captured.put(statement, None)
+            self._pending += 1
+        self._executor.submit(
+            self._capture, statement, parameters, endpoint, elapsed_ms
+        )
+
+    def _capture(self, statement, parameters, endpoint, elapsed_ms):
+        try:
+            with self.engine.connect() as connection:
+                connection = connection.execution_options(**{CAPTURE_OPTION: True})
+
+                # Always roll back: EXPLAIN ANALYZE executes the statement.
+                with connection.begin() as transaction:
+                    plan_rows = connection.exec_driver_sql(
+                        explain_prefix(statement) + statement, parameters
+                    ).all()
+                    transaction.rollback()
+
+                with connection.begin():
+                    connection.execute(
+                        sqlalchemy.text("""
+                            INSERT INTO slow_queries
+                                (endpoint, statement, parameters, duration_ms, plan)
+                            VALUES
+                                (:endpoint, :statement, CAST(:parameters AS jsonb),
+                                 :duration_ms, :plan)
+                        """),
+                        {
+                            "endpoint": endpoint,
+                            "statement": statement,
+                            "parameters": json.dumps(parameters, default=str),
+                            "duration_ms": elapsed_ms,
+                            "plan": "\n".join(row[0] for row in plan_rows),
+                        },
+                    )
+        except Exception:
+            logger.exception("Failed to capture plan for slow query")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+def install(engine: sqlalchemy.Engine, threshold_ms: float) -> SlowQueryLog:
+    slow_query_log = SlowQueryLog(engine, threshold_ms)
+    slow_query_log.install()
+    return slow_query_log
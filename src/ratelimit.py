@@ -0,0 +1,234 @@
+"""
+In-process rate limiting and load shedding.
+
+Every request with a known API key draws a token from a bucket keyed by (API
+key, route) and from a bucket for the route as a whole; an empty bucket
+answers 429 right away. Requests without a valid key get no bucket at all:
+they are turned away with a 401 by the route's auth dependency, and must not
+be able to use up the shared route bucket meant for the game server.
+On top of that a global concurrency cap, and the time callers currently wait
+for a database connection, shed non-priority requests with 503 before they
+can queue up on Postgres. The catalog is priority, so it stays responsive
+while bulk deliveries are throttled.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from starlette.responses import JSONResponse
+
+from src import config
+from src.api import auth
+
+
+@dataclass(frozen=True)
+class Limit:
+    rate: float  # tokens per second
+    burst: int
+
+
+class TokenBucket:
+    def __init__(self, limit: Limit):
+        self.limit = limit
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(
+            self.limit.burst, self.tokens + (now - self.updated) * self.limit.rate
+        )
+        self.updated = now
+
+    def take(self, now: float | None = None) -> bool:
+        self.refill(time.monotonic() if now is None else now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self, tokens: int = 1) -> float:
+        return max(tokens - self.tokens, 0) / self.limit.rate
+
+
+# Longest matching path prefix wins. Limits apply per API key; the route as a
+# whole gets ROUTE_LIMIT_MULTIPLIER times as many tokens.
+ROUTE_LIMITS: dict[str, Limit] = {
+    "/catalog": Limit(rate=50, burst=100),
+    "/carts": Limit(rate=20, burst=40),
+    "/barrels/deliver": Limit(rate=2, burst=5),
+    "/bottler/deliver": Limit(rate=2, burst=5),
+    "/inventory/deliver": Limit(rate=2, burst=5),
+}
+ROUTE_LIMIT_MULTIPLIER = 4
+
+# The least recently used buckets are dropped past this many.
+MAX_BUCKETS = 10_000
+
+# Routes that are never shed when the database is under pressure.
+PRIORITY_PREFIXES = ("/catalog",)
+
+# Long-lived responses; rate limited when opened but not counted as in flight.
+STREAMING_PREFIXES = ("/stream",)
+
+
+def route_group(path: str) -> str:
+    matches = [prefix for prefix in ROUTE_LIMITS if path.startswith(prefix)]
+    if matches:
+        return max(matches, key=len)
+    return "/" + path.strip("/").split("/", 1)[0]
+
+
+def access_token(scope) -> str | None:
+    for name, value in scope["headers"]:
+        if name == b"access_token":
+            return value.decode("latin-1")
+    return None
+
+
+def verify_key(token: str) -> str | None:
+    return auth.get_key_store().verify(token)
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app,
+        default_limit: Limit,
+        max_concurrent: int,
+        pool_wait_threshold_ms: float,
+        pool_wait_ms=lambda: 0.0,
+        identify: Callable[[str], str | None] = verify_key,
+    ):
+        self.app = app
+        self.default_limit = default_limit
+        self.max_concurrent = max_concurrent
+        self.pool_wait_threshold_ms = pool_wait_threshold_ms
+        self.pool_wait_ms = pool_wait_ms
+        self.identify = identify
+        self.in_flight = 0
+        self.buckets: OrderedDict[tuple[str, str], TokenBucket] = OrderedDict()
+        # charge() is also called from /batch, in a worker thread.
+        self._lock = threading.Lock()
+
+    def limit_for(self, group: str) -> Limit:
+        return ROUTE_LIMITS.get(group, self.default_limit)
+
+    def bucket(self, client: str, group: str) -> TokenBucket:
+        bucket = self.buckets.get((client, group))
+        if bucket is not None:
+            self.buckets.move_to_end((client, group))
+        else:
+            while len(self.buckets) >= MAX_BUCKETS:
+                self.buckets.popitem(last=False)
+            limit = self.limit_for(group)
+            if client == "*":
+                limit = Limit(
+                    limit.rate * ROUTE_LIMIT_MULTIPLIER,
+                    limit.burst * ROUTE_LIMIT_MULTIPLIER,
+                )
+            bucket = self.buckets[(client, group)] = TokenBucket(limit)
+        return bucket
+
+    def client_id(self, scope) -> str | None:
+        """
+        The id of the caller's API key, or None if it has no valid one.
+        """
+        token = access_token(scope)
+        return self.identify(token) if token else None
+
+    def check(self, scope) -> JSONResponse | None:
+        path = scope["path"]
+        group = route_group(path)
+        priority = path.startswith(PRIORITY_PREFIXES)
+
+        if not priority:
+            if self.in_flight >= self.max_concurrent:
+                return shed("Server is at capacity.")
+            if self.pool_wait_ms() > self.pool_wait_threshold_ms:
+                return shed("Database is overloaded.")
+
+        client = self.client_id(scope)
+        if client is None:
+            return None  # answered with a 401 by the route
+
+        retry_after = self.charge(client, [group])
+        if retry_after is not None:
+            return JSONResponse(
+                {"detail": "Rate limit exceeded."},
+                status_code=429,
+                headers={"Retry-After": retry_after_header(retry_after)},
+            )
+        return None
+
+    def charge(self, client: str, groups: Iterable[str]) -> float | None:
+        """
+        Takes a token per route group from the client's and the route's
+        buckets, or, if any of them is short, none at all and returns the
+        seconds until it won't be. ``/batch`` charges each of its operations
+        to the route it stands for.
+        """
+        needed: Counter[tuple[str, str]] = Counter()
+        for group in groups:
+            needed[client, group] += 1
+            needed["*", group] += 1
+        with self._lock:
+            buckets = {key: self.bucket(*key) for key in needed}
+            now = time.monotonic()
+            for key, bucket in buckets.items():
+                bucket.refill(now)
+                if bucket.tokens < needed[key]:
+                    return bucket.retry_after(needed[key])
+            for key, bucket in buckets.items():
+                bucket.tokens -= needed[key]
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Lets /batch charge its operations (request.state.rate_limiter).
+        scope.setdefault("state", {})["rate_limiter"] = self
+        rejection = self.check(scope)
+        if rejection is not None:
+            await rejection(scope, receive, send)
+            return
+
+        if scope["path"].startswith(STREAMING_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+def from_settings(app, pool_wait_ms: Callable[[], float] = lambda: 0.0):
+    """
+    RateLimitMiddleware configured from the app settings. Passed to
+    ``add_middleware`` in place of the class so the settings are read when
+    Starlette builds the middleware stack at startup, not at import.
+    """
+    settings = config.get_settings()
+    return RateLimitMiddleware(
+        app,
+        default_limit=Limit(settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST),
+        max_concurrent=settings.MAX_CONCURRENT_REQUESTS,
+        pool_wait_threshold_ms=settings.POOL_WAIT_SHED_MS,
+        pool_wait_ms=pool_wait_ms,
+    )
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, round(seconds)))
+
+
+def shed(detail: str) -> JSONResponse:
+    return JSONResponse(
+        {"detail": detail}, status_code=503, headers={"Retry-After": "1"}
+    )
@@ -0,0 +1,305 @@
+"""
+Point-in-time ledger balances.
+
+Balances as of any ledger entry id, timestamp or game (day, hour) are rebuilt from
+the nearest earlier checkpoint plus the entries written since, summed in
+Postgres so only one row per resource comes back. ``replay`` additionally
+streams individual entries through a server-side cursor for tracing a tick
+entry by entry, in constant memory.
+
+    python -m src.replay (--entry-id N | --at ISO_TIMESTAMP | --day DAY --hour H)
+        [--trace FROM_ID]
+    python -m src.replay --checkpoint | --backfill
+"""
+
+import argparse
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator
+
+import sqlalchemy
+
+from src import database as db
+
+STREAM_BATCH_SIZE = 5000
+# Entries between checkpoints; bounds the rows summed per point-in-time query.
+CHECKPOINT_INTERVAL = 100_000
+
+
+@dataclass
+class Snapshot:
+    epoch: int | None
+    entry_id: int
+    balances: dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class ReplayStep:
+    entry_id: int
+    timestamp: datetime
+    resource: str
+    change: int
+    context: str | None
+    balance: int
+
+
+def resolve_entry_id(
+    connection,
+    entry_id: int | None = None,
+    at: datetime | None = None,
+    day: str | None = None,
+    hour: int | None = None,
+) -> int:
+    """
+    The id of the last ledger entry written at or before the given point. A
+    game (day, hour) means its most recent tick, as posted to /info/current_time.
+    """
+    if entry_id is not None:
+        return entry_id
+    if (day is None) != (hour is None):
+        raise ValueError("day and hour must be given together")
+    if day is not None:
+        at = connection.execute(
+            sqlalchemy.text("""
+                SELECT timestamp FROM game_ticks
+                WHERE day = :day AND hour = :hour
+                ORDER BY id DESC
+                LIMIT 1
+            """),
+            {"day": day, "hour": hour},
+        ).scalar_one_or_none()
+        if at is None:
+            raise ValueError(f"No tick recorded for {day} hour {hour}")
+    if at is None:
+        raise ValueError("One of entry_id, at or day and hour is required")
+    return connection.execute(
+        sqlalchemy.text("""
+            SELECT COALESCE(MAX(id), 0) FROM ledger_entries WHERE timestamp <= :at
+        """),
+        {"at": at},
+    ).scalar_one()
+
+
+def epoch_of(connection, entry_id: int) -> int | None:
+    return connection.execute(
+        sqlalchemy.text("SELECT epoch FROM ledger_entries WHERE id = :id"),
+        {"id": entry_id},
+    ).scalar_one_or_none()
+
+
+def last_entry(connection, entry_id: int, epoch: int | None = None):
+    """
+    The id and epoch of the last entry at or before ``entry_id`` (in
+    ``epoch``, if given), or None. Ids have gaps: rolled-back inserts never
+    show up, and retention deletes old epochs.
+    """
+    return connection.execute(
+        sqlalchemy.text("""
+            SELECT id, epoch FROM ledger_entries
+            WHERE id <= :id AND (CAST(:epoch AS integer) IS NULL OR epoch = :epoch)
+            ORDER BY id DESC
+            LIMIT 1
+        """),
+        {"id": entry_id, "epoch": epoch},
+    ).one_or_none()
+
+
+def latest_checkpoint(connection, epoch: int, entry_id: int) -> Snapshot:
+    row = connection.execute(
+        sqlalchemy.text("""
+            SELECT entry_id, balances
+            FROM ledger_checkpoints
+            WHERE epoch = :epoch AND entry_id <= :entry_id
+            ORDER BY entry_id DESC
+            LIMIT 1
+        """),
+        {"epoch": epoch, "entry_id": entry_id},
+    ).one_or_none()
+    if row is None:
+        return Snapshot(epoch, 0)
+    return Snapshot(epoch, row.entry_id, dict(row.balances))
+
+
+def balances_at(connection, entry_id: int, epoch: int | None = None) -> Snapshot:
+    """
+    Balances as of the last entry at or before ``entry_id``, in the epoch of
+    that entry unless ``epoch`` is given. The snapshot's ``entry_id`` is the
+    entry actually found.
+    """
+    found = last_entry(connection, entry_id, epoch)
+    if found is None:
+        return Snapshot(epoch, 0)
+    entry_id, found_epoch = found
+
+    snapshot = latest_checkpoint(connection, found_epoch, entry_id)
+    deltas = connection.execute(
+        sqlalchemy.text("""
+            SELECT resource, SUM(change) AS change
+            FROM ledger_entries
+            WHERE id > :from_id AND id <= :to_id AND epoch = :epoch
+            GROUP BY resource
+        """),
+        {"from_id": snapshot.entry_id, "to_id": entry_id, "epoch": found_epoch},
+    )
+    for resource, change in deltas:
+        snapshot.balances[resource] = snapshot.balances.get(resource, 0) + change
+    snapshot.entry_id = entry_id
+    return snapshot
+
+
+def replay(connection, from_id: int, to_id: int) -> Iterator[ReplayStep]:
+    """
+    Yields every entry in (from_id, to_id] of to_id's epoch with the running
+    balance of its resource, streamed from a server-side cursor. ``from_id``
+    needn't exist; ``to_id`` must.
+    """
+    epoch = epoch_of(connection, to_id)
+    if epoch is None:
+        raise ValueError(f"Unknown ledger entry {to_id}")
+    snapshot = (
+        balances_at(connection, from_id, epoch) if from_id else Snapshot(epoch, 0)
+    )
+
+    rows = connection.execute(
+        sqlalchemy.text("""
+            SELECT id, timestamp, resource, change, context
+            FROM ledger_entries
+            WHERE id > :from_id AND id <= :to_id AND epoch = :epoch
+            ORDER BY id
+        """),
+        {"from_id": from_id, "to_id": to_id, "epoch": epoch},
+        execution_options={"stream_results": True, "yield_per": STREAM_BATCH_SIZE},
+    )
+    balances = snapshot.balances
+    for row in rows:
+        balances[row.resource] = balances.get(row.resource, 0) + row.change
+        yield ReplayStep(
+            row.id,
+            row.timestamp,
+            row.resource,
+            row.change,
+            row.context,
+            balances[row.resource],
+        )
+
+
+def create_checkpoint(connection, entry_id: int | None = None) -> Snapshot:
+    """
+    Stores balances as of ``entry_id`` (default: the latest entry of the
+    current epoch), so later point-in-time queries only need to sum the
+    entries written after it.
+    """
+    if entry_id is None:
+        entry_id = connection.execute(
+            sqlalchemy.text("""
+                SELECT COALESCE(MAX(id), 0) FROM ledger_entries
+                WHERE epoch = current_ledger_epoch()
+            """)
+        ).scalar_one()
+    snapshot = balances_at(connection, entry_id)
+    if snapshot.epoch is not None:
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO ledger_checkpoints (epoch, entry_id, balances)
+                VALUES (:epoch, :entry_id, CAST(:balances AS jsonb))
+                ON CONFLICT (epoch, entry_id) DO NOTHING
+            """),
+            {
+                "epoch": snapshot.epoch,
+                "entry_id": snapshot.entry_id,
+                "balances": json.dumps(snapshot.balances),
+            },
+        )
+    return snapshot
+
+
+def backfill_checkpoints(connection, every: int = CHECKPOINT_INTERVAL) -> int:
+    """
+    Checkpoints the current epoch every ``every`` entries after its latest
+    checkpoint. Each step only sums the entries since the previous one.
+    """
+    start_id, end_id = connection.execute(
+        sqlalchemy.text("""
+            SELECT
+                COALESCE(
+                    (SELECT MAX(entry_id) FROM ledger_checkpoints
+                     WHERE epoch = current_ledger_epoch()),
+                    (SELECT MIN(id) - 1 FROM ledger_entries
+                     WHERE epoch = current_ledger_epoch()),
+                    0
+                ),
+                COALESCE(
+                    (SELECT MAX(id) FROM ledger_entries
+                     WHERE epoch = current_ledger_epoch()),
+                    0
+                )
+        """)
+    ).one()
+    created = 0
+    for entry_id in range(start_id + every, end_id + 1, every):
+        # Ids may have gaps; checkpoint the last entry at or before the step.
+        last_id = connection.execute(
+            sqlalchemy.text("""
+                SELECT MAX(id) FROM ledger_entries
+                WHERE id <= :entry_id AND epoch = current_ledger_epoch()
+            """),
+            {"entry_id": entry_id},
+        ).scalar_one()
+        create_checkpoint(connection, last_id)
+        created += 1
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--entry-id", type=int)
+    target.add_argument("--at", type=datetime.fromisoformat)
+    target.add_argument("--day", help="game day of the tick; needs --hour")
+    target.add_argument("--checkpoint", action="store_true")
+    target.add_argument(
+        "--backfill",
+        action="store_true",
+        help=f"checkpoint the current epoch every {CHECKPOINT_INTERVAL} entries",
+    )
+    parser.add_argument("--hour", type=int, help="game hour of the --day tick")
+    parser.add_argument(
+        "--trace",
+        type=int,
+        metavar="FROM_ID",
+        help="also print every entry after FROM_ID with running balances",
+    )
+    args = parser.parse_args()
+
+    with db.engine.begin() as connection:
+        if args.checkpoint:
+            snapshot = create_checkpoint(connection)
+            print(f"Checkpoint at entry {snapshot.entry_id} (epoch {snapshot.epoch})")
+            return
+        if args.backfill:
+            print(f"Created {backfill_checkpoints(connection)} checkpoints")
+            return
+
+        try:
+            entry_id = resolve_entry_id(
+                connection, args.entry_id, args.at, args.day, args.hour
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        if args.trace is not None:
+            for step in replay(connection, args.trace, entry_id):
+                print(
+                    f"{step.entry_id:>10} {step.timestamp:%Y-%m-%d %H:%M:%S} "
+                    f"{step.resource:<16} {step.change:>+8} -> {step.balance:>8} "
+                    f"{step.context or ''}"
+                )
+
+        snapshot = balances_at(connection, entry_id)
+        print(f"Balances as of entry {snapshot.entry_id} (epoch {snapshot.epoch}):")
+        for resource, balance in sorted(snapshot.balances.items()):
+            print(f"  {resource:<16} {balance:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+In-process scheduler for periodic maintenance and precomputation jobs.
+
+Every worker runs a Scheduler on its event loop (started from the app's
+lifespan). Each job runs every ``interval`` seconds, give or take ``jitter``
+of it so workers and jobs drift apart, in a thread so it never blocks
+requests. Jobs that must only run once per deployment (retention,
+checkpoints) are ``leader_only``: a worker runs them only while it holds a
+Postgres session-level advisory lock, which exactly one worker can hold and
+which is released if that worker dies. Per-process jobs such as cache
+warming run everywhere.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Protocol
+
+import sqlalchemy
+
+from src import database as db
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary, but shared by every worker of the app.
+LEADER_LOCK_KEY = 0x63617564
+
+TRY_LOCK_SQL = sqlalchemy.text("SELECT pg_try_advisory_lock(:key)")
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], object]
+    interval: float
+    jitter: float = 0.1
+    leader_only: bool = True
+
+
+@dataclass
+class JobStats:
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    total_seconds: float = 0.0
+    last_seconds: float | None = None
+    last_finished: float | None = None
+    last_error: str | None = None
+    running: bool = False
+
+
+class Leader(Protocol):
+    def acquire(self) -> bool: ...
+
+    def release(self) -> None: ...
+
+
+class LeaderLock:
+    """
+    Holds the advisory lock on a dedicated connection. ``acquire`` is cheap
+    once held: it only checks the connection is still alive.
+    """
+
+    def __init__(self, key: int = LEADER_LOCK_KEY):
+        self.key = key
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            try:
+                if self._connection is not None:
+                    self._connection.exec_driver_sql("SELECT 1")
+                    return True
+                engine = db.engine
+                if engine.dialect.name != "postgresql":
+                    return True  # SQLite: a single process, always the leader
+                connection = engine.connect().execution_options(
+                    isolation_level="AUTOCOMMIT"
+                )
+                if connection.execute(TRY_LOCK_SQL, {"key": self.key}).scalar_one():
+                    self._connection = connection
+                    logger.info("This worker is now the scheduler leader")
+                    return True
+                connection.close()  # not holding anything, so fine to pool
+                return False
+            except sqlalchemy.exc.SQLAlchemyError:
+                logger.warning("Lost the scheduler leader lock", exc_info=True)
+                self._discard()
+                return False
+
+    def release(self):
+        with self._lock:
+            self._discard()
+
+    def _discard(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            # Invalidate rather than close: a pooled connection would keep
+            # its session, and the lock with it.
+            try:
+                connection.invalidate()
+                connection.close()
+            except sqlalchemy.exc.SQLAlchemyError:
+                pass
+
+
+class Scheduler:
+    def __init__(self, leader: Leader | None = None):
+        self.leader: Leader = leader or LeaderLock()
+        self.jobs: dict[str, Job] = {}
+        self.stats: dict[str, JobStats] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def add(self, job: Job):
+        self.jobs[job.name] = job
+        self.stats[job.name] = JobStats()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._loop(job), name=f"job:{job.name}")
+                for job in self.jobs.values()
+            ]
+
+    async def stop(self):
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.to_thread(self.leader.release)
+
+    def delay(self, job: Job) -> float:
+        return job.interval * (1 + random.uniform(-job.jitter, job.jitter))
+
+    async def _loop(self, job: Job):
+        # Spread the first runs out instead of running everything at startup.
+        await asyncio.sleep(random.uniform(0, job.jitter * job.interval))
+        while True:
+            await self.run(job)
+            await asyncio.sleep(self.delay(job))
+
+    async def run(self, job: Job):
+        stats = self.stats[job.name]
+        if job.leader_only and not await asyncio.to_thread(self.leader.acquire):
+            stats.skipped += 1
+            return
+        stats.running = True
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(job.func)
+        except Exception as e:
+            stats.failures += 1
+            stats.last_error = repr(e)
+            logger.exception("Scheduled job %s failed", job.name)
+        finally:
+            stats.running = False
+            stats.runs += 1
+            stats.last_seconds = time.perf_counter() - start
+            stats.total_seconds += stats.last_seconds
+            stats.last_finished = time.time()
+
+    def snapshot(self) -> dict[str, dict]:
+        return {
+            name: {
+                "interval": job.interval,
+                "leader_only": job.leader_only,
+                **vars(self.stats[name]),
+            }
+            for name, job in self.jobs.items()
+        }
+
+
+scheduler = Scheduler()
@@ -0,0 +1,165 @@
+"""
+SQLite backend for tests and benchmarks, so they can run without a Postgres.
+
+Set POSTGRES_URI (or DATABASE_URL) to ``sqlite://`` for a private in-memory
+database, or ``sqlite:///cauldron.db`` for a file; the schema below is created
+on first connect. Queries that need Postgres-only syntax have a ``"sqlite"``
+variant picked with ``db.variant``.
+
+The ledger, carts, catalog, planners and deliveries work on SQLite. LISTEN/
+NOTIFY cache invalidation, the slow-query log, retention, replay and export
+remain Postgres-only. An in-memory database is one connection shared by
+every thread, so use a file for anything concurrent.
+"""
+
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import StaticPool
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ledger_epochs (
+    id INTEGER PRIMARY KEY,
+    started_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO ledger_epochs (id) SELECT 1 WHERE NOT EXISTS (SELECT 1 FROM ledger_epochs);
+
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    id INTEGER PRIMARY KEY,
+    resource TEXT NOT NULL,
+    change INTEGER NOT NULL,
+    context TEXT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    epoch INTEGER
+);
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_epoch_resource ON ledger_entries (epoch, resource);
+CREATE INDEX IF NOT EXISTS ix_ledger_entries_timestamp ON ledger_entries (timestamp);
+
+-- Stands in for the current_ledger_epoch() column default.
+CREATE TRIGGER IF NOT EXISTS ledger_entries_epoch AFTER INSERT ON ledger_entries
+WHEN NEW.epoch IS NULL
+BEGIN
+    UPDATE ledger_entries SET epoch = (SELECT max(id) FROM ledger_epochs)
+    WHERE id = NEW.id;
+END;
+
+CREATE VIEW IF NOT EXISTS current_ledger_entries AS
+SELECT * FROM ledger_entries WHERE epoch = (SELECT max(id) FROM ledger_epochs);
+
+CREATE TABLE IF NOT EXISTS executed_orders (
+    order_id TEXT PRIMARY KEY,
+    response TEXT,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS carts (
+    cart_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    customer_name TEXT,
+    payment TEXT,
+    character_class TEXT,
+    level INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS cart_items (
+    id INTEGER PRIMARY KEY,
+    cart_id INTEGER NOT NULL REFERENCES carts (cart_id),
+    item_sku TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    unit_price INTEGER NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (cart_id, item_sku)
+);
+
+CREATE TABLE IF NOT EXISTS customer_visits (
+    id INTEGER PRIMARY KEY,
+    visit_id INTEGER NOT NULL,
+    customer_id TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    character_class TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (visit_id, customer_id)
+);
+
+CREATE TABLE IF NOT EXISTS checkout_logs (
+    id INTEGER PRIMARY KEY,
+    total_potions INTEGER,
+    total_gold INTEGER,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS bottling_logs (
+    id INTEGER PRIMARY KEY,
+    potion_type TEXT,
+    quantity INTEGER,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS catalog_snapshots (
+    id INTEGER PRIMARY KEY,
+    red_available BOOLEAN,
+    green_available BOOLEAN,
+    blue_available BOOLEAN,
+    dark_available BOOLEAN,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS game_ticks (
+    id INTEGER PRIMARY KEY,
+    day TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+
+def now() -> str:
+    # Same text format as CURRENT_TIMESTAMP, so timestamps compare as strings.
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _on_connect(dbapi_connection, connection_record):
+    # Let SQLAlchemy's "begin" event below issue BEGIN rather than pysqlite.
+    dbapi_connection.isolation_level = None
+    dbapi_connection.create_function("now", 0, now)
+    dbapi_connection.execute("PRAGMA foreign_keys = ON")
+    dbapi_connection.execute("PRAGMA busy_timeout = 5000")
+    dbapi_connection.execute("PRAGMA journal_mode = WAL")
+    dbapi_connection.executescript(SCHEMA)
+
+
+def _on_begin(connection):
+    # Take the write lock up front: checkout reads stock and then writes, and
+    # a deferred transaction could fail to upgrade its lock half way through.
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def _lists_as_json(conn, cursor, statement, parameters, context, executemany):
+    # bottling_logs.potion_type is an int[] on Postgres; store it as JSON here.
+    # Done per engine rather than with sqlite3.register_adapter, which would
+    # change how lists bind for every sqlite3 connection in the process.
+    def convert(row):
+        return tuple(
+            json.dumps(value) if isinstance(value, list) else value for value in row
+        )
+
+    if executemany:
+        return statement, [convert(row) for row in parameters]
+    return statement, convert(parameters)
+
+
+def create_sqlite_engine(uri: str):
+    url = make_url(uri)
+    in_memory = url.database in (None, "", ":memory:")
+    engine = create_engine(
+        url,
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool if in_memory else None,
+    )
+    event.listen(engine, "connect", _on_connect)
+    event.listen(engine, "begin", _on_begin)
+    event.listen(engine, "before_cursor_execute", _lists_as_json, retval=True)
+    return engine
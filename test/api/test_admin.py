@@ -0,0 +1,51 @@
+import uuid
+
+import sqlalchemy
+
+from src import ledger
+from src.api import admin, carts, catalog
+from src.cache import completed_orders
+
+
+def count(connection, sql: str) -> int:
+    return connection.execute(sqlalchemy.text(sql)).scalar_one()
+
+
+def test_reset_starts_a_new_epoch(postgres_engine, monkeypatch):
+    with postgres_engine.begin() as connection:
+        for resource, change in (("gold", 500), ("red_potions", 7)):
+            connection.execute(
+                ledger.INSERT_ENTRY_SQL,
+                {"resource": resource, "change": change, "context": "test"},
+            )
+    cart_id = carts.create_cart()["cart_id"]
+    carts.add_cart_items(cart_id, [carts.CartItem(sku="RED_POTION_0", quantity=1)])
+    order_id = uuid.uuid4()
+    completed_orders.put(order_id, None)
+    monkeypatch.setitem(catalog.CURRENT_PRICES, "RED_POTION_0", 5)
+
+    admin.reset()
+
+    with postgres_engine.begin() as connection:
+        assert ledger.balances(connection) == {"gold": 100}
+        # The old epoch's entries stay, just out of the current view.
+        assert count(connection, "SELECT count(*) FROM ledger_entries") == 3
+        assert count(connection, "SELECT count(*) FROM current_ledger_entries") == 1
+        assert count(connection, "SELECT count(*) FROM carts") == 0
+        assert count(connection, "SELECT count(*) FROM cart_items") == 0
+    assert completed_orders.get(order_id, None) is None
+    assert (
+        catalog.CURRENT_PRICES["RED_POTION_0"]
+        == (catalog.POTION_DEFINITIONS["RED_POTION_0"]["base_price"])
+    )
+
+
+def test_only_epoch_notifications_forget_the_game(monkeypatch):
+    order_id = uuid.uuid4()
+    completed_orders.put(order_id, {"total_potions_bought": 1})
+    admin.on_ledger_change(None)
+    admin.on_ledger_change("gold,red_potions")
+    assert completed_orders.get(order_id) == {"total_potions_bought": 1}
+
+    admin.on_ledger_change("*")
+    assert completed_orders.get(order_id, None) is None
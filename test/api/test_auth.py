@@ -0,0 +1,81 @@
+import asyncio
+import os
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.api import auth
+
+
+def make_request() -> Request:
+    return Request({"type": "http", "headers": [], "state": {}})
+
+
+def test_parse_key_lines():
+    keys = auth.parse_key_lines(
+        ["# rotated weekly", "", f"ops:{auth.hash_key('a')}", auth.hash_key("b")]
+    )
+    assert [key.key_id for key in keys] == ["ops", auth.hash_key("b")[:8]]
+
+
+def test_verify_matches_any_key():
+    store = auth.KeyStore(
+        auth.parse_key_lines(
+            [f"old:{auth.hash_key('one')}", f"new:{auth.hash_key('two')}"]
+        )
+    )
+    assert store.verify("one") == "old"
+    assert store.verify("two") == "new"
+    assert store.verify("three") is None
+
+
+def test_key_file_rotation(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "RELOAD_INTERVAL_SECONDS", 0.0)
+    key_file = tmp_path / "keys"
+    key_file.write_text(f"tick:{auth.hash_key('first')}\n")
+    store = auth.KeyStore([], str(key_file))
+    assert store.verify("first") == "tick"
+
+    key_file.write_text(f"tick:{auth.hash_key('second')}\n")
+    stat = key_file.stat()
+    os.utime(key_file, (stat.st_atime, stat.st_mtime + 5))
+    assert store.verify("first") is None
+    assert store.verify("second") == "tick"
+
+
+def test_get_api_key_counts_requests(monkeypatch):
+    store = auth.KeyStore(auth.parse_key_lines([f"game:{auth.hash_key('secret')}"]))
+    monkeypatch.setattr(auth, "_key_store", store)
+    monkeypatch.setattr(auth, "request_counter", auth.RequestCounter())
+
+    request = make_request()
+    asyncio.run(auth.get_api_key(request, "secret"))
+    asyncio.run(auth.get_api_key(make_request(), "secret"))
+
+    assert request.state.api_key_id == "game"
+    assert auth.request_counter.snapshot()["game"]["requests"] == 2
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.get_api_key(make_request(), "wrong"))
+
+
+def test_malformed_key_lines_are_skipped():
+    previous = auth.parse_key_lines([f"ops:{auth.hash_key('old')}"])
+    keys = auth.parse_key_lines(
+        [f"ops:{auth.hash_key('new')[:20]}", "nothex", f"game:{auth.hash_key('a')}"],
+        previous,
+    )
+    assert keys == [previous[0], auth.parse_key_line(f"game:{auth.hash_key('a')}")]
+
+
+def test_half_written_key_file_keeps_serving(tmp_path, monkeypatch):
+    monkeypatch.setattr(auth, "RELOAD_INTERVAL_SECONDS", 0.0)
+    key_file = tmp_path / "keys"
+    key_file.write_text(f"tick:{auth.hash_key('first')}\n")
+    store = auth.KeyStore([], str(key_file))
+
+    key_file.write_text(f"tick:{auth.hash_key('second')[:10]}")
+    stat = key_file.stat()
+    os.utime(key_file, (stat.st_atime, stat.st_mtime + 5))
+    assert store.verify("first") == "tick"
+    assert store.verify("second") is None
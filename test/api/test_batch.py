@@ -0,0 +1,100 @@
+from typing import Callable
+
+import pytest
+from fastapi import HTTPException
+from pydantic import TypeAdapter
+from starlette.requests import Request
+
+from src import ratelimit
+from src.api import batch, bottler
+
+operations = TypeAdapter(list[batch.Operation])
+
+
+def test_plans_see_deliveries_made_earlier_in_the_batch(monkeypatch):
+    monkeypatch.setattr(
+        bottler,
+        "apply_bottling",
+        lambda connection, potions, balances=None: (
+            {"red_ml": -100, "red_potions": 2},
+            [],
+            potions,
+        ),
+    )
+    balances = {"red_ml": 250}
+    after_commit: list[Callable[[], None]] = []
+    results = [
+        batch.run_operation(None, balances, operation, after_commit)
+        for operation in operations.validate_python(
+            [
+                {"op": "bottler/plan"},
+                {
+                    "op": "bottler/deliver",
+                    "potions": [{"potion_type": [100, 0, 0, 0], "quantity": 2}],
+                },
+                {"op": "bottler/plan"},
+            ]
+        )
+    ]
+
+    assert results[0][0]["quantity"] == 5
+    assert results[1] is None
+    assert results[2][0]["quantity"] == 3
+    assert balances == {"red_ml": 150, "red_potions": 2}
+    assert len(after_commit) == 1
+
+
+def test_barrel_plan_uses_balances():
+    [operation] = operations.validate_python(
+        [
+            {
+                "op": "barrels/plan",
+                "catalog": [
+                    {
+                        "sku": "SMALL_RED_BARREL",
+                        "potion_type": [1, 0, 0, 0],
+                        "price": 100,
+                        "quantity": 10,
+                    }
+                ],
+            }
+        ]
+    )
+    assert batch.run_operation(None, {"gold": 50}, operation, []) == []
+    assert batch.run_operation(None, {"gold": 100}, operation, []) == [
+        {"sku": "SMALL_RED_BARREL", "quantity": 1}
+    ]
+
+
+def test_bottle_plan_respects_potion_capacity():
+    [operation] = operations.validate_python([{"op": "bottler/plan"}])
+    balances = {"red_ml": 1000, "blue_potions": 48}
+    assert batch.run_operation(None, balances, operation, [])[0]["quantity"] == 2
+    balances["potion_capacity"] = 1
+    assert batch.run_operation(None, balances, operation, [])[0]["quantity"] == 20
+
+
+def test_operations_count_against_their_routes_rate_limits():
+    limiter = ratelimit.RateLimitMiddleware(
+        None,
+        ratelimit.Limit(rate=10, burst=20),
+        max_concurrent=64,
+        pool_wait_threshold_ms=250,
+    )
+    request = Request(
+        {
+            "type": "http",
+            "headers": [],
+            "state": {"rate_limiter": limiter, "api_key_id": "game"},
+        }
+    )
+    deliver = {"op": "bottler/deliver", "potions": []}
+
+    batch.charge_rate_limits(request, operations.validate_python([deliver] * 5))
+    with pytest.raises(HTTPException) as rejected:
+        batch.charge_rate_limits(
+            request, operations.validate_python([{"op": "bottler/plan"}, deliver])
+        )
+    assert rejected.value.status_code == 429
+    # Rejected whole: the plan in the rejected batch took no token either.
+    assert limiter.bucket("game", "/bottler").tokens == 20
@@ -0,0 +1,124 @@
+import uuid
+
+import sqlalchemy
+
+from src import ledger
+from src.api import carts, catalog
+
+
+def stock(connection, **balances):
+    for resource, change in balances.items():
+        connection.execute(
+            ledger.INSERT_ENTRY_SQL,
+            {"resource": resource, "change": change, "context": "test"},
+        )
+
+
+def cart_with(*items: tuple[str, int]) -> int:
+    cart_id = carts.create_cart()["cart_id"]
+    carts.add_cart_items(
+        cart_id, [carts.CartItem(sku=sku, quantity=quantity) for sku, quantity in items]
+    )
+    return cart_id
+
+
+def checkout(engine, cart_id: int, order_id: uuid.UUID):
+    with engine.begin() as connection:
+        return carts.execute_checkout(connection, cart_id, order_id)
+
+
+def balances(engine) -> dict[str, int]:
+    with engine.begin() as connection:
+        return ledger.balances(connection)
+
+
+def test_checkout_debits_stock_and_credits_gold(engine):
+    with engine.begin() as connection:
+        stock(connection, red_potions=5, green_potions=1)
+    cart_id = cart_with(("RED_POTION_0", 2), ("GREEN_POTION_0", 1))
+    price = catalog.CURRENT_PRICES["RED_POTION_0"]
+    green_price = catalog.CURRENT_PRICES["GREEN_POTION_0"]
+
+    row = checkout(engine, cart_id, uuid.uuid4())
+
+    assert (row.status, row.total_potions) == ("ok", 3)
+    assert row.total_gold == 2 * price + green_price
+    assert balances(engine) == {
+        "red_potions": 3,
+        "green_potions": 0,
+        "gold": 2 * price + green_price,
+    }
+    with engine.begin() as connection:
+        assert (
+            connection.execute(
+                sqlalchemy.text("SELECT count(*) FROM carts WHERE cart_id = :cart_id"),
+                {"cart_id": cart_id},
+            ).scalar_one()
+            == 0
+        )
+
+
+def test_duplicate_order_returns_the_first_response(engine):
+    with engine.begin() as connection:
+        stock(connection, red_potions=5)
+    cart_id = cart_with(("RED_POTION_0", 2))
+    order_id = uuid.uuid4()
+    first = checkout(engine, cart_id, order_id)
+
+    row = checkout(engine, cart_id, order_id)
+
+    assert row.status == "duplicate"
+    assert row.response == {
+        "total_potions_bought": 2,
+        "total_gold_paid": first.total_gold,
+    }
+    assert balances(engine)["red_potions"] == 3
+
+
+def test_empty_or_missing_cart(engine):
+    cart_id = carts.create_cart()["cart_id"]
+    assert checkout(engine, cart_id, uuid.uuid4()).status == "empty"
+    assert checkout(engine, 12345, uuid.uuid4()).status == "empty"
+
+
+def test_rejected_checkouts_write_nothing(engine):
+    with engine.begin() as connection:
+        stock(connection, red_potions=1)
+    short = cart_with(("RED_POTION_0", 2))
+    unknown = cart_with(("RED_POTION_0", 1))
+    with engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO cart_items (cart_id, item_sku, quantity, unit_price)
+                VALUES (:cart_id, 'RETIRED_POTION', 1, 10)
+            """),
+            {"cart_id": unknown},
+        )
+
+    assert checkout(engine, short, uuid.uuid4()).status == "insufficient_stock"
+    assert checkout(engine, unknown, uuid.uuid4()).status == "invalid_sku"
+    assert balances(engine) == {"red_potions": 1}
+    with engine.begin() as connection:
+        assert (
+            connection.execute(
+                sqlalchemy.text("SELECT count(*) FROM executed_orders")
+            ).scalar_one()
+            == 0
+        )
+
+
+def test_add_items_sums_quantities_and_restamps_price(engine, monkeypatch):
+    monkeypatch.setitem(catalog.CURRENT_PRICES, "RED_POTION_0", 40)
+    cart_id = cart_with(("RED_POTION_0", 1), ("RED_POTION_0", 2))
+    monkeypatch.setitem(catalog.CURRENT_PRICES, "RED_POTION_0", 55)
+    carts.add_cart_items(cart_id, [carts.CartItem(sku="RED_POTION_0", quantity=1)])
+
+    with engine.begin() as connection:
+        rows = connection.execute(
+            sqlalchemy.text("""
+                SELECT item_sku, quantity, unit_price FROM cart_items
+                WHERE cart_id = :cart_id
+            """),
+            {"cart_id": cart_id},
+        ).all()
+    assert [tuple(row) for row in rows] == [("RED_POTION_0", 4, 55)]
@@ -0,0 +1,64 @@
+import uuid
+
+from src import ledger
+from src.api import inventory
+from src.api.inventory import Capacity, capacity_from_balances, create_capacity_plan
+
+
+def test_capacity_counts_the_starting_unit():
+    assert capacity_from_balances({}) == Capacity(potions=50, ml=10000)
+    assert capacity_from_balances({"potion_capacity": 2, "ml_capacity": 1}) == Capacity(
+        potions=150, ml=20000
+    )
+
+
+def test_capacity_plan_buys_ahead_of_demand():
+    capacity = Capacity(potions=50, ml=10000)
+    assert create_capacity_plan(
+        gold=5000, ml=1000, capacity=capacity, forecast_sales=10
+    ).model_dump() == {"potion_capacity": 0, "ml_capacity": 0}
+    assert create_capacity_plan(
+        gold=5000, ml=9000, capacity=capacity, forecast_sales=45
+    ).model_dump() == {"potion_capacity": 1, "ml_capacity": 1}
+
+
+def test_capacity_plan_keeps_a_gold_reserve():
+    plan = create_capacity_plan(
+        gold=inventory.CAPACITY_UNIT_PRICE + inventory.CAPACITY_GOLD_RESERVE,
+        ml=9000,
+        capacity=Capacity(potions=50, ml=10000),
+        forecast_sales=45,
+    )
+    assert plan.model_dump() == {"potion_capacity": 1, "ml_capacity": 0}
+
+
+def test_audit_totals_match_the_breakdown():
+    balances = {
+        "gold": 40,
+        "red_potions": 3,
+        "dark_potions": 2,
+        "blue_ml": 500,
+        "ml_capacity": 1,
+    }
+    audit = inventory.InventoryAudit(**inventory.audit_from_balances(balances))
+    assert (audit.number_of_potions, audit.ml_in_barrels, audit.gold) == (5, 500, 40)
+    assert audit.resources == balances
+
+
+def test_every_capacity_unit_is_charged(postgres_engine):
+    with postgres_engine.begin() as connection:
+        connection.execute(
+            ledger.INSERT_ENTRY_SQL,
+            {"resource": "gold", "change": 2500, "context": "test"},
+        )
+
+    inventory.deliver_capacity_plan(
+        inventory.CapacityPlan(potion_capacity=1, ml_capacity=1), uuid.uuid4()
+    )
+
+    with postgres_engine.begin() as connection:
+        assert ledger.balances(connection) == {
+            "gold": 500,
+            "potion_capacity": 1,
+            "ml_capacity": 1,
+        }
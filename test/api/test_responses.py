@@ -0,0 +1,13 @@
+import json
+
+from src.api.responses import FastJSONResponse
+
+
+def test_fast_json_response_renders_compact_json():
+    response = FastJSONResponse(
+        [{"sku": "RED_POTION_0", "potion_type": [100, 0, 0, 0]}]
+    )
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == [
+        {"sku": "RED_POTION_0", "potion_type": [100, 0, 0, 0]}
+    ]
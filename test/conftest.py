@@ -0,0 +1,67 @@
+"""
+Fixtures for tests that run the production SQL against a real Postgres, the
+SQLite backend, or (``engine``) both, so the two can't drift apart.
+
+Point TEST_POSTGRES_URI at a throwaway database with the app's schema to run
+the Postgres ones; every table they use is truncated first, so never point
+it at real data. Without it they are skipped.
+"""
+
+import os
+
+import pytest
+import sqlalchemy
+
+from src import analytics, database as db, sqlite_backend
+
+# Truncated before each test; ledger_epochs is kept so there is a current epoch.
+TABLES = (
+    "cart_items",
+    "carts",
+    "executed_orders",
+    "ledger_entries",
+    "checkout_logs",
+    "checkout_logs_archive",
+    "bottling_logs",
+    "bottling_logs_archive",
+    "customer_visits",
+    "ledger_checkpoints",
+    "game_ticks",
+)
+
+
+@pytest.fixture(scope="session")
+def postgres():
+    uri = os.getenv("TEST_POSTGRES_URI")
+    if not uri:
+        pytest.skip("TEST_POSTGRES_URI is not set")
+    engine = db.create_app_engine(uri)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_engine(postgres, monkeypatch):
+    with postgres.begin() as connection:
+        connection.execute(
+            sqlalchemy.text(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        )
+    monkeypatch.setattr(db, "engine", postgres, raising=False)
+    monkeypatch.setattr(db, "replica_monitor", None, raising=False)
+    monkeypatch.setattr(analytics, "record", lambda table, **row: True)
+    return postgres
+
+
+@pytest.fixture
+def sqlite_engine(monkeypatch):
+    engine = sqlite_backend.create_sqlite_engine("sqlite://")
+    monkeypatch.setattr(db, "engine", engine, raising=False)
+    monkeypatch.setattr(db, "replica_monitor", None, raising=False)
+    monkeypatch.setattr(analytics, "record", lambda table, **row: True)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def engine(request):
+    return request.getfixturevalue(f"{request.param}_engine")
@@ -0,0 +1,118 @@
+import threading
+import time
+
+from src import analytics
+
+
+class Connection:
+    def __init__(self, executed):
+        self.executed = executed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, statement, params):
+        self.executed.append((str(statement), params))
+
+
+class Engine:
+    def __init__(self):
+        self.executed = []
+
+    def begin(self):
+        return Connection(self.executed)
+
+
+def test_insert_sql_has_one_values_tuple_per_row():
+    sql = str(analytics.insert_sql("checkout_logs", ["total_gold", "timestamp"], 2))
+    assert sql == (
+        "INSERT INTO checkout_logs (total_gold, timestamp) "
+        "VALUES (:total_gold_0, :timestamp_0), (:total_gold_1, :timestamp_1)"
+    )
+
+
+def test_rows_are_batched_per_table_and_flushed_on_stop(monkeypatch):
+    engine = Engine()
+    monkeypatch.setattr(analytics.db, "engine", engine, raising=False)
+    buffer = analytics.WriteBehindBuffer(
+        flush_interval=60, max_batch=100, max_pending=10
+    )
+
+    buffer.record("checkout_logs", {"total_gold": 50})
+    buffer.record("checkout_logs", {"total_gold": 60})
+    buffer.record("catalog_snapshots", {"red_available": True})
+    buffer.stop()
+
+    assert [sql.split(" VALUES")[0] for sql, _ in engine.executed] == [
+        "INSERT INTO checkout_logs (timestamp, total_gold)",
+        "INSERT INTO catalog_snapshots (timestamp, red_available)",
+    ]
+    assert engine.executed[0][1]["total_gold_1"] == 60
+
+
+def test_full_queue_drops_rows(monkeypatch):
+    monkeypatch.setattr(analytics, "BACKPRESSURE_TIMEOUT_SECONDS", 0)
+    buffer = analytics.WriteBehindBuffer(
+        flush_interval=60, max_batch=100, max_pending=1
+    )
+    monkeypatch.setattr(buffer, "_ensure_started", lambda: None)
+
+    assert buffer.record("checkout_logs", {"total_gold": 50})
+    assert not buffer.record("checkout_logs", {"total_gold": 60})
+    assert buffer.dropped == 1
+
+
+class FailingEngine(Engine):
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    def begin(self):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is down")
+        return super().begin()
+
+
+def test_stop_retries_a_failed_batch(monkeypatch):
+    engine = FailingEngine(failures=1)
+    monkeypatch.setattr(analytics.db, "engine", engine, raising=False)
+    buffer = analytics.WriteBehindBuffer(
+        flush_interval=60, max_batch=100, max_pending=10
+    )
+
+    buffer.record("checkout_logs", {"total_gold": 50})
+    buffer.stop()
+
+    assert len(engine.executed) == 1
+
+
+def test_stop_does_not_block_on_a_full_queue(monkeypatch):
+    release = threading.Event()
+
+    class HangingEngine(Engine):
+        def begin(self):
+            release.wait()
+            return super().begin()
+
+    engine = HangingEngine()
+    monkeypatch.setattr(analytics.db, "engine", engine, raising=False)
+    buffer = analytics.WriteBehindBuffer(flush_interval=0, max_batch=1, max_pending=1)
+    buffer.record("checkout_logs", {"total_gold": 50})
+    thread = buffer._thread
+    assert thread is not None
+    while not buffer._queue.empty():  # the flusher is now stuck in begin()
+        time.sleep(0.001)
+    buffer.record("checkout_logs", {"total_gold": 60})
+
+    start = time.monotonic()
+    buffer.stop(timeout=0.1)
+    assert time.monotonic() - start < 1
+
+    release.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert [params["total_gold_0"] for _, params in engine.executed] == [50, 60]
@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+
+from src import backtest
+
+
+def test_restock_sells_and_never_goes_negative():
+    ticks = backtest.synthetic_ticks(days=5)
+    report = backtest.simulate(backtest.Restock(), ticks, runs=50)
+    assert report.days == 5
+    assert report.profit > 0
+    assert report.ml_waste == 0
+
+
+def test_live_planners_bottle_every_full_potion():
+    state = backtest.State.initial(runs=2)
+    state.ml[:] = [[120, 0, 50, 49], [0, 0, 0, 0]]
+    bottles = backtest.LivePlanners().plan_bottles(state)
+    assert bottles.tolist() == [[2, 0, 1, 0], [0, 0, 0, 0]]
+
+
+def test_live_planners_stop_at_capacity():
+    state = backtest.State.initial(runs=1)
+    state.ml[:] = [[1000, 1000, 0, 0]]
+    state.potions[:] = [[0, 0, 0, 40]]
+    assert backtest.LivePlanners().plan_bottles(state).tolist() == [[10, 0, 0, 0]]
+
+    state.ml_capacity[:] = 0
+    ticks = backtest.synthetic_ticks(days=1)
+    assert not backtest.LivePlanners().plan_barrels(state, ticks[0].barrels).any()
+
+
+def test_simulated_bottling_respects_potion_capacity():
+    class BottleEverything(backtest.Restock):
+        stocked = 0
+
+        def prices(self, potions):
+            self.stocked = max(self.stocked, int(potions.sum()))
+            return super().prices(potions)
+
+    ticks = backtest.synthetic_ticks(days=1)
+    for tick in ticks:
+        tick.demand = np.zeros(4, dtype=np.int64)
+        for barrel in tick.barrels:
+            barrel.price = 0
+    strategy = BottleEverything(target=1000)
+    backtest.simulate(strategy, ticks, runs=1, seed=0)
+    assert strategy.stocked == backtest.STARTING_CAPACITY.potions
+
+
+def test_unaffordable_barrels_are_not_bought():
+    ticks = backtest.synthetic_ticks(days=1)
+    for tick in ticks:
+        tick.demand = np.zeros(4, dtype=np.int64)
+        for barrel in tick.barrels:
+            barrel.price = 1000
+    report = backtest.simulate(backtest.LivePlanners(), ticks, runs=3)
+    assert report.profit == 0
+
+
+def test_ticks_are_loaded_from_json_lines(tmp_path):
+    path = tmp_path / "ticks.jsonl"
+    path.write_text(
+        json.dumps(
+            {
+                "barrels": [
+                    {
+                        "sku": "SMALL_RED_BARREL",
+                        "potion_type": [1, 0, 0, 0],
+                        "price": 100,
+                        "quantity": 10,
+                    }
+                ],
+                "carts": [{"RED_POTION_0": 2}, {"RED_POTION_0": 1, "DARK_POTION_0": 1}],
+            }
+        )
+        + "\n"
+    )
+    [tick] = backtest.load_ticks(path)
+    assert tick.barrels[0].sku == "SMALL_RED_BARREL"
+    assert tick.demand.tolist() == [3, 0, 0, 1]
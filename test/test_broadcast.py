@@ -0,0 +1,120 @@
+import asyncio
+
+from src import broadcast
+
+
+def drain(queue):
+    events = []
+    while not queue.empty():
+        events.append(queue.get_nowait())
+    return events
+
+
+def test_diff_balances_zeroes_resources_that_disappear():
+    old = {"gold": 100, "red_potions": 3}
+    new = {"gold": 90, "green_ml": 500}
+    assert broadcast.diff_balances(old, new) == {
+        "gold": 90,
+        "green_ml": 500,
+        "red_potions": 0,
+    }
+
+
+def test_subscribers_get_a_snapshot_then_only_changes():
+    balances = {"gold": 100}
+    broadcaster = broadcast.Broadcaster(fetch=lambda: dict(balances))
+
+    async def scenario():
+        queue = await broadcaster.subscribe()
+        snapshot = drain(queue)
+        balances["red_potions"] = 5
+        await broadcaster.refresh()
+        changes = drain(queue)
+        broadcaster.unsubscribe(queue)
+        return snapshot, changes
+
+    snapshot, changes = asyncio.run(scenario())
+    assert snapshot == [
+        ("balances", {"gold": 100}),
+        ("catalog", {"upserted": [], "removed": [], "reset": True}),
+    ]
+    assert changes[0] == ("balances", {"red_potions": 5})
+    assert changes[1][1]["upserted"][0]["sku"] == "RED_POTION_0"
+
+
+def test_lagging_subscriber_is_resynced():
+    balances = {"gold": 0}
+    broadcaster = broadcast.Broadcaster(fetch=lambda: dict(balances), queue_size=4)
+
+    async def scenario():
+        queue = await broadcaster.subscribe()
+        for gold in range(1, 10):
+            balances["gold"] = gold
+            await broadcaster.refresh()
+        events = drain(queue)
+        broadcaster.unsubscribe(queue)
+        return events
+
+    events = asyncio.run(scenario())
+    assert events[-1][0] == "catalog" and events[-1][1]["reset"]
+    assert ("balances", {"gold": 9}) in events
+
+
+def test_notify_without_subscribers_is_a_no_op():
+    broadcaster = broadcast.Broadcaster(fetch=dict)
+    broadcaster.notify("gold")
+
+    async def half_subscribed():
+        broadcaster._loop = asyncio.get_running_loop()
+        broadcaster.notify("gold")
+
+    asyncio.run(half_subscribed())
+
+
+def test_failed_refreshes_are_retried(monkeypatch):
+    monkeypatch.setattr(broadcast, "RETRY_DELAY_SECONDS", 0)
+    balances = {"gold": 100}
+    failures: list[bool] = []
+    broadcaster = broadcast.Broadcaster(fetch=lambda: dict(balances))
+
+    def flaky_fetch():
+        if not failures:
+            failures.append(True)
+            raise OSError("pool timeout")
+        return dict(balances)
+
+    async def scenario():
+        queue = await broadcaster.subscribe()
+        drain(queue)
+        broadcaster.fetch = flaky_fetch
+        balances["gold"] = 90
+        broadcaster.notify("gold")
+        event = await asyncio.wait_for(queue.get(), 1)
+        broadcaster.unsubscribe(queue)
+        return event
+
+    assert asyncio.run(scenario()) == ("balances", {"gold": 90})
+    assert failures
+
+
+def test_failed_first_refresh_does_not_orphan_the_loop():
+    balances = {"gold": 100}
+
+    def unreachable():
+        raise OSError("connection refused")
+
+    broadcaster = broadcast.Broadcaster(fetch=unreachable)
+
+    async def scenario():
+        try:
+            await broadcaster.subscribe()
+        except OSError:
+            pass
+        assert broadcaster._task is None
+        broadcaster.fetch = lambda: dict(balances)
+        queue = await broadcaster.subscribe()
+        assert broadcaster._task is not None
+        broadcaster.unsubscribe(queue)
+        return drain(queue)
+
+    assert asyncio.run(scenario())[0] == ("balances", {"gold": 100})
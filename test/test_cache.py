@@ -0,0 +1,39 @@
+from src import cache
+
+
+def test_get_returns_default_on_miss():
+    ttl_cache = cache.TTLCache(maxsize=2, ttl=60)
+    assert ttl_cache.get("missing") is cache.MISSING
+    ttl_cache.put("order", None)
+    assert ttl_cache.get("order") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    ttl_cache = cache.TTLCache(maxsize=2, ttl=60)
+    ttl_cache.put("a", 1)
+    ttl_cache.put("b", 2)
+    ttl_cache.get("a")
+    ttl_cache.put("c", 3)
+    assert ttl_cache.get("b") is cache.MISSING
+    assert ttl_cache.get("a") == 1
+    assert ttl_cache.get("c") == 3
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    ttl_cache = cache.TTLCache(maxsize=10, ttl=5)
+    ttl_cache.put("order", {"total_gold_paid": 50})
+    now[0] += 4
+    assert ttl_cache.get("order") == {"total_gold_paid": 50}
+    now[0] += 2
+    assert ttl_cache.get("order") is cache.MISSING
+    assert len(ttl_cache) == 0
+
+
+def test_value_computed_before_clear_is_not_stored():
+    ttl_cache = cache.TTLCache(maxsize=2, ttl=60)
+    generation = ttl_cache.generation
+    ttl_cache.clear()
+    ttl_cache.put("balances", {"gold": 1}, generation)
+    assert ttl_cache.get("balances") is cache.MISSING
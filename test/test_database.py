@@ -0,0 +1,93 @@
+import subprocess
+import sys
+
+
+def test_importing_server_does_not_create_engine():
+    # psycopg is only loaded when the engine is created on first use, and the
+    # settings are only read at startup.
+    code = (
+        "import sys, src.api.server, src.database as db, src.config as config;"
+        "assert 'engine' not in vars(db);"
+        "assert config.get_settings.cache_info().currsize == 0;"
+        "assert 'psycopg' not in sys.modules;"
+        "assert 'sqlalchemy.orm' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_engine_is_created_on_first_use():
+    from src import database as db
+
+    engine = db.engine
+    assert db.engine is engine
+    assert isinstance(engine.pool, db.TimedQueuePool)
+
+
+def test_replica_is_skipped_while_lagging(monkeypatch):
+    from src import database as db
+
+    lag = [0.5]
+    monitor = db.ReplicaMonitor(primary=object(), replica=object(), max_lag_seconds=1.0)
+    monkeypatch.setattr(monitor, "measure_lag", lambda: lag[0])
+    monkeypatch.setattr(db, "replica_monitor", monitor, raising=False)
+    assert db.read_engine() is monitor.replica
+
+    lag[0] = 3.0
+    monitor.checked_at = float("-inf")
+    assert db.read_engine() is db.engine
+
+
+def test_unreachable_replica_falls_back_to_primary(monkeypatch):
+    from src import database as db
+
+    def unreachable():
+        raise OSError("connection refused")
+
+    monitor = db.ReplicaMonitor(primary=object(), replica=object(), max_lag_seconds=1.0)
+    monkeypatch.setattr(monitor, "measure_lag", unreachable)
+    monkeypatch.setattr(db, "replica_monitor", monitor, raising=False)
+    assert db.read_engine() is db.engine
+
+
+def test_reads_use_primary_without_replica(monkeypatch):
+    from src import database as db
+
+    monkeypatch.setattr(db, "replica_monitor", None, raising=False)
+    assert db.read_engine() is db.engine
+
+
+def test_replica_that_is_not_a_standby_is_skipped(monkeypatch):
+    from src import database as db
+
+    monitor = db.ReplicaMonitor(primary=object(), replica=object(), max_lag_seconds=1.0)
+    monkeypatch.setattr(monitor, "measure_lag", lambda: None)
+    monkeypatch.setattr(db, "replica_monitor", monitor, raising=False)
+    assert db.read_engine() is db.engine
+
+
+def test_primary_does_not_count_as_a_caught_up_replica(postgres):
+    from src import database as db
+
+    monitor = db.ReplicaMonitor(primary=postgres, replica=postgres, max_lag_seconds=1.0)
+    assert monitor.measure_lag() is None
+    assert not monitor.usable()
+
+
+def test_slow_query_log_is_only_installed_on_the_primary(monkeypatch):
+    from src import config, database as db
+
+    installed = []
+    settings = config.get_settings()
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 100)
+    monkeypatch.setattr(settings, "POSTGRES_REPLICA_URI", "postgresql+psycopg://r@x/r")
+    monkeypatch.setattr(
+        db.querylog, "install", lambda engine, threshold_ms: installed.append(engine)
+    )
+    # Make the lazy attribute be created again, and dropped after the test.
+    monkeypatch.setitem(vars(db), "replica_monitor", None)
+    monkeypatch.delitem(vars(db), "replica_monitor")
+
+    replica = db.replica_monitor.replica
+    primary = db.create_app_engine()
+    assert primary in installed
+    assert replica not in installed
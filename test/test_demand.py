@@ -0,0 +1,27 @@
+from src import demand
+
+
+def test_level_band():
+    assert demand.level_band(1) == "1-5"
+    assert demand.level_band(5) == "1-5"
+    assert demand.level_band(6) == "6-10"
+    assert demand.level_band(20) == "16-20"
+
+
+def test_stats_keep_the_last_window_of_visits():
+    stats = demand.DemandStats(window=2)
+    stats.record(1, [("Wizard", 3)])
+    stats.record(2, [("Warrior", 12), ("Wizard", 4)])
+    stats.record(3, [("Warrior", 11)])
+
+    assert stats.snapshot() == {
+        "visits": 2,
+        "customers": 3,
+        "by_class": {"Warrior": 2, "Wizard": 1},
+        "by_level": {"1-5": 1, "11-15": 2},
+        "by_class_and_level": {"Warrior": {"11-15": 2}, "Wizard": {"1-5": 1}},
+    }
+
+
+def test_empty_stats():
+    assert demand.DemandStats().snapshot()["customers"] == 0
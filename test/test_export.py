@@ -0,0 +1,57 @@
+import csv
+import gzip
+from datetime import date, datetime
+
+import pytest
+
+from src import export
+
+
+def read_csv(path):
+    with gzip.open(path, "rt", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_rows_are_partitioned_by_day(tmp_path):
+    rows = [
+        (1, "gold", 100, datetime(2026, 1, 1, 23, 59)),
+        (2, "red_potions", 5, datetime(2026, 1, 2, 0, 0)),
+        (3, "gold", -50, datetime(2026, 1, 2, 12, 0)),
+    ]
+    counts = export.write_partitions(
+        iter(rows), ["id", "resource", "change", "timestamp"], tmp_path, chunk_size=1
+    )
+
+    assert counts == {date(2026, 1, 1): 1, date(2026, 1, 2): 2}
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "2026-01-01.csv.gz",
+        "2026-01-02.csv.gz",
+    ]
+    second_day = read_csv(tmp_path / "2026-01-02.csv.gz")
+    assert second_day[0] == ["id", "resource", "change", "timestamp"]
+    assert [row[0] for row in second_day[1:]] == ["2", "3"]
+
+
+def test_no_rows_writes_no_files(tmp_path):
+    counts = export.write_partitions(iter([]), ["id", "timestamp"], tmp_path)
+    assert counts == {}
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_parquet_columns_null_in_the_first_chunk_keep_their_type(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [
+        (1, "gold", 100, None, datetime(2026, 1, 1, 1)),
+        (2, "gold", -50, "Checkout", datetime(2026, 1, 1, 2)),
+    ]
+    export.write_partitions(
+        iter(rows),
+        ["id", "resource", "change", "context", "timestamp"],
+        tmp_path,
+        fmt="parquet",
+        chunk_size=1,
+    )
+
+    table = pq.read_table(tmp_path / "2026-01-01.parquet")
+    assert str(table.schema.field("context").type) == "string"
+    assert table.column("context").to_pylist() == [None, "Checkout"]
@@ -0,0 +1,147 @@
+from datetime import timedelta
+
+import sqlalchemy
+
+from src import maintenance
+
+
+def test_delete_batch_sql_is_bounded():
+    policy = maintenance.RetentionPolicy("executed_orders", "timestamp", timedelta(7))
+    sql = str(maintenance.delete_batch_sql(policy))
+    assert "LIMIT :batch_size" in sql
+    assert "_archive" not in sql
+
+
+def test_archived_tables_move_rows():
+    policy = maintenance.RetentionPolicy(
+        "checkout_logs", "timestamp", timedelta(30), archive=True
+    )
+    sql = str(maintenance.delete_batch_sql(policy))
+    assert "RETURNING *" in sql
+    assert "INSERT INTO checkout_logs_archive" in sql
+
+
+def test_delete_in_batches_stops_on_short_batch(monkeypatch):
+    batches = iter([3, 3, 1])
+
+    class Result:
+        def __init__(self):
+            self.rowcount = next(batches)
+
+    class Connection:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        def execute(self, statement, params):
+            return Result()
+
+    class Engine:
+        def begin(self):
+            return Connection()
+
+    monkeypatch.setattr(maintenance.db, "engine", Engine(), raising=False)
+    assert maintenance.delete_in_batches(sqlalchemy.text(""), {}, batch_size=3) == 7
+
+
+def rows(connection, sql: str) -> list[tuple]:
+    return [tuple(row) for row in connection.execute(sqlalchemy.text(sql))]
+
+
+def test_retention_removes_only_old_rows(postgres_engine):
+    with postgres_engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO executed_orders (order_id, response, timestamp) VALUES
+                    (gen_random_uuid(), '{"old": true}', NOW() - interval '8 days'),
+                    (gen_random_uuid(), '{"old": false}', NOW());
+                INSERT INTO checkout_logs (total_potions, total_gold, timestamp) VALUES
+                    (1, 10, NOW() - interval '31 days'),
+                    (2, 20, NOW());
+                INSERT INTO carts (customer_name, created_at) VALUES
+                    ('abandoned', NOW() - interval '25 hours'),
+                    ('shopping', NOW());
+                INSERT INTO cart_items (cart_id, item_sku, quantity, unit_price)
+                SELECT cart_id, 'RED_POTION_0', 1, 50 FROM carts;
+            """)
+        )
+
+    orders = maintenance.RetentionPolicy("executed_orders", "timestamp", timedelta(7))
+    logs = maintenance.RetentionPolicy(
+        "checkout_logs", "timestamp", timedelta(30), archive=True
+    )
+    assert maintenance.prune(orders, batch_size=1).rows == 1
+    assert maintenance.prune(logs, batch_size=1).rows == 1
+    assert maintenance.prune_abandoned_carts(batch_size=1).rows == 1
+
+    with postgres_engine.begin() as connection:
+        assert rows(connection, "SELECT response FROM executed_orders") == [
+            ({"old": False},)
+        ]
+        assert rows(connection, "SELECT total_potions FROM checkout_logs") == [(2,)]
+        assert rows(connection, "SELECT total_potions FROM checkout_logs_archive") == [
+            (1,)
+        ]
+        assert rows(connection, "SELECT customer_name FROM carts") == [("shopping",)]
+        assert rows(connection, "SELECT count(*) FROM cart_items") == [(1,)]
+
+
+def test_checkpoints_of_pruned_epochs_are_deleted(postgres_engine):
+    with postgres_engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text("INSERT INTO ledger_epochs DEFAULT VALUES; " * 2)
+        )
+        epochs = [
+            epoch
+            for (epoch,) in rows(
+                connection, "SELECT id FROM ledger_epochs ORDER BY id DESC LIMIT 3"
+            )
+        ]
+        for epoch in epochs:
+            connection.execute(
+                sqlalchemy.text("""
+                    INSERT INTO ledger_checkpoints (epoch, entry_id, balances)
+                    VALUES (:epoch, 1, '{}')
+                """),
+                {"epoch": epoch},
+            )
+
+    assert maintenance.prune_old_checkpoints(batch_size=1).rows == 1
+    with postgres_engine.begin() as connection:
+        assert rows(
+            connection, "SELECT epoch FROM ledger_checkpoints ORDER BY epoch"
+        ) == [
+            (epochs[1],),
+            (epochs[0],),
+        ]
+
+
+def test_epochs_are_kept_by_position_not_id(postgres_engine):
+    with postgres_engine.begin() as connection:
+        new_epoch = sqlalchemy.text(
+            "INSERT INTO ledger_epochs DEFAULT VALUES RETURNING id"
+        )
+        previous = connection.execute(new_epoch).scalar_one()
+        kept = connection.execute(new_epoch).scalar_one()
+    with postgres_engine.connect() as connection:
+        connection.execute(new_epoch)  # rolled back, leaving a gap in the ids
+        connection.rollback()
+    with postgres_engine.begin() as connection:
+        current = connection.execute(new_epoch).scalar_one()
+        for epoch in (previous, kept, current):
+            connection.execute(
+                sqlalchemy.text("""
+                    INSERT INTO ledger_entries (resource, change, context, epoch)
+                    VALUES ('gold', 1, 'test', :epoch)
+                """),
+                {"epoch": epoch},
+            )
+
+    assert maintenance.prune_old_epochs(batch_size=1).rows == 1
+    with postgres_engine.begin() as connection:
+        assert rows(connection, "SELECT epoch FROM ledger_entries ORDER BY epoch") == [
+            (kept,),
+            (current,),
+        ]
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from src import plans
+
+
+def barrel(sku, potion_type, price, quantity=10):
+    return SimpleNamespace(
+        sku=sku, potion_type=potion_type, price=price, quantity=quantity
+    )
+
+
+CATALOG = [
+    barrel("SMALL_RED_BARREL", [1.0, 0, 0, 0], 100),
+    barrel("SMALL_GREEN_BARREL", [0, 1.0, 0, 0], 150),
+    barrel("SMALL_BLUE_BARREL", [0, 0, 1.0, 0], 500),
+]
+
+
+def test_candidates_stay_within_gold_and_stock():
+    _, price, available = plans.barrel_arrays(CATALOG)
+    available[0] = 1
+    candidates = plans.candidate_plans(price, available, gold=300)
+    assert candidates[:, 0].max() == 1
+    assert candidates[:, 2].max() == 0
+    assert len(candidates) == 2 * 3 * 1
+
+
+def test_unaffordable_plans_score_minus_infinity():
+    barrel_ml, price, _ = plans.barrel_arrays(CATALOG)
+    candidates = np.array([[0, 0, 0], [1, 0, 0], [3, 0, 0]])
+    zeros = np.zeros(4, dtype=np.int64)
+    score = plans.score_plans(
+        candidates,
+        barrel_ml,
+        price,
+        ml=zeros,
+        potions=zeros,
+        prices=np.array([50, 60, 70, 90]),
+        demand=np.full(4, 10),
+        gold=250,
+    )
+    assert score.tolist() == [0, 10 * 50 - 100, -np.inf]
+
+
+def test_best_plan_buys_for_the_color_that_is_short():
+    plan = plans.best_plan(
+        CATALOG,
+        gold=200,
+        ml=[0, 2000, 2000, 0],
+        potions=[0, 6, 6, 0],
+        prices=[50, 60, 70, 90],
+        demand=[10, 10, 10, 0],
+    )
+    assert plan == {"SMALL_RED_BARREL": 1}
+
+
+def test_best_plan_is_empty_when_nothing_is_affordable():
+    plan = plans.best_plan(CATALOG, 50, [0] * 4, [0] * 4, [50, 60, 70, 90], [10] * 4)
+    assert plan == {}
+
+
+def test_best_plan_stays_within_ml_capacity():
+    args = (CATALOG, 1000, [4000, 0, 0, 0], [0] * 4, [50, 60, 70, 90], [100] * 4)
+    assert plans.best_plan(*args)
+    assert plans.best_plan(*args, max_ml=4000) == {}
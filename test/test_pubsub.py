@@ -0,0 +1,37 @@
+from collections import defaultdict
+
+from src import cache, pubsub
+from src.api import catalog
+
+
+def test_changed_resources():
+    assert pubsub.changed_resources("gold,red_ml") == {"gold", "red_ml"}
+    assert pubsub.changed_resources("*") is None
+    assert pubsub.changed_resources(None) is None
+
+
+def test_failing_handler_does_not_stop_dispatch(monkeypatch):
+    monkeypatch.setattr(pubsub, "_handlers", defaultdict(list))
+    received: list[str | None] = []
+
+    def broken(payload):
+        raise RuntimeError("boom")
+
+    pubsub.subscribe("test", broken)
+    pubsub.subscribe("test", received.append)
+    pubsub.dispatch("test", "hello")
+    assert received == ["hello"]
+
+
+def test_catalog_cache_is_cleared_only_for_potion_changes():
+    cache.potion_balances.put("potions", {"red_potions": 1})
+    catalog.on_ledger_change("gold,red_ml")
+    assert cache.potion_balances.get("potions") == {"red_potions": 1}
+    catalog.on_ledger_change("red_potions,gold")
+    assert cache.potion_balances.get("potions") is cache.MISSING
+
+
+def test_prices_from_other_workers_are_applied(monkeypatch):
+    monkeypatch.setitem(catalog.CURRENT_PRICES, "RED_POTION_0", 50)
+    catalog.on_prices_change('{"RED_POTION_0": 60}')
+    assert catalog.CURRENT_PRICES["RED_POTION_0"] == 60
@@ -0,0 +1,71 @@
+import logging
+
+import sqlalchemy
+
+from src import querylog
+
+
+def test_is_read_only():
+    assert querylog.is_read_only("SELECT * FROM ledger_entries")
+    assert querylog.is_read_only("\n  WITH t AS (SELECT 1) SELECT * FROM t")
+    assert not querylog.is_read_only("INSERT INTO ledger_entries VALUES (1)")
+    assert not querylog.is_read_only(
+        "WITH moved AS (DELETE FROM carts RETURNING *) SELECT * FROM moved"
+    )
+
+
+def test_explain_prefix_never_analyzes_writes():
+    assert querylog.explain_prefix("SELECT 1").startswith("EXPLAIN (ANALYZE")
+    assert querylog.explain_prefix("DELETE FROM carts") == "EXPLAIN "
+
+
+def test_slow_statement_is_logged_with_endpoint(monkeypatch, caplog):
+    engine = sqlalchemy.create_engine("sqlite://")
+    slow_query_log = querylog.SlowQueryLog(engine, threshold_ms=0)
+    submitted = []
+    monkeypatch.setattr(slow_query_log, "_submit", lambda *args: submitted.append(args))
+    slow_query_log.install()
+
+    token = querylog.current_endpoint.set("GET /catalog/")
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.querylog"):
+            with engine.connect() as connection:
+                connection.execute(sqlalchemy.text("SELECT :x"), {"x": 1})
+    finally:
+        querylog.current_endpoint.reset(token)
+        slow_query_log.remove()
+
+    assert "GET /catalog/" in caplog.text
+    assert submitted and submitted[0][2] == "GET /catalog/"
+
+
+def test_fast_statement_is_ignored(monkeypatch):
+    engine = sqlalchemy.create_engine("sqlite://")
+    slow_query_log = querylog.SlowQueryLog(engine, threshold_ms=60_000)
+    submitted = []
+    monkeypatch.setattr(slow_query_log, "_submit", lambda *args: submitted.append(args))
+    slow_query_log.install()
+    with engine.connect() as connection:
+        connection.execute(sqlalchemy.text("SELECT 1"))
+    slow_query_log.remove()
+
+    assert submitted == []
+
+
+def test_capture_cooldown_remembers_a_bounded_number_of_statements(monkeypatch):
+    monkeypatch.setattr(querylog, "MAX_COOLDOWN_STATEMENTS", 2)
+    slow_query_log = querylog.SlowQueryLog(
+        sqlalchemy.create_engine("sqlite://"), threshold_ms=0
+    )
+    captured = []
+    monkeypatch.setattr(
+        slow_query_log._executor,
+        "submit",
+        lambda capture, statement, *args: captured.append(statement),
+    )
+    for statement in ["SELECT 1", "SELECT 1", "SELECT 2", "SELECT 3", "SELECT 1"]:
+        slow_query_log._submit(statement, {}, None, 1.0)
+
+    # SELECT 1 was in its cooldown the second time, forgotten by the third.
+    assert captured == ["SELECT 1", "SELECT 2", "SELECT 3", "SELECT 1"]
+    assert len(slow_query_log._recently_captured) == 2
@@ -0,0 +1,127 @@
+from typing import cast
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.middleware.errors import ServerErrorMiddleware
+
+from src import ratelimit
+
+KEYS = {f"key-{i}": f"client-{i}" for i in range(8)} | {"a": "a", "b": "b"}
+
+
+def make_client(**kwargs) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/catalog/")
+    def catalog():
+        return []
+
+    @app.post("/barrels/deliver/{order_id}")
+    def deliver(order_id: str):
+        return None
+
+    options = {
+        "default_limit": ratelimit.Limit(rate=10, burst=20),
+        "max_concurrent": 64,
+        "pool_wait_threshold_ms": 250,
+        "identify": KEYS.get,
+    }
+    options.update(kwargs)
+    app.add_middleware(ratelimit.RateLimitMiddleware, **options)
+    return TestClient(app)
+
+
+def rate_limiter(client: TestClient) -> ratelimit.RateLimitMiddleware:
+    # The app's middleware stack is ServerErrorMiddleware(RateLimitMiddleware(...)).
+    stack = cast(ServerErrorMiddleware, cast(FastAPI, client.app).middleware_stack)
+    return cast(ratelimit.RateLimitMiddleware, stack.app)
+
+
+def test_token_bucket_refills():
+    bucket = ratelimit.TokenBucket(ratelimit.Limit(rate=1, burst=2))
+    start = bucket.updated
+    assert bucket.take(start)
+    assert bucket.take(start)
+    assert not bucket.take(start)
+    assert bucket.take(start + 1.0)
+
+
+def test_route_group_prefers_longest_prefix():
+    assert ratelimit.route_group("/barrels/deliver/abc") == "/barrels/deliver"
+    assert ratelimit.route_group("/barrels/plan") == "/barrels"
+
+
+def test_deliveries_throttled_per_key():
+    client = make_client()
+    codes = [
+        client.post("/barrels/deliver/1", headers={"access_token": "a"}).status_code
+        for _ in range(6)
+    ]
+    assert codes[:5] == [200] * 5
+    assert codes[5] == 429
+
+    # Another key has its own bucket.
+    response = client.post("/barrels/deliver/1", headers={"access_token": "b"})
+    assert response.status_code == 200
+
+
+def test_pool_pressure_sheds_all_but_catalog():
+    client = make_client(pool_wait_ms=lambda: 1000.0)
+    response = client.post("/barrels/deliver/1", headers={"access_token": "a"})
+    assert response.status_code == 503
+    assert client.get("/catalog/").status_code == 200
+
+
+def test_unknown_keys_dont_drain_the_route_bucket():
+    client = make_client()
+    for i in range(50):
+        response = client.post("/barrels/deliver/1", headers={"access_token": f"x{i}"})
+        assert response.status_code == 200  # the route's auth would 401 these
+    assert (
+        client.post("/barrels/deliver/1", headers={"access_token": "a"}).status_code
+        == 200
+    )
+    assert len(rate_limiter(client).buckets) == 2
+
+
+def test_route_rejection_costs_no_client_token():
+    middleware = ratelimit.RateLimitMiddleware(
+        None,
+        ratelimit.Limit(rate=10, burst=20),
+        max_concurrent=64,
+        pool_wait_threshold_ms=250,
+        identify=KEYS.get,
+    )
+    scope = {"path": "/barrels/deliver/1", "headers": [(b"access_token", b"key-0")]}
+    for i in range(1, 5):
+        for _ in range(5):
+            middleware.check(
+                {
+                    "path": scope["path"],
+                    "headers": [(b"access_token", f"key-{i}".encode())],
+                }
+            )
+    # The route bucket (4 x 5 tokens) is empty, but key-0 still has all of its own.
+    rejected = middleware.check(scope)
+    assert rejected is not None and rejected.status_code == 429
+    assert middleware.bucket("client-0", "/barrels/deliver").tokens == 5
+
+
+def test_buckets_evicted_least_recently_used(monkeypatch):
+    monkeypatch.setattr(ratelimit, "MAX_BUCKETS", 3)
+    middleware = ratelimit.RateLimitMiddleware(
+        None,
+        ratelimit.Limit(rate=10, burst=20),
+        max_concurrent=64,
+        pool_wait_threshold_ms=250,
+    )
+    first = middleware.bucket("a", "/carts")
+    middleware.bucket("b", "/carts")
+    middleware.bucket("c", "/carts")
+    assert middleware.bucket("a", "/carts") is first
+    middleware.bucket("d", "/carts")
+    assert list(middleware.buckets) == [
+        ("c", "/carts"),
+        ("a", "/carts"),
+        ("d", "/carts"),
+    ]
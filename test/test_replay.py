@@ -0,0 +1,125 @@
+import pytest
+import sqlalchemy
+from fastapi import HTTPException
+
+from src import ledger, replay
+from src.api import admin
+
+
+def write(connection, *entries: tuple[str, int]) -> list[int]:
+    return [
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO ledger_entries (resource, change, context)
+                VALUES (:resource, :change, 'test')
+                RETURNING id
+            """),
+            {"resource": resource, "change": change},
+        ).scalar_one()
+        for resource, change in entries
+    ]
+
+
+def test_balances_at_uses_checkpoints(postgres_engine):
+    with postgres_engine.begin() as connection:
+        first = write(connection, ("gold", 100), ("red_ml", 500))
+        checkpoint = replay.create_checkpoint(connection)
+        later = write(connection, ("gold", -30), ("red_ml", 100))
+
+        assert checkpoint.entry_id == first[-1]
+        assert replay.balances_at(connection, first[0]).balances == {"gold": 100}
+        assert replay.balances_at(connection, later[0]).balances == {
+            "gold": 70,
+            "red_ml": 500,
+        }
+        assert replay.balances_at(connection, later[-1]).balances == ledger.balances(
+            connection
+        )
+
+
+def test_missing_entry_ids_resolve_to_the_previous_entry(postgres_engine):
+    with postgres_engine.begin() as connection:
+        ids = write(connection, ("gold", 100), ("gold", 5), ("gold", -20), ("gold", 1))
+        # A gap, as left by retention or a rolled-back insert.
+        connection.execute(
+            sqlalchemy.text("DELETE FROM ledger_entries WHERE id = :id"),
+            {"id": ids[1]},
+        )
+
+        snapshot = replay.balances_at(connection, ids[1])
+        assert (snapshot.entry_id, snapshot.balances) == (ids[0], {"gold": 100})
+
+        steps = list(replay.replay(connection, ids[1], ids[3]))
+        assert [(step.entry_id, step.balance) for step in steps] == [
+            (ids[2], 80),
+            (ids[3], 81),
+        ]
+
+
+def test_replay_stays_in_the_target_epoch(postgres_engine):
+    with postgres_engine.begin() as connection:
+        old = write(connection, ("gold", 100))
+        connection.execute(sqlalchemy.text("INSERT INTO ledger_epochs DEFAULT VALUES"))
+        new = write(connection, ("gold", 100), ("gold", -10))
+
+        steps = list(replay.replay(connection, old[0], new[-1]))
+        assert [step.balance for step in steps] == [100, 90]
+        steps = list(replay.replay(connection, new[0], new[-1]))
+        assert [step.balance for step in steps] == [90]
+
+
+def test_replay_rejects_unknown_target(postgres_engine):
+    with postgres_engine.begin() as connection:
+        ids = write(connection, ("gold", 100))
+        with pytest.raises(ValueError):
+            list(replay.replay(connection, 0, ids[0] + 1000))
+
+
+def test_backfill_checkpoints(postgres_engine):
+    with postgres_engine.begin() as connection:
+        ids = write(connection, *[("gold", 1)] * 7)
+        assert replay.backfill_checkpoints(connection, every=3) == 2
+        checkpoints = connection.execute(
+            sqlalchemy.text(
+                "SELECT entry_id, balances FROM ledger_checkpoints ORDER BY entry_id"
+            )
+        ).all()
+        assert [tuple(row) for row in checkpoints] == [
+            (ids[2], {"gold": 3}),
+            (ids[5], {"gold": 6}),
+        ]
+        assert replay.balances_at(connection, ids[-1]).balances == {"gold": 7}
+
+
+def test_admin_ledger_endpoints(postgres_engine):
+    with postgres_engine.begin() as connection:
+        ids = write(connection, ("gold", 100))
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO game_ticks (day, hour, timestamp)
+                VALUES ('Hearthday', 2, NOW() + interval '1 second')
+            """)
+        )
+        write(connection, ("gold", 50))
+
+    assert admin.get_balances_at(entry_id=ids[0])["balances"] == {"gold": 100}
+    assert admin.get_balances_at(day="Hearthday", hour=2)["balances"] == {"gold": 150}
+    with pytest.raises(HTTPException):
+        admin.get_balances_at(day="Hearthday", hour=3)
+    checkpoint = admin.create_ledger_checkpoint()
+    assert checkpoint["entry_id"] == ids[0] + 1
+
+
+def test_day_and_hour_resolve_to_their_latest_tick(postgres_engine):
+    with postgres_engine.begin() as connection:
+        ids = write(connection, ("gold", 1))
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO game_ticks (day, hour, timestamp) VALUES
+                    ('Hearthday', 2, NOW() - interval '7 days'),
+                    ('Hearthday', 2, NOW() + interval '1 second')
+            """)
+        )
+        assert replay.resolve_entry_id(connection, day="Hearthday", hour=2) == ids[0]
+        with pytest.raises(ValueError):
+            replay.resolve_entry_id(connection, day="Hearthday")
@@ -0,0 +1,65 @@
+import asyncio
+
+from src import scheduler as scheduler_module
+from src.scheduler import Job, Scheduler
+
+
+class FakeLeader:
+    def __init__(self, leader: bool):
+        self.leader = leader
+        self.released = False
+
+    def acquire(self) -> bool:
+        return self.leader
+
+    def release(self):
+        self.released = True
+
+
+def test_only_the_leader_runs_leader_only_jobs():
+    calls = []
+    for leader in (True, False):
+        scheduler = Scheduler(FakeLeader(leader))
+        scheduler.add(Job("retention", lambda: calls.append("retention"), 60))
+        scheduler.add(Job("warm", lambda: calls.append("warm"), 60, leader_only=False))
+        for job in scheduler.jobs.values():
+            asyncio.run(scheduler.run(job))
+        stats = scheduler.snapshot()
+        assert stats["retention"]["skipped"] == (0 if leader else 1)
+    assert calls == ["retention", "warm", "warm"]
+
+
+def test_failures_are_counted_and_the_job_keeps_its_schedule():
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler = Scheduler(FakeLeader(True))
+    scheduler.add(Job("fail", fail, 60))
+    asyncio.run(scheduler.run(scheduler.jobs["fail"]))
+    stats = scheduler.snapshot()["fail"]
+    assert (stats["runs"], stats["failures"]) == (1, 1)
+    assert "boom" in stats["last_error"]
+    assert stats["last_seconds"] is not None and not stats["running"]
+
+
+def test_jobs_repeat_until_stopped(monkeypatch):
+    monkeypatch.setattr(scheduler_module.random, "uniform", lambda a, b: 0)
+    runs = []
+    leader = FakeLeader(True)
+    scheduler = Scheduler(leader)
+    scheduler.add(Job("tick", lambda: runs.append(1), interval=0.01))
+
+    async def main():
+        scheduler.start()
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+
+    asyncio.run(main())
+    assert len(runs) >= 3
+    assert leader.released
+
+
+def test_delay_stays_within_jitter():
+    scheduler = Scheduler(FakeLeader(True))
+    job = Job("job", lambda: None, interval=100, jitter=0.1)
+    assert all(90 <= scheduler.delay(job) <= 110 for _ in range(100))
@@ -0,0 +1,112 @@
+import sqlite3
+import uuid
+
+import pytest
+import sqlalchemy
+
+from src import demand, ledger
+from src.api import carts
+
+
+def stock(connection, **balances):
+    for resource, change in balances.items():
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO ledger_entries (resource, change, context)
+                VALUES (:resource, :change, 'test')
+            """),
+            {"resource": resource, "change": change},
+        )
+
+
+def test_balances_are_scoped_to_the_current_epoch(sqlite_engine):
+    with sqlite_engine.begin() as connection:
+        stock(connection, gold=100, red_potions=5)
+        connection.execute(sqlalchemy.text("INSERT INTO ledger_epochs DEFAULT VALUES"))
+        stock(connection, gold=7)
+        assert ledger.balances(connection) == {"gold": 7}
+        assert ledger.balances(connection, ("gold", "red_potions")) == {"gold": 7}
+
+
+def test_checkout_debits_stock_once(sqlite_engine):
+    with sqlite_engine.begin() as connection:
+        stock(connection, red_potions=3)
+    cart_id = carts.create_cart()["cart_id"]
+    carts.add_cart_items(cart_id, [carts.CartItem(sku="RED_POTION_0", quantity=2)])
+    order = carts.CartCheckout(order_id=uuid.uuid4(), payment="gold")
+
+    assert carts.checkout(cart_id, order).total_potions_bought == 2
+    carts.completed_orders.clear()
+    assert carts.checkout(cart_id, order).total_potions_bought == 2
+    with sqlite_engine.begin() as connection:
+        assert ledger.balances(connection) == {"red_potions": 1, "gold": 100}
+
+
+def test_checkout_rejects_insufficient_stock(sqlite_engine):
+    cart_id = carts.create_cart()["cart_id"]
+    carts.add_cart_items(cart_id, [carts.CartItem(sku="RED_POTION_0", quantity=1)])
+    with sqlite_engine.begin() as connection:
+        result = carts.execute_checkout(connection, cart_id, uuid.uuid4())
+    assert result.status == "insufficient_stock"
+
+
+def test_search_matches_case_insensitively(sqlite_engine):
+    with sqlite_engine.begin() as connection:
+        cart_id = connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO carts (customer_name) VALUES ('Merlin') RETURNING cart_id
+            """)
+        ).scalar_one()
+    carts.add_cart_items(cart_id, [carts.CartItem(sku="BLUE_POTION_0", quantity=2)])
+    results = carts.search_orders(customer_name="merl", potion_sku="blue").body
+    assert b'"line_item_total":140' in results
+
+
+def test_visits_are_recorded_once(sqlite_engine, monkeypatch):
+    monkeypatch.setattr(demand, "stats", demand.DemandStats())
+    customers = [
+        carts.Customer(
+            customer_id="1", customer_name="Ann", character_class="Wizard", level=3
+        ),
+        carts.Customer(
+            customer_id="2", customer_name="Bo", character_class="Warrior", level=12
+        ),
+        carts.Customer(
+            customer_id="2", customer_name="Bo", character_class="Warrior", level=12
+        ),
+    ]
+    carts.post_visits(7, customers)
+    carts.post_visits(7, customers)
+
+    assert carts.get_visit_stats()["customers"] == 2
+    stats = demand.DemandStats()
+    with sqlite_engine.begin() as connection:
+        stats.load(connection)
+    assert stats.snapshot() == demand.stats.snapshot()
+
+
+def test_lists_bind_as_json_on_the_engine_only(sqlite_engine):
+    with sqlite_engine.begin() as connection:
+        connection.execute(
+            sqlalchemy.text("""
+                INSERT INTO bottling_logs (potion_type, quantity)
+                VALUES (:potion_type, 1)
+            """),
+            {"potion_type": [100, 0, 0, 0]},
+        )
+        assert (
+            connection.execute(
+                sqlalchemy.text("SELECT potion_type FROM bottling_logs")
+            ).scalar_one()
+            == "[100, 0, 0, 0]"
+        )
+    with pytest.raises(sqlite3.ProgrammingError):
+        sqlite3.connect(":memory:").execute("SELECT ?", ([1],))
+
+
+def test_schema_matches_postgres(sqlite_engine, postgres):
+    sqlite, pg = sqlalchemy.inspect(sqlite_engine), sqlalchemy.inspect(postgres)
+    for table in sqlite.get_table_names() + sqlite.get_view_names():
+        assert {column["name"] for column in sqlite.get_columns(table)} == {
+            column["name"] for column in pg.get_columns(table)
+        }, table